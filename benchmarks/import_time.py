@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Cold-start import budget for the CLI entry point.
+
+Runs fresh interpreters with ``python -X importtime`` and checks that
+
+- importing the CLI stays within a time budget, and
+- heavy subsystems are not imported before they are needed: nothing slow
+  for ``--help``, and no crawler or Gemini SDK on the warm-start path.
+
+Prints a JSON report and exits with status 1 on any regression, so it can
+run in CI:
+
+    python benchmarks/import_time.py --budget-ms 250
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must stay lazy, per import path
+COLD_FORBIDDEN = [
+    "bs4", "aiohttp", "requests", "numpy", "langchain_core", "langchain_text_splitters",
+    "langchain_community", "chromadb", "google.generativeai", "rich.markdown"
+]
+WARM_FORBIDDEN = ["bs4", "aiohttp", "langchain_text_splitters", "google.generativeai"]
+
+# Everything a warm start imports before the first question
+WARM_START_IMPORTS = [
+    "utils.cli.interface",
+    "utils.knowledge_base.embeddings",
+    "utils.processor.indexer",
+    "utils.qa.query_processor",
+    "utils.qa.answer_cache",
+    "utils.llm.gemini",
+]
+
+
+def measure(modules):
+    """Import modules in a fresh interpreter; return (cumulative µs per module, loaded module names)."""
+    code = f"import sys; {'; '.join(f'import {m}' for m in modules)}; print('\\n'.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if cumulative_us.strip().isdigit():
+            cumulative[name.strip()] = int(cumulative_us)
+    return cumulative, set(result.stdout.split())
+
+
+def best_of(modules, repeat):
+    """Fastest of ``repeat`` runs (the least disturbed by other load)."""
+    runs = [measure(modules) for _ in range(repeat)]
+    totals = [sum(cumulative.get(m, 0) for m in modules) for cumulative, _ in runs]
+    best = totals.index(min(totals))
+    return totals[best] / 1000, runs[best][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the CLI import-time budget")
+    parser.add_argument("--budget-ms", type=float, default=250, help="Max time to import the CLI module")
+    parser.add_argument("--warm-budget-ms", type=float, default=None, help="Max time for the warm-start imports")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (the fastest counts)")
+    args = parser.parse_args()
+
+    cold_ms, cold_loaded = best_of(["utils.cli.interface"], args.repeat)
+    warm_ms, warm_loaded = best_of(WARM_START_IMPORTS, args.repeat)
+
+    def loaded(forbidden, modules):
+        return sorted(name for name in forbidden if name in modules)
+
+    report = {
+        "cli_import_ms": round(cold_ms, 1),
+        "cli_budget_ms": args.budget_ms,
+        "cli_eager_imports": loaded(COLD_FORBIDDEN, cold_loaded),
+        "warm_start_import_ms": round(warm_ms, 1),
+        "warm_start_budget_ms": args.warm_budget_ms,
+        "warm_start_eager_imports": loaded(WARM_FORBIDDEN, warm_loaded),
+    }
+    failures = []
+    if cold_ms > args.budget_ms:
+        failures.append(f"CLI import took {cold_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if args.warm_budget_ms is not None and warm_ms > args.warm_budget_ms:
+        failures.append(f"warm-start imports took {warm_ms:.0f} ms (budget {args.warm_budget_ms:.0f} ms)")
+    if report["cli_eager_imports"]:
+        failures.append(f"CLI import loads {', '.join(report['cli_eager_imports'])}")
+    if report["warm_start_eager_imports"]:
+        failures.append(f"warm start loads {', '.join(report['warm_start_eager_imports'])}")
+    report["failures"] = failures
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Offline end-to-end benchmark: crawl -> extract -> chunk -> index -> query.
+
+Generates a synthetic documentation site, serves it from a local
+``http.server`` and runs every stage against it, with deterministic hash
+embeddings and a fake LLM (both with configurable latency) in place of the
+Google APIs. Results are printed and written as JSON, tagged with the git
+commit, so runs can be compared across commits:
+
+    python benchmarks/run_benchmarks.py --pages 300 --out results.json
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.site_generator import generate_site, page_path, page_topic  # noqa: E402
+from utils.cli.batch import answer_question  # noqa: E402
+from utils.crawler.async_crawler import AsyncDocumentationCrawler  # noqa: E402
+from utils.crawler.crawler import DocumentationCrawler  # noqa: E402
+from utils.crawler.extractor import ContentExtractor  # noqa: E402
+from utils.knowledge_base.embeddings import HashEmbeddings  # noqa: E402
+from utils.llm.fake import FakeStreamingModel  # noqa: E402
+from utils.llm.gemini import GeminiLLM  # noqa: E402
+from utils.processor.dedup import NearDuplicateDetector  # noqa: E402
+from utils.processor.delta_indexer import DeltaIndexer  # noqa: E402
+from utils.processor.indexer import DocumentProcessor  # noqa: E402
+from utils.qa.context import ContextAssembler  # noqa: E402
+from utils.qa.query_processor import QueryProcessor  # noqa: E402
+
+
+class LatencyEmbeddings(HashEmbeddings):
+    """Hash embeddings that sleep like a remote API call and count calls.
+
+    Vectors are turned by a fixed random rotation, which keeps every
+    similarity but makes them dense like a real model's (sparse hash vectors
+    would make binary quantization look worse than it is).
+    """
+
+    def __init__(self, latency: float = 0.0, dim: int = 256):
+        super().__init__(dim)
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+        self.rotation = np.linalg.qr(np.random.default_rng(0).normal(size=(dim, dim)))[0].astype(np.float32)
+
+    def _embed(self, text):
+        return (np.asarray(super()._embed(text), dtype=np.float32) @ self.rotation).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        self.texts += 1
+        time.sleep(self.latency)
+        return super().embed_query(text)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory: str) -> ThreadingHTTPServer:
+    """Serve a directory on a free local port from a background thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def make_queries(pages: int, count: int, base_url: str, seed: int) -> List[Dict[str, str]]:
+    """Questions about random pages: natural-language ones and identifier lookups."""
+    rng = random.Random(seed)
+    queries = []
+    for n in range(count):
+        index = rng.randrange(pages)
+        topic = page_topic(index)
+        question = [f"{topic['title']}?", topic["function"], f"What does {topic['option']} control?"][n % 3]
+        queries.append({"question": question, "url": base_url + page_path(index)})
+    return queries
+
+
+def run(args) -> Dict:
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args).copy(),
+    }
+    results["config"].pop("out", None)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        site_dir = os.path.join(workdir, "site")
+        generate_site(site_dir, pages=args.pages, depth=args.depth, seed=args.seed, mirrors=args.mirrors)
+        server = serve(site_dir)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+        try:
+            # Crawl
+            crawler_cls = AsyncDocumentationCrawler if args.async_crawl else DocumentationCrawler
+            crawler = crawler_cls(base_url + page_path(0), max_pages=args.pages * (args.mirrors + 1),
+                                  concurrency=args.concurrency, crawl_delay=0)
+            start = time.perf_counter()
+            crawler.crawl()
+            seconds = time.perf_counter() - start
+            pages = crawler.content_by_url
+            results["crawl"] = {
+                "pages": len(pages),
+                "seconds": round(seconds, 3),
+                "pages_per_second": round(len(pages) / seconds, 1),
+            }
+        finally:
+            server.shutdown()
+
+        # Extract
+        extractor = ContentExtractor()
+        start = time.perf_counter()
+        for content in pages.values():
+            content["extracted"] = extractor.extract_content(content["html"])
+        seconds = time.perf_counter() - start
+        results["extract"] = {"pages": len(pages), "ms_per_page": round(seconds * 1000 / len(pages), 2)}
+
+        # Chunk (and deduplicate)
+        embeddings = LatencyEmbeddings(args.embedding_latency)
+        vector_options = {}
+        if args.vector_store == "numpy":
+            vector_options = {"ivf_lists": args.ivf_lists, "quantization": args.quantization}
+        processor = DocumentProcessor(api_key=None, embeddings=embeddings, vector_backend=args.vector_store,
+                                      vector_options=vector_options)
+        dedup = None if args.no_dedup else NearDuplicateDetector()
+        start = time.perf_counter()
+        chunks = []
+        for url, content in pages.items():
+            documents = processor.create_documents({url: content})
+            if dedup and dedup.check_page(url, documents):
+                continue
+            page_chunks = processor.split_documents(documents)
+            chunks.extend(dedup.filter_chunks(url, page_chunks) if dedup else page_chunks)
+        seconds = time.perf_counter() - start
+        results["chunk"] = {"chunks": len(chunks), "chunks_per_second": round(len(chunks) / seconds, 1)}
+        if dedup:
+            results["chunk"].update(dedup.stats())
+
+        # Index (embedding + vector store + lexical index)
+        persist_dir = os.path.join(workdir, "index")
+        start = time.perf_counter()
+        vector_store = processor.create_vector_store(chunks, persist_dir)
+        results["index"] = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "embedding_calls": embeddings.calls,
+        }
+        start = time.perf_counter()
+        processor.open_vector_store(persist_dir)
+        results["index"]["open_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if hasattr(vector_store, "scan_bytes"):
+            results["index"]["scan_mb"] = round(vector_store.scan_bytes() / 2 ** 20, 2)
+
+        # Exact similarities of every chunk to each query, the reference for recall@k
+        chunk_rows = {chunk.metadata["chunk_id"]: row for row, chunk in enumerate(chunks)}
+        chunk_vectors = np.asarray(embeddings.embed_documents([chunk.page_content for chunk in chunks]), dtype=np.float32)
+
+        # Query
+        lexical_index = processor.open_lexical_index(vector_store, persist_dir)
+        if dedup:
+            DeltaIndexer(vector_store, lexical_index=lexical_index).annotate(dedup.pending_alternates())
+        query_processor = QueryProcessor(vector_store, None, embeddings=embeddings, lexical_index=lexical_index,
+                                         context_assembler=ContextAssembler())
+        llm = GeminiLLM(None, model=FakeStreamingModel(first_chunk_delay=args.llm_latency))
+        retrieval_ms, answer_ms, hits, recall = [], [], 0, []
+        for query in make_queries(args.pages, args.queries, base_url, args.seed):
+            start = time.perf_counter()
+            contexts = query_processor.process_query(query["question"])
+            retrieval_ms.append((time.perf_counter() - start) * 1000)
+            hits += any(
+                query["url"] == context["metadata"]["url"]
+                or query["url"] in context["metadata"].get("alternate_urls", "").split()
+                for context in contexts
+            )
+
+            query_vector = embeddings.embed_query(query["question"])
+            found = vector_store.similarity_search_by_vector_with_relevance_scores(query_vector, k=args.recall_k)
+            similarities = chunk_vectors @ np.asarray(query_vector, dtype=np.float32)
+            # Tie-aware: a result counts if it is at least as similar as the exact k-th best
+            kth = np.sort(similarities)[-min(args.recall_k, len(similarities))]
+            correct = sum(similarities[chunk_rows[doc.metadata["chunk_id"]]] >= kth - 1e-5 for doc, _ in found)
+            recall.append(correct / min(args.recall_k, len(similarities)))
+
+            start = time.perf_counter()
+            answer_question(query_processor, llm, query["question"])
+            answer_ms.append((time.perf_counter() - start) * 1000)
+        results["query"] = {
+            "queries": args.queries,
+            "retrieval_p50_ms": round(percentile(retrieval_ms, 50), 2),
+            "retrieval_p99_ms": round(percentile(retrieval_ms, 99), 2),
+            "answer_p50_ms": round(percentile(answer_ms, 50), 2),
+            "answer_p99_ms": round(percentile(answer_ms, 99), 2),
+            "hit_rate": round(hits / max(1, args.queries), 3),
+            f"recall_at_{args.recall_k}": round(sum(recall) / max(1, len(recall)), 3),
+        }
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--pages", type=int, default=200, help="Pages in the synthetic site")
+    parser.add_argument("--depth", type=int, default=3, help="Depth of the site's page tree")
+    parser.add_argument("--mirrors", type=int, default=0, help="Versioned copies of the site (near-duplicate pages)")
+    parser.add_argument("--no-dedup", action="store_true", help="Embed near-duplicate pages and chunks too")
+    parser.add_argument("--vector-store", choices=["chroma", "numpy"], default="chroma", help="Vector store backend")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="IVF lists of the numpy vector store (0 = exact search)")
+    parser.add_argument("--quantization", choices=["int8", "binary"], default=None, help="Quantized first-pass scan of the numpy vector store")
+    parser.add_argument("--recall-k", type=int, default=10, help="k for the vector search recall@k against exact search")
+    parser.add_argument("--queries", type=int, default=200, help="Questions to time")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent crawl workers")
+    parser.add_argument("--async-crawl", action="store_true", help="Use the asyncio crawler")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per fake embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds before the fake LLM answers")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the site and the questions")
+    parser.add_argument("--out", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Synthetic documentation site for offline benchmarks.
+
+Pages form a tree of the requested depth (page 0 is ``index.html``). Every
+page has the noise a real documentation theme adds: a top navigation bar,
+a sidebar listing its siblings and a footer. Its main content has nested
+headings, paragraphs, lists, a parameter table and code blocks. Content is
+generated from a seeded RNG, so a given configuration always produces the
+same site. ``mirrors`` adds versioned copies of the whole tree under
+``v1/``, ``v2/``, ... that differ only in a version notice, the way
+versioned documentation sites do.
+"""
+import math
+import os
+import random
+from typing import Dict, List
+
+WORDS = (
+    "request response client server session token cache index query vector embedding chunk "
+    "section page crawler parser document header footer config option value default timeout "
+    "retry batch stream worker thread process queue buffer limit budget latency throughput "
+    "memory disk file path url host port proxy auth error status code model prompt answer"
+).split()
+
+TOPICS = ["install", "configure", "deploy", "monitor", "migrate", "secure", "scale", "debug", "test", "extend"]
+
+
+def _sentence(rng: random.Random, length: int = 12) -> str:
+    words = [rng.choice(WORDS) for _ in range(length)]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 4) -> str:
+    return " ".join(_sentence(rng, rng.randint(8, 16)) for _ in range(sentences))
+
+
+def page_path(index: int) -> str:
+    return "index.html" if index == 0 else f"docs/page{index}.html"
+
+
+def page_topic(index: int) -> Dict[str, str]:
+    """Subject of a page: the questions the benchmark asks are built from it."""
+    topic = TOPICS[index % len(TOPICS)]
+    return {
+        "title": f"How to {topic} component {index}",
+        "function": f"{topic}_component_{index}",
+        "option": f"{topic.upper()}_LIMIT_{index}",
+    }
+
+
+def _page_html(index: int, parent: int, children: List[int], siblings: List[int],
+               top_level: List[int], rng: random.Random, prefix: str = "", mirrors: int = 0) -> str:
+    topic = page_topic(index)
+    link = lambda i: f'<a href="/{prefix}{page_path(i)}">{page_topic(i)["title"]}</a>'
+    nav = "".join(f"<li>{link(i)}</li>" for i in top_level)
+    sidebar = "".join(f"<li>{link(i)}</li>" for i in siblings)
+    sections = []
+    for number in range(rng.randint(2, 4)):
+        rows = "".join(
+            f"<tr><td>{rng.choice(WORDS)}_{n}</td><td>{rng.choice(['int', 'str', 'bool', 'float'])}</td>"
+            f"<td>{_sentence(rng, 6)}</td></tr>"
+            for n in range(rng.randint(2, 5))
+        )
+        items = "".join(f"<li>{_sentence(rng, 7)}</li>" for _ in range(rng.randint(2, 5)))
+        sections.append(f"""
+      <h2>Step {number + 1}: {rng.choice(WORDS)} {rng.choice(WORDS)}</h2>
+      <p>{_paragraph(rng)}</p>
+      <h3>Parameters</h3>
+      <table><tr><th>Name</th><th>Type</th><th>Description</th></tr>{rows}</table>
+      <ul>{items}</ul>
+      <pre><code>from docs import {topic['function']}
+{topic['function']}({rng.choice(WORDS)}={rng.randint(1, 100)}, timeout={rng.randint(1, 60)})</code></pre>
+      <p>{_paragraph(rng, 3)}</p>""")
+    child_links = "".join(f"<li>{link(i)}</li>" for i in children)
+    notice = f"<p>You are reading the documentation for version {prefix.strip('/')}.</p>" if prefix else ""
+    versions = "".join(f' <a href="/v{m}/{page_path(0)}">v{m}</a>' for m in range(1, mirrors + 1))
+    return f"""<!DOCTYPE html>
+<html><head><title>{topic['title']}</title><script>var analytics = {{"page": {index}}};</script></head>
+<body>
+  <header class="site-header"><nav class="navigation"><ul>{nav}</ul></nav></header>
+  <aside class="sidebar"><ul>{sidebar}</ul></aside>
+  <main>
+    <article>
+      <h1>{topic['title']}</h1>{notice}
+      <p>Use <code>{topic['function']}()</code> to {TOPICS[index % len(TOPICS)]} component {index}.
+      The <code>{topic['option']}</code> setting controls how many requests it handles. {_paragraph(rng)}</p>
+      {''.join(sections)}
+      <h2>See also</h2>
+      <ul>{child_links}<li>{link(parent)}</li></ul>
+    </article>
+  </main>
+  <footer class="footer"><p>Copyright. <a href="/{page_path(0)}">Home</a>{versions}</p></footer>
+</body></html>
+"""
+
+
+def generate_site(directory: str, pages: int = 200, depth: int = 3, seed: int = 0, mirrors: int = 0) -> List[str]:
+    """Write a site of ``pages`` pages nested ``depth`` levels deep; returns the page paths."""
+    branching = max(2, math.ceil(pages ** (1 / max(depth, 1))))
+    parent_of = {i: (i - 1) // branching for i in range(1, pages)}
+    children = {i: [] for i in range(pages)}
+    for child, parent in parent_of.items():
+        children[parent].append(child)
+
+    paths = []
+    for prefix in [""] + [f"v{m}/" for m in range(1, mirrors + 1)]:
+        # Same seed per tree: every mirror repeats the original content
+        rng = random.Random(seed)
+        for index in range(pages):
+            parent = parent_of.get(index, 0)
+            siblings = children[parent] if index else children[0]
+            html = _page_html(index, parent, children[index], siblings, children[0], rng, prefix, mirrors)
+            path = prefix + page_path(index)
+            os.makedirs(os.path.dirname(os.path.join(directory, path)) or directory, exist_ok=True)
+            with open(os.path.join(directory, path), "w") as f:
+                f.write(html)
+            paths.append(path)
+    return paths
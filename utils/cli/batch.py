@@ -0,0 +1,169 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+from utils.knowledge_base.embeddings import embed_queries
+from utils.qa.answer_cache import normalize_query
+
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the documentation."
+
+
+class RateLimiter:
+    """Spaces calls evenly so that at most ``per_minute`` start in any minute.
+
+    Thread-safe: each caller reserves the next free slot under a lock and
+    sleeps outside it, so waiting callers never block one another.
+    """
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def answer_question(query_processor, llm, question: str, answer_cache=None,
+                    query_vector: Optional[List[float]] = None, limiter: Optional[RateLimiter] = None):
+    """Answer one question from the cache or by retrieval and generation.
+
+    Returns ``(result, source)`` where ``source`` is ``"cache"``, ``"llm"`` or
+    ``"no_context"`` (nothing relevant was retrieved).
+    """
+    result = answer_cache.get(question, query_vector) if answer_cache else None
+    if result is not None:
+        return result, "cache"
+    contexts = query_processor.process_query(question, query_vector)
+    if not contexts:
+        return {"answer": NO_CONTEXT_ANSWER, "source_urls": [], "confidence": 0}, "no_context"
+    if limiter:
+        limiter.wait()
+    result = llm.generate_answer(question, contexts)
+    if answer_cache and result["confidence"] > 0:
+        answer_cache.put(question, result)
+    return result, "llm"
+
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield question records from a JSONL file.
+
+    Each line is either a JSON string or an object with a ``question`` (or
+    ``query``) field; other fields such as ``id`` are passed through to the
+    output. Records without an ``id`` get their line number.
+    """
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                logging.warning(f"Skipping line {line_number} of {path}: invalid JSON ({e})")
+                continue
+            if isinstance(record, str):
+                record = {"question": record}
+            elif not isinstance(record, dict):
+                logging.warning(f"Skipping line {line_number} of {path}: expected a string or an object")
+                continue
+            elif "question" not in record and "query" in record:
+                record["question"] = record.pop("query")
+            if not isinstance(record.get("question"), str) or not record["question"].strip():
+                logging.warning(f"Skipping line {line_number} of {path}: no question")
+                continue
+            record.setdefault("id", line_number)
+            yield record
+
+
+class BatchRunner:
+    """Answer a file of questions concurrently and stream answers to a JSONL file.
+
+    Questions are read in groups of ``group_size``. Each group's query
+    embeddings come from one batched call, then its questions are answered
+    by a pool of ``concurrency`` workers. LLM calls are throttled to
+    ``rate_limit`` requests per minute. Every answer is written (and flushed)
+    as soon as it is ready, so output order follows completion order and the
+    ``id`` field ties answers back to questions.
+    """
+
+    def __init__(self, query_processor, llm, answer_cache=None, concurrency: int = 8,
+                 rate_limit: float = 0, group_size: int = 32):
+        self.query_processor = query_processor
+        self.llm = llm
+        self.answer_cache = answer_cache
+        self.concurrency = concurrency
+        self.group_size = group_size
+        self.limiter = RateLimiter(rate_limit)
+        self.write_lock = threading.Lock()
+        self.stats = {"questions": 0, "answered": 0, "cached": 0, "no_context": 0, "errors": 0}
+        self.stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def answer(self, record: Dict[str, Any], query_vector: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Answer one question record; returns the output record."""
+        start = time.time()
+        result, source = answer_question(
+            self.query_processor, self.llm, record["question"], self.answer_cache, query_vector, self.limiter
+        )
+        if source != "llm":
+            self._count("cached" if source == "cache" else "no_context")
+        self._count("answered")
+        return {**record, **result, "cached": source == "cache", "seconds": round(time.time() - start, 3)}
+
+    def _run_one(self, record, query_vector, out, in_flight):
+        try:
+            output = self.answer(record, query_vector)
+        except Exception as e:
+            logging.error(f"Failed to answer question {record['id']}: {e}", exc_info=True)
+            self._count("errors")
+            output = {**record, "error": str(e)}
+        finally:
+            in_flight.release()
+        with self.write_lock:
+            out.write(json.dumps(output) + "\n")
+            out.flush()
+
+    def run(self, questions_path: str, out_path: str) -> Dict[str, Any]:
+        """Answer every question in ``questions_path``; returns run statistics."""
+        start = time.time()
+        # Bounds the questions held in memory to a couple of worker generations
+        in_flight = threading.BoundedSemaphore(self.concurrency * 2)
+        questions = read_questions(questions_path)
+
+        with open(out_path, "w") as out, ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                group = [record for _, record in zip(range(self.group_size), questions)]
+                if not group:
+                    break
+                self.stats["questions"] += len(group)
+                try:
+                    # Normalized, as the answer cache embeds them
+                    vectors = embed_queries(self.query_processor.embeddings,
+                                            [normalize_query(record["question"]) for record in group])
+                except Exception as e:
+                    # Retrieval then embeds each question on its own
+                    logging.warning(f"Batched query embedding failed: {e}")
+                    vectors = [None] * len(group)
+                for record, vector in zip(group, vectors):
+                    in_flight.acquire()
+                    executor.submit(self._run_one, record, vector, out, in_flight)
+
+        self.stats["seconds"] = round(time.time() - start, 2)
+        logging.info(
+            f"Batch finished in {self.stats['seconds']}s: {self.stats['answered']} of "
+            f"{self.stats['questions']} questions answered ({self.stats['cached']} from cache, "
+            f"{self.stats['errors']} errors)"
+        )
+        return self.stats
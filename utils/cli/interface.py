@@ -2,19 +2,33 @@ import argparse
 import sys
 import logging
 from rich.console import Console
-from rich.markdown import Markdown
-from utils.crawler.crawler import DocumentationCrawler
-from utils.crawler.extractor import ContentExtractor
-from utils.processor.indexer import DocumentProcessor
-from utils.qa.query_processor import QueryProcessor
-from utils.llm.gemini import GeminiLLM
+from utils.knowledge_base.cache import Cache, CrawlManifest
+from utils.knowledge_base.index_manifest import IndexManifest
+from utils.knowledge_base.lexical_index import BM25Index
+from utils.metrics import metrics
+from utils.progress import ProgressTracker
 import os
-from dotenv import load_dotenv
+import threading
 
-load_dotenv()
+# Subsystems with slow imports (crawler, langchain, Chroma, Gemini SDK) are
+# imported where they are first used, so `--help` and warm starts skip them
 
 console = Console()
 
+class StreamingMarkdown:
+    """Renderable for an answer that is still growing.
+    
+    The text is only parsed as Markdown when ``Live`` refreshes the screen,
+    not once per received chunk.
+    """
+    
+    def __init__(self):
+        self.text = ""
+    
+    def __rich_console__(self, console, options):
+        from rich.markdown import Markdown
+        yield Markdown(self.text)
+
 class QAAgentCLI:
     """Command Line Interface for the Q&A Agent."""
     
@@ -23,6 +37,11 @@ class QAAgentCLI:
         self.query_processor = None
         self.llm = None
         self.api_key = os.getenv("GOOGLE_API_KEY")
+        self.manifest = None
+        self.embeddings = None
+        self.answer_cache = None
+        self.refresh_thread = None
+        self.stream_answers = True
         
     def parse_args(self):
         """Parse command line arguments."""
@@ -31,6 +50,42 @@ class QAAgentCLI:
         parser.add_argument("--max-pages", type=int, default=100, help="Maximum number of pages to crawl")
         parser.add_argument("--persist-dir", default="./chroma_db", help="Directory to persist vector store")
         parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+        parser.add_argument("--async-crawl", action="store_true", help="Crawl with the asyncio engine instead of worker threads")
+        parser.add_argument("--concurrency", type=int, default=None, help="Number of concurrent crawl workers")
+        parser.add_argument("--crawl-delay", type=float, default=None, help="Fixed minimum delay in seconds between requests to a host (default: adapt to robots.txt and the site's responses)")
+        parser.add_argument("--max-retries", type=int, default=2, help="Retries of a page fetch that times out or gets a 429/5xx response")
+        parser.add_argument("--ignore-robots", action="store_true", help="Do not fetch or obey robots.txt")
+        parser.add_argument("--no-dedup", action="store_true", help="Embed near-duplicate pages and chunks instead of keeping one canonical copy")
+        parser.add_argument("--no-sitemap", action="store_true", help="Discover pages only by following links, without reading sitemaps")
+        parser.add_argument("--extract-workers", type=int, default=4, help="Number of extraction workers in the ingestion pipeline")
+        parser.add_argument("--extract-processes", type=int, default=None, help="Parse and extract pages in a pool of N processes (0 = one per CPU core)")
+        parser.add_argument("--full-recrawl", action="store_true", help="Ignore the crawl manifest and re-download every page")
+        parser.add_argument("--local-embeddings", action="store_true", help="Use deterministic local embeddings instead of the Google embedding API")
+        parser.add_argument("--vector-store", choices=["chroma", "numpy"], default="chroma", help="Vector store backend: Chroma, or the built-in memory-mapped NumPy index")
+        parser.add_argument("--ivf-lists", type=int, default=0, help="With --vector-store numpy, cluster vectors into N IVF lists for approximate search on large indexes (0 = exact search)")
+        parser.add_argument("--nprobe", type=int, default=8, help="IVF lists scanned per query with --ivf-lists")
+        parser.add_argument("--quantization", choices=["int8", "binary"], default=None, help="With --vector-store numpy, scan int8 (4x smaller) or binary (32x smaller) codes first and rescore the best candidates at full precision")
+        parser.add_argument("--rescore-factor", type=int, default=10, help="With --quantization, candidates rescored at full precision per requested result")
+        parser.add_argument("--answer-cache-ttl", type=int, default=86400, help="Seconds to reuse a cached answer (0 disables the answer cache)")
+        parser.add_argument("--semantic-cache-distance", type=float, default=-1, help="Max cosine distance for reusing the answer of a similar question, e.g. 0.05 (negative disables, the default)")
+        parser.add_argument("--priority-prefix", action="append", default=[], help="Crawl URLs under this path prefix first (repeatable)")
+        parser.add_argument("--context-tokens", type=int, default=1500, help="Token budget for the context sent to the LLM (0 sends the raw top chunks)")
+        parser.add_argument("--fake-llm", action="store_true", help="Answer with an offline fake model instead of Gemini (testing)")
+        parser.add_argument("--no-stream", action="store_true", help="Wait for the complete answer instead of streaming it")
+        parser.add_argument("--questions", help="Answer the questions in this JSONL file instead of starting an interactive session")
+        parser.add_argument("--out", default="answers.jsonl", help="JSONL file the answers of --questions are written to")
+        parser.add_argument("--batch-concurrency", type=int, default=8, help="Questions answered concurrently in batch mode")
+        parser.add_argument("--rate-limit", type=float, default=0, help="Max LLM requests per minute in batch mode (0 = unlimited)")
+        parser.add_argument("--serve", action="store_true", help="Serve questions over HTTP instead of starting an interactive session")
+        parser.add_argument("--host", default="127.0.0.1", help="Address the server listens on")
+        parser.add_argument("--port", type=int, default=8080, help="Port the server listens on")
+        parser.add_argument("--server-workers", type=int, default=8, help="Threads for retrieval and generation in server mode")
+        parser.add_argument("--max-pending", type=int, default=64, help="Questions processed at once before the server answers 503")
+        parser.add_argument("--request-timeout", type=float, default=60, help="Seconds before a server request times out")
+        parser.add_argument("--stats", action="store_true", help="Print a summary of timings, counters and cache hit rates when the run ends")
+        parser.add_argument("--metrics-out", help="Write metrics to this file at the end of the run (.json with a span trace, otherwise Prometheus text)")
+        parser.add_argument("--rebuild", action="store_true", help="Discard the persisted index and crawl the site from scratch")
+        parser.add_argument("--refresh", action="store_true", help="When a persisted index is reused, recrawl the site in the background")
         
         return parser.parse_args()
     
@@ -43,49 +98,264 @@ class QAAgentCLI:
             handlers=[logging.StreamHandler()]
         )
     
+    def load_manifest(self, args):
+        """Load the crawl manifest stored alongside the vector store."""
+        cache = Cache(os.path.join(args.persist_dir, "crawl_cache"), expiry_days=30)
+        manifest = CrawlManifest(cache, args.url)
+        if args.full_recrawl:
+            manifest.entries = {}
+        return manifest
+    
+    def create_crawler(self, args):
+        """Create the crawler selected by the command line options."""
+        from utils.crawler.crawler import DocumentationCrawler
+        from utils.crawler.async_crawler import AsyncDocumentationCrawler
+        from utils.crawler.frontier import path_prefix_priority
+        
+        crawler_cls = AsyncDocumentationCrawler if args.async_crawl else DocumentationCrawler
+        kwargs = {'max_pages': args.max_pages, 'manifest': self.manifest,
+                  'keep_raw': args.extract_processes is not None, 'max_retries': args.max_retries}
+        if args.priority_prefix:
+            kwargs['priority'] = path_prefix_priority(args.priority_prefix)
+        if args.concurrency:
+            kwargs['concurrency'] = args.concurrency
+        if args.crawl_delay is not None:
+            kwargs['crawl_delay'] = args.crawl_delay
+        if args.no_sitemap:
+            kwargs['use_sitemaps'] = False
+        if args.ignore_robots:
+            kwargs['respect_robots'] = False
+        else:
+            kwargs['robots_cache'] = self.manifest.cache if self.manifest else None
+        return crawler_cls(args.url, **kwargs)
+    
+    def build_index(self, args, processor, lexical_index, show_progress=False):
+        """Crawl, extract, chunk and embed the site into the vector store."""
+        from utils.crawler.extractor import ContentExtractor
+        from utils.crawler.parallel_extractor import ParallelExtractor
+        from utils.processor.dedup import DEDUP_INDEX_FILE, NearDuplicateDetector
+        from utils.processor.pipeline import IngestionPipeline
+        
+        crawler = self.create_crawler(args)
+        extract_workers = args.extract_workers
+        if args.extract_processes is not None:
+            extractor = ParallelExtractor(max_workers=args.extract_processes or None)
+            # Enough dispatcher threads to keep every process busy
+            extract_workers = max(extract_workers, extractor.max_workers)
+        else:
+            extractor = ContentExtractor()
+        tracker = ProgressTracker("Crawling and indexing") if show_progress else None
+        
+        def on_progress(stats):
+            tracker.update(stats["pages"], args.max_pages)
+            tracker.set_description(f"{stats['pages']} pages, {stats['chunks']} chunks, {stats['added']} embedded")
+        
+        dedup = None if args.no_dedup else NearDuplicateDetector.load(os.path.join(args.persist_dir, DEDUP_INDEX_FILE))
+        pipeline = IngestionPipeline(
+            crawler, extractor, processor, self.vector_store, extract_workers=extract_workers,
+            lexical_index=lexical_index, on_progress=on_progress if tracker else None, dedup=dedup
+        )
+        try:
+            if tracker:
+                with tracker:
+                    stats = pipeline.run()
+                    tracker.update(stats["pages"], stats["pages"] or 1)
+            else:
+                stats = pipeline.run()
+        finally:
+            if isinstance(extractor, ParallelExtractor):
+                extractor.close()
+        
+        for url in pipeline.removed_urls:
+            self.manifest.remove(url)
+        self.manifest.save()
+        
+        # Only a completed ingestion marks the index as reusable
+        if stats["pages"]:
+            IndexManifest.for_processor(args.url, processor).save(args.persist_dir, stats["pages"], len(lexical_index))
+        return stats
+    
+    def create_answer_cache(self, args, lexical_index):
+        """Create the answer cache for the current index version."""
+        if args.answer_cache_ttl <= 0:
+            return None
+        from utils.qa.answer_cache import AnswerCache, index_version
+        
+        # Answers are cached per index version, so a changed index starts fresh
+        return AnswerCache(
+            Cache(os.path.join(args.persist_dir, "answer_cache"), expiry_days=max(1, args.answer_cache_ttl // 86400)),
+            index_version(lexical_index),
+            embeddings=self.embeddings,
+            ttl_seconds=args.answer_cache_ttl,
+            semantic_distance=args.semantic_cache_distance if args.semantic_cache_distance >= 0 else None
+        )
+    
+    def refresh_index(self, args, processor):
+        """Recrawl the site in the background while questions are answered from the current index."""
+        try:
+            # Indexed into a private copy of the lexical index, swapped in once complete
+            lexical_index = BM25Index.load(self.query_processor.lexical_index.path)
+            stats = self.build_index(args, processor, lexical_index)
+            self.query_processor.lexical_index = lexical_index
+            if self.answer_cache:
+                # Updated in place: the batch runner and the server hold this object
+                from utils.qa.answer_cache import index_version
+                self.answer_cache.set_version(index_version(lexical_index))
+            logging.info(
+                f"Background refresh finished: {stats['pages']} pages ({stats['unchanged']} unchanged), "
+                f"{stats['added']} chunks embedded, {stats['deleted']} deleted"
+            )
+        except Exception as e:
+            logging.error(f"Background refresh failed: {e}", exc_info=True)
+    
     def initialize(self, args):
         """Initialize the agent components."""
+        from utils.knowledge_base.embeddings import create_embeddings
+        from utils.processor.indexer import DocumentProcessor
+        from utils.qa.query_processor import QueryProcessor
+        from utils.qa.context import ContextAssembler
+        from utils.llm.gemini import GeminiLLM
+        
         console.print("[bold blue]Initializing Documentation Q&A Agent...[/bold blue]")
         
         # Set up logging
         self.setup_logging(args.verbose)
         
-        # Crawl documentation site
-        console.print(f"[bold]Crawling documentation from {args.url}...[/bold]")
-        crawler = DocumentationCrawler(args.url, max_pages=args.max_pages)
-        crawled_content = crawler.crawl()
+        # Set up the processing and indexing components
+        self.embeddings = create_embeddings(
+            self.api_key,
+            cache_dir=os.path.join(args.persist_dir, "embedding_cache"),
+            local=args.local_embeddings
+        )
+        vector_options = {}
+        if args.vector_store == "numpy":
+            vector_options = {"ivf_lists": args.ivf_lists, "nprobe": args.nprobe,
+                              "quantization": args.quantization, "rescore_factor": args.rescore_factor}
+        processor = DocumentProcessor(api_key=self.api_key, embeddings=self.embeddings,
+                                      vector_backend=args.vector_store, vector_options=vector_options)
+        self.vector_store = processor.open_vector_store(args.persist_dir)
         
-        if not crawled_content:
-            console.print("[bold red]Error: Failed to crawl any content from the provided URL.[/bold red]")
-            sys.exit(1)
+        # Reuse the persisted index when it was built for this site with the same settings
+        wanted = IndexManifest.for_processor(args.url, processor)
+        stored = IndexManifest.load(args.persist_dir)
+        warm = stored is not None and stored.matches(wanted) and not args.rebuild
+        if args.rebuild or (stored is not None and not stored.matches(wanted)):
+            # Chunks cut or embedded differently cannot be mixed with new ones, and the
+            # crawl manifest of another site would never remove that site's pages
+            if stored is not None and not stored.same_site(wanted):
+                console.print(f"[bold]The persisted index was built for {stored.url}, rebuilding it for {args.url}...[/bold]")
+            else:
+                console.print("[bold]Discarding the persisted index and rebuilding it...[/bold]")
+            IndexManifest.clear(args.persist_dir)
+            self.vector_store = processor.reset_index(self.vector_store, args.persist_dir)
+            args.full_recrawl = True
+        lexical_index = processor.open_lexical_index(self.vector_store, args.persist_dir)
         
-        # Extract meaningful content
-        console.print("[bold]Extracting content from crawled pages...[/bold]")
-        extractor = ContentExtractor()
-        for url, content in crawled_content.items():
-            if content and content.get('html'):
-                content['extracted'] = extractor.extract_content(content['html'])
+        # Load crawl state from previous runs so unchanged pages can be skipped
+        self.manifest = self.load_manifest(args)
         
-        # Process and index documents
-        console.print("[bold]Processing and indexing documents...[/bold]")
-        processor = DocumentProcessor(api_key=self.api_key)
-        documents = processor.create_documents(crawled_content)
-        chunked_docs = processor.split_documents(documents)
+        if warm:
+            console.print(
+                f"[bold]Using the persisted index of {stored.url} "
+                f"({stored.pages} pages, {stored.chunks} chunks, crawled {stored.crawled_at})[/bold]"
+            )
+        else:
+            # Crawl, extract, chunk and embed as one streaming pipeline
+            console.print(f"[bold]Crawling and indexing documentation from {args.url}...[/bold]")
+            stats = self.build_index(args, processor, lexical_index, show_progress=not args.verbose)
+            
+            if not stats["pages"]:
+                console.print("[bold red]Error: Failed to crawl any content from the provided URL.[/bold red]")
+                sys.exit(1)
         
-        # Create vector store
-        console.print("[bold]Creating vector store...[/bold]")
-        self.vector_store = processor.create_vector_store(chunked_docs, args.persist_dir)
+            if stats["unchanged"]:
+                console.print(f"[bold]{stats['unchanged']} of {stats['pages']} pages unchanged since the last crawl[/bold]")
+            console.print(f"[bold]Indexed {stats['chunks']} chunks ({stats['added']} newly embedded)[/bold]")
         
         # Initialize query processor
-        self.query_processor = QueryProcessor(self.vector_store, self.api_key)
+        context_assembler = ContextAssembler(max_tokens=args.context_tokens) if args.context_tokens > 0 else None
+        self.query_processor = QueryProcessor(
+            self.vector_store, self.api_key, embeddings=self.embeddings, lexical_index=lexical_index,
+            context_assembler=context_assembler
+        )
+        self.answer_cache = self.create_answer_cache(args, lexical_index)
+        
+        if warm and args.refresh:
+            console.print("[bold]Refreshing the index in the background...[/bold]")
+            self.refresh_thread = threading.Thread(target=self.refresh_index, args=(args, processor), daemon=True)
+            self.refresh_thread.start()
         
         # Initialize LLM
-        self.llm = GeminiLLM(self.api_key)
+        fake_model = None
+        if args.fake_llm:
+            from utils.llm.fake import FakeStreamingModel
+            fake_model = FakeStreamingModel(chunk_delay=0.02)
+        self.llm = GeminiLLM(self.api_key, model=fake_model)
+        self.stream_answers = not args.no_stream
         
         console.print("[bold green]Initialization complete! Ask me questions about the documentation.[/bold green]")
     
+    def stream_answer(self, query, contexts, history):
+        """Render the answer while it is generated and return the final result."""
+        from rich.live import Live
+        
+        stream = self.llm.stream_answer(query, contexts, history)
+        view = StreamingMarkdown()
+        with Live(view, console=console, refresh_per_second=12, vertical_overflow="visible"):
+            for chunk in stream:
+                view.text += chunk
+        return stream.result
+    
+    def run_batch(self, args):
+        """Answer a file of questions without user interaction."""
+        from utils.cli.batch import BatchRunner
+        
+        console.print(f"[bold]Answering questions from {args.questions}...[/bold]")
+        runner = BatchRunner(
+            self.query_processor, self.llm, answer_cache=self.answer_cache,
+            concurrency=args.batch_concurrency, rate_limit=args.rate_limit
+        )
+        stats = runner.run(args.questions, args.out)
+        console.print(
+            f"[bold green]Wrote {stats['answered']} answers to {args.out} in {stats['seconds']}s "
+            f"({stats['cached']} cached, {stats['errors']} errors)[/bold green]"
+        )
+    
+    def run_server(self, args):
+        """Serve questions over HTTP from the loaded index."""
+        from utils.cli.server import QAServer
+        
+        server = QAServer(
+            self.query_processor, self.llm, answer_cache=self.answer_cache, workers=args.server_workers,
+            max_pending=args.max_pending, timeout=args.request_timeout
+        )
+        console.print(f"[bold green]Serving on http://{args.host}:{args.port} (POST /ask, POST /ask/stream)[/bold green]")
+        server.run(args.host, args.port)
+    
+    def close(self):
+        """Release the stores opened by ``initialize()``."""
+        if self.answer_cache:
+            self.answer_cache.close()
+    
+    def report_metrics(self, args):
+        """Print and/or export the metrics collected during the run."""
+        if args.metrics_out:
+            metrics.export(args.metrics_out)
+            console.print(f"[bold]Metrics written to {args.metrics_out}[/bold]")
+        if args.stats:
+            from rich.table import Table
+            
+            table = Table(title="Run statistics")
+            table.add_column("Metric", overflow="fold")
+            table.add_column("Value")
+            for name, value in metrics.summary():
+                table.add_row(name, value)
+            console.print(table)
+    
     def run_interactive_session(self):
         """Run an interactive Q&A session."""
+        from rich.markdown import Markdown
+        
         if not self.query_processor or not self.llm:
             console.print("[bold red]Error: Agent not properly initialized.[/bold red]")
             return
@@ -102,18 +372,28 @@ class QAAgentCLI:
                     console.print("[bold blue]Goodbye![/bold blue]")
                     break
                 
-                # Process query
-                contexts = self.query_processor.process_query(query)
+                # Reuse the answer to a repeated (or near-identical) question
+                result = self.answer_cache.get(query) if self.answer_cache else None
                 
-                if not contexts:
-                    console.print("[italic yellow]I couldn't find any relevant information in the documentation.[/italic yellow]")
-                    continue
+                if result is None:
+                    # Process query
+                    contexts = self.query_processor.process_query(query)
                 
-                # Generate answer
-                result = self.llm.generate_answer(query, contexts, history)
+                    if not contexts:
+                        console.print("[italic yellow]I couldn't find any relevant information in the documentation.[/italic yellow]")
+                        continue
                 
-                # Display answer
-                console.print(Markdown(result["answer"]))
+                    # Generate answer, showing it as it streams in
+                    if self.stream_answers:
+                        result = self.stream_answer(query, contexts, history)
+                    else:
+                        result = self.llm.generate_answer(query, contexts, history)
+                        console.print(Markdown(result["answer"]))
+                    if self.answer_cache and result["confidence"] > 0:
+                        self.answer_cache.put(query, result)
+                else:
+                    # Display answer
+                    console.print(Markdown(result["answer"]))
                 
                 # Display sources
                 if result["source_urls"]:
@@ -134,10 +414,22 @@ class QAAgentCLI:
 
 def main():
     """Main entry point for the CLI."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     cli = QAAgentCLI()
     args = cli.parse_args()
-    cli.initialize(args)
-    cli.run_interactive_session()
+    try:
+        cli.initialize(args)
+        if args.questions:
+            cli.run_batch(args)
+        elif args.serve:
+            cli.run_server(args)
+        else:
+            cli.run_interactive_session()
+    finally:
+        cli.report_metrics(args)
+        cli.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
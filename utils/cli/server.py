@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+from aiohttp import web
+from utils.cli.batch import NO_CONTEXT_ANSWER, answer_question
+from utils.metrics import metrics
+from utils.qa.answer_cache import normalize_query
+
+
+class QAServer:
+    """HTTP front end sharing one loaded index between many users.
+
+    Endpoints:
+      POST /ask          {"question": ...} -> answer JSON
+      POST /ask/stream   {"question": ...} -> NDJSON: {"chunk": ...} lines, then the result
+      GET  /health       load and counters
+      GET  /metrics      all metrics in Prometheus text format
+
+    Blocking work (answer cache, Chroma, Gemini) runs on a bounded thread
+    pool. Identical questions that arrive while one is being answered share
+    that answer instead of starting another. At most ``max_pending``
+    distinct questions are processed at once; further ones are rejected
+    with 503 and a Retry-After header. A request that takes longer than
+    ``timeout`` seconds gets 504 (its answer is still cached when it completes).
+    A stream whose client times out or disconnects is cancelled between
+    chunks, and it holds its admission slot until its worker has stopped.
+    """
+
+    def __init__(self, query_processor, llm, answer_cache=None, workers: int = 8,
+                 max_pending: int = 64, timeout: float = 60):
+        self.query_processor = query_processor
+        self.llm = llm
+        self.answer_cache = answer_cache
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qa")
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.streams = 0
+        self.stats = {"requests": 0, "coalesced": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    def _pending(self) -> int:
+        return len(self.in_flight) + self.streams
+
+    def _reject(self) -> web.Response:
+        self.stats["rejected"] += 1
+        return web.json_response({"error": "Server busy, try again later"}, status=503, headers={"Retry-After": "1"})
+
+    async def _question(self, request: web.Request) -> str:
+        if request.method == "GET":
+            question = request.query.get("q", "")
+        else:
+            try:
+                body = await request.json()
+            except ValueError:
+                raise web.HTTPBadRequest(text="Expected a JSON body")
+            question = body.get("question", "") if isinstance(body, dict) else ""
+        if not question.strip():
+            raise web.HTTPBadRequest(text="Missing question")
+        return question
+
+    def _answer(self, question: str) -> Dict[str, Any]:
+        result, source = answer_question(self.query_processor, self.llm, question, self.answer_cache)
+        return {**result, "cached": source == "cache"}
+
+    async def ask(self, request: web.Request) -> web.Response:
+        question = await self._question(request)
+        self.stats["requests"] += 1
+        key = normalize_query(question)
+        future = self.in_flight.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.stats["coalesced"] += 1
+        else:
+            if self._pending() >= self.max_pending:
+                return self._reject()
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self._answer, question)
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+        try:
+            # Shielded: one caller timing out must not cancel the shared work
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return web.json_response({"error": "Timed out"}, status=504)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logging.error(f"Failed to answer {question!r}: {e}", exc_info=True)
+            return web.json_response({"error": "Failed to answer the question"}, status=500)
+        return web.json_response({**result, "coalesced": coalesced})
+
+    def _stream_finished(self):
+        self.streams -= 1
+
+    def _stream_worker(self, question: str, loop, queue: asyncio.Queue, cancelled: threading.Event):
+        """Runs on the pool: push answer chunks, then the final result, onto the queue.
+
+        Stops early (without caching a partial answer) once ``cancelled`` is set.
+        """
+        def put(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        try:
+            if cancelled.is_set():
+                return
+            result = self.answer_cache.get(question) if self.answer_cache else None
+            if result is not None:
+                put({"chunk": result["answer"]})
+                put({"done": True, **result, "cached": True})
+                return
+            contexts = self.query_processor.process_query(question)
+            if not contexts:
+                put({"chunk": NO_CONTEXT_ANSWER})
+                put({"done": True, "answer": NO_CONTEXT_ANSWER, "source_urls": [], "confidence": 0, "cached": False})
+                return
+            stream = self.llm.stream_answer(question, contexts)
+            chunks = iter(stream)
+            try:
+                for chunk in chunks:
+                    if cancelled.is_set():
+                        metrics.inc("server_streams_cancelled_total")
+                        return
+                    put({"chunk": chunk})
+            finally:
+                chunks.close()
+            if self.answer_cache and stream.result["confidence"] > 0:
+                self.answer_cache.put(question, stream.result)
+            put({"done": True, **stream.result, "cached": False})
+        except Exception as e:
+            logging.error(f"Failed to stream an answer to {question!r}: {e}", exc_info=True)
+            put({"done": True, "error": "Failed to answer the question"})
+        finally:
+            # The slot is only free once generation has actually stopped
+            loop.call_soon_threadsafe(self._stream_finished)
+
+    async def ask_stream(self, request: web.Request) -> web.StreamResponse:
+        question = await self._question(request)
+        self.stats["requests"] += 1
+        if self._pending() >= self.max_pending:
+            return self._reject()
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+        self.streams += 1
+        loop.run_in_executor(self.executor, self._stream_worker, question, loop, queue, cancelled)
+        try:
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            deadline = loop.time() + self.timeout
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    self.stats["timeouts"] += 1
+                    item = {"done": True, "error": "Timed out"}
+                await response.write((json.dumps(item) + "\n").encode())
+                if item.get("done"):
+                    break
+            await response.write_eof()
+            return response
+        finally:
+            # Timed out, disconnected or done: a still running worker stops at its next chunk
+            cancelled.set()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "pending": self._pending(), **self.stats})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=metrics.to_prometheus(), content_type="text/plain")
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/ask", self.ask)
+        app.router.add_post("/ask", self.ask)
+        app.router.add_post("/ask/stream", self.ask_stream)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.metrics)
+        app.on_cleanup.append(self._shutdown)
+        return app
+
+    async def _shutdown(self, app):
+        self.executor.shutdown(wait=False)
+
+    def run(self, host: str = "127.0.0.1", port: int = 8080):
+        """Serve until interrupted."""
+        web.run_app(self.create_app(), host=host, port=port, print=None)
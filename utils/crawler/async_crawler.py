@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+import aiohttp
+from urllib.parse import urlparse
+from utils.crawler.crawler import DocumentationCrawler, declared_charset
+from utils.metrics import metrics
+
+
+class AsyncDocumentationCrawler(DocumentationCrawler):
+    """Asyncio crawler with a continuously refilled worker pool.
+
+    All workers share one ``aiohttp`` session whose connector keeps a pool of
+    keep-alive connections, and every worker picks up the next URL as soon as
+    it finishes its current page instead of waiting for a whole batch.
+    Politeness (robots.txt, per-host pacing) works as in the threaded
+    crawler, except that robots.txt is fetched with the shared session and
+    waiting for a host's next slot never blocks the event loop.
+    """
+
+    def __init__(self, base_url, max_pages=200, concurrency=16, crawl_delay=None, priority=None,
+                 manifest=None, keep_raw=False, timeout=10, user_agent="DocQABot/1.0", respect_robots=True,
+                 robots_cache=None, use_sitemaps=True, max_retries=2):
+        super().__init__(base_url, max_pages=max_pages, concurrency=concurrency, crawl_delay=crawl_delay,
+                         priority=priority, manifest=manifest, keep_raw=keep_raw, user_agent=user_agent,
+                         respect_robots=respect_robots, robots_cache=robots_cache, use_sitemaps=use_sitemaps,
+                         max_retries=max_retries)
+        self.timeout = timeout
+        self.in_flight = 0
+
+    async def fetch_page(self, session, url):
+        """Fetch and parse a single page, returning (url, content)."""
+        async def fetch():
+            await self.scheduler.wait(url)
+            start = time.monotonic()
+            try:
+                with metrics.span("crawl_fetch"):
+                    async with session.get(url, headers=self.request_headers(url)) as response:
+                        self.scheduler.record(url, response.status, time.monotonic() - start,
+                                              response.headers.get('Retry-After'))
+                        response.raise_for_status()
+                        body = await response.read()
+                        encoding = declared_charset(response.headers.get('Content-Type'))
+                        return response.status, response.headers, str(response.url), body, encoding
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                # No response at all (timeout, refused connection): back off the host
+                self.scheduler.record(url, None)
+                raise
+
+        try:
+            status, headers, final_url, body, encoding = await self.resilience.call_async(
+                urlparse(url).netloc, fetch, retry_after=False  # the scheduler waits out Retry-After
+            )
+            self.record_response(status, len(body))
+
+            body_hash = self.manifest.hash_body(body) if self.manifest else None
+            content = self.unchanged_content(url, status, headers, body_hash)
+            if content:
+                return url, content
+
+            if self.keep_raw:
+                content = self.scan_raw_page(final_url, body, encoding)
+            else:
+                # BeautifulSoup parsing is CPU-bound, keep it off the event loop
+                loop = asyncio.get_running_loop()
+                content = await loop.run_in_executor(None, self.parse_page, final_url, body, encoding)
+            content['url'] = url
+            self.record_page(url, headers, body_hash, content)
+            return url, content
+        except Exception as e:
+            self.record_error(url, e)
+            return url, None
+
+    async def _worker(self, session, frontier_changed, on_page):
+        """Keep taking URLs from the frontier until it is drained and no page is in flight."""
+        while len(self.visited_urls) < self.max_pages:
+            if not self.frontier:
+                if self.in_flight == 0:
+                    return
+                # Other workers may still discover links; wait for one of them
+                frontier_changed.clear()
+                await frontier_changed.wait()
+                continue
+
+            url, depth = self.frontier.pop()
+            self.visited_urls.add(url)
+            self.in_flight += 1
+            try:
+                url, content = await self.fetch_page(session, url)
+                if content:
+                    if on_page is None:
+                        self.content_by_url[url] = content
+                    else:
+                        # A blocking consumer (e.g. a bounded queue) slows this
+                        # worker down without stalling the event loop
+                        loop = asyncio.get_running_loop()
+                        await loop.run_in_executor(None, self.store_page, url, content, on_page)
+                    for link in content['links']:
+                        self.frontier.add(link, depth + 1)
+            finally:
+                self.in_flight -= 1
+                frontier_changed.set()
+
+    async def crawl_async(self, on_page=None):
+        """Crawl the documentation website using asyncio workers."""
+        logging.info(f"Starting async crawl from {self.base_url} with {self.concurrency} workers")
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {'User-Agent': self.user_agent}
+        frontier_changed = asyncio.Event()
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            if self.robots is not None:
+                await self.robots.load_async(session, self.base_url)
+            if not self.apply_robots():
+                return self.content_by_url
+            if self.use_sitemaps:
+                # Sitemap reading streams with blocking requests
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.seed_from_sitemaps, on_page)
+            await asyncio.gather(*(
+                self._worker(session, frontier_changed, on_page)
+                for _ in range(self.concurrency)
+            ))
+
+        logging.info(f"Crawl complete. Processed {len(self.content_by_url)} pages.")
+        return self.content_by_url
+
+    def crawl(self, on_page=None):
+        """Run the async crawl to completion from synchronous code."""
+        return asyncio.run(self.crawl_async(on_page))
@@ -1,93 +1,364 @@
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urldefrag
+import heapq
+import html
+import re
 import time
 import logging
 from concurrent.futures import ThreadPoolExecutor
-from utils.error_handler import handle_request_error
+from datetime import datetime
+from utils.crawler.frontier import CrawlFrontier, canonicalize_url
+from utils.crawler.robots import RobotsChecker
+from utils.crawler.scheduler import PolitenessScheduler
+from utils.crawler.sitemap import EPOCH, SitemapReader
+from utils.error_handler import ResiliencePolicy, handle_request_error
+from utils.metrics import metrics
+
+# Cheap link/title scanning for raw pages that are parsed elsewhere
+HREF_PATTERN = re.compile(r'<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.IGNORECASE)
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w-]+)', re.IGNORECASE)
+HEADER_CHARSET_PATTERN = re.compile(r'charset\s*=\s*["\']?([\w-]+)', re.IGNORECASE)
+
+
+def declared_charset(content_type):
+    """Charset named by a Content-Type header, or None.
+    
+    HTTP clients fall back to ISO-8859-1 for text/html without one, which
+    would override the page's own ``<meta charset>``; with None the parser
+    reads the meta tag (or detects the encoding) instead.
+    """
+    match = HEADER_CHARSET_PATTERN.search(content_type or '')
+    return match.group(1) if match else None
 
 
 class DocumentationCrawler:
-    def __init__(self, base_url, max_pages=200, concurrency=5, crawl_delay=1):
+    """Threaded crawler for a documentation site.
+    
+    Requests to each host are paced by a ``PolitenessScheduler``: a fixed
+    spacing of ``crawl_delay`` seconds if given, otherwise a rate that adapts
+    to the site's responses. robots.txt is fetched once before crawling (and
+    cached in ``robots_cache`` when one is given); its Crawl-delay or
+    Request-rate caps the rate and disallowed URLs never enter the frontier.
+    
+    With ``use_sitemaps`` the pages listed in the site's sitemaps are queued
+    up front, most recently modified first, so deep pages don't wait for
+    link discovery; pages whose ``lastmod`` predates their last crawl are
+    taken from the manifest without being requested at all.
+    
+    Transient failures (timeouts, 429 and 5xx responses) are retried up to
+    ``max_retries`` times with jittered backoff that honours Retry-After, and
+    a host that keeps failing trips a circuit breaker so the remaining pages
+    fail fast instead of each waiting out its own timeouts.
+    """
+    
+    def __init__(self, base_url, max_pages=200, concurrency=5, crawl_delay=None, priority=None, manifest=None,
+                 keep_raw=False, user_agent="DocQABot/1.0", respect_robots=True, robots_cache=None,
+                 use_sitemaps=True, max_retries=2):
         self.base_url = base_url
         self.max_pages = max_pages
         self.visited_urls = set()
-        self.queue = [base_url]
+        self.frontier = CrawlFrontier(priority)
+        self.frontier.add(base_url)
         self.content_by_url = {}
         self.concurrency = concurrency
         self.crawl_delay = crawl_delay
+        self.user_agent = user_agent
+        self.scheduler = PolitenessScheduler(crawl_delay)
+        # Hosts are already paced by the scheduler, so no concurrency limit here
+        self.resilience = ResiliencePolicy(max_retries=max_retries, base_delay=1.0)
+        self.robots = RobotsChecker(robots_cache, user_agent=user_agent,
+                                    resilience=self.resilience) if respect_robots else None
+        self.disallowed_urls = set()
+        self.use_sitemaps = use_sitemaps
         self.domain = urlparse(base_url).netloc
+        self.manifest = manifest
+        self.unchanged_urls = set()
+        self.gone_urls = set()
+        # Keep raw bytes instead of a parsed tree (for process-pool extraction)
+        self.keep_raw = keep_raw
         
     def is_same_domain(self, url):
         """Check if URL belongs to the same domain."""
         return urlparse(url).netloc == self.domain
+    
+    def is_allowed(self, url):
+        """Check robots.txt rules for a URL, remembering the ones it excludes."""
+        if self.robots is None or self.robots.is_allowed(url):
+            return True
+        if url not in self.disallowed_urls:
+            self.disallowed_urls.add(url)
+            metrics.inc("crawl_disallowed_total")
+        return False
+    
+    def apply_robots(self):
+        """Apply the base host's robots.txt (already loaded) before crawling.
+        
+        Returns False if the start page itself is disallowed.
+        """
+        if self.robots is None:
+            return True
+        delay = self.robots.crawl_delay(self.base_url)
+        if delay:
+            logging.info(f"robots.txt asks for {delay:g}s between requests to {self.domain}")
+            self.scheduler.set_interval(self.base_url, delay)
+        if not self.is_allowed(self.base_url):
+            logging.warning(f"robots.txt disallows crawling {self.base_url}")
+            return False
+        return True
         
     def extract_links(self, soup, current_url):
         """Extract all links from a page that belong to the same domain."""
-        links = []
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            full_url = urljoin(current_url, href)
+        return self.filter_links((a_tag['href'] for a_tag in soup.find_all('a', href=True)), current_url)
+    
+    def in_scope(self, url):
+        """Check if a URL is a same-domain documentation page we may crawl."""
+        return (self.is_same_domain(url) and
+                not url.endswith(('.png', '.jpg', '.pdf', '.zip', '.epub')) and
+                self.is_allowed(url))
+    
+    def filter_links(self, hrefs, current_url):
+        """Resolve hrefs and keep only same-domain documentation pages."""
+        links = {}
+        for href in hrefs:
+            full_url, _ = urldefrag(urljoin(current_url, href))
             
-            # Filter URLs to keep only documentation pages
-            if (self.is_same_domain(full_url) and 
-                not full_url.endswith(('.png', '.jpg', '.pdf', '.zip', '.epub')) and
-                '#' not in full_url and
-                full_url not in self.visited_urls):
-                links.append(full_url)
+            # Filter URLs to keep only documentation pages; the frontier
+            # takes care of pages that were already seen
+            if self.in_scope(full_url):
+                links[full_url] = True
                 
-        return links
+        return list(links)
+    
+    def parse_page(self, url, body, encoding=None):
+        """Parse a fetched HTML body (bytes, in ``encoding`` if the server declared one) into the content dict."""
+        soup = BeautifulSoup(body, 'html.parser', from_encoding=encoding)
+        return {
+            'url': url,
+            'title': soup.title.text if soup.title else url,
+            'html': soup,
+            'links': self.extract_links(soup, url)
+        }
+    
+    def scan_raw_page(self, url, body, encoding):
+        """Build the content dict for a page without parsing it.
+        
+        Links and title are found with regular expressions; the raw bytes are
+        kept so that full parsing can happen in a worker process.
+        """
+        meta = None if encoding else CHARSET_PATTERN.search(body[:2048])
+        try:
+            text = body.decode(encoding or (meta.group(1).decode() if meta else 'utf-8'), errors='replace')
+        except LookupError:
+            text = body.decode('utf-8', errors='replace')
+        title = TITLE_PATTERN.search(text)
+        hrefs = (html.unescape(next(group for group in match.groups() if group is not None))
+                 for match in HREF_PATTERN.finditer(text))
+        return {
+            'url': url,
+            'title': html.unescape(title.group(1)).strip() if title else url,
+            'html': None,
+            'raw': body,
+            'encoding': encoding,
+            'links': self.filter_links(hrefs, url)
+        }
+    
+    def request_headers(self, url):
+        """User-Agent plus conditional GET headers for a URL recorded in the manifest."""
+        headers = {'User-Agent': self.user_agent}
+        if self.manifest:
+            headers.update(self.manifest.conditional_headers(url))
+        return headers
+    
+    def unchanged_content(self, url, status_code, headers, body_hash=None):
+        """Return manifest-backed content if the page did not change since the last crawl."""
+        entry = self.manifest.get(url) if self.manifest else None
+        if not entry or (status_code != 304 and body_hash != entry.get('hash')):
+            return None
+        
+        # Refresh validators the server may have rotated
+        self.manifest.update(url, headers.get('ETag', entry.get('etag')),
+                             headers.get('Last-Modified', entry.get('last_modified')),
+                             entry['hash'], entry['title'], entry['links'])
+        return self.manifest_page(url)
+    
+    def manifest_page(self, url):
+        """Content dict for an unchanged page, rebuilt from its manifest entry."""
+        entry = self.manifest.get(url)
+        self.unchanged_urls.add(url)
+        return {
+            'url': url,
+            'title': entry['title'],
+            'html': None,
+            'links': entry['links'],
+            'unchanged': True
+        }
+    
+    def record_page(self, url, headers, body_hash, content):
+        """Store a freshly downloaded page in the manifest."""
+        if self.manifest:
+            self.manifest.update(url, headers.get('ETag'), headers.get('Last-Modified'),
+                                 body_hash, content['title'], content['links'])
     
     def crawl_page(self, url):
         """Crawl a single page and return its content."""
-        try:
-            response = requests.get(url, timeout=10)
+        def fetch():
+            self.scheduler.wait_blocking(url)
+            start = time.monotonic()
+            try:
+                with metrics.span("crawl_fetch"):
+                    response = requests.get(url, timeout=10, headers=self.request_headers(url))
+            except requests.RequestException:
+                # No response at all (timeout, refused connection): back off the host
+                self.scheduler.record(url, None)
+                raise
+            self.scheduler.record(url, response.status_code, time.monotonic() - start,
+                                  response.headers.get('Retry-After'))
             response.raise_for_status()
+            return response
+        
+        try:
+            # The scheduler pauses the host for any Retry-After, so the backoff need not
+            response = self.resilience.call(urlparse(url).netloc, fetch, retry_after=False)
+            self.record_response(response.status_code, len(response.content))
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            content = {
-                'url': url,
-                'title': soup.title.text if soup.title else url,
-                'html': soup,
-                'links': self.extract_links(soup, url)
-            }
+            body_hash = self.manifest.hash_body(response.content) if self.manifest else None
+            content = self.unchanged_content(url, response.status_code, response.headers, body_hash)
+            if not content:
+                # Resolve relative links against the final URL after redirects
+                encoding = declared_charset(response.headers.get('Content-Type'))
+                if self.keep_raw:
+                    content = self.scan_raw_page(response.url, response.content, encoding)
+                else:
+                    content = self.parse_page(response.url, response.content, encoding)
+                content['url'] = url
+                self.record_page(url, response.headers, body_hash, content)
             
-            time.sleep(self.crawl_delay)  # Respect robots.txt implicitly
             return url, content
             
         except Exception as e:
-            handle_request_error(url, e)
+            self.record_error(url, e)
             return url, None
     
-    def crawl(self):
-        """Crawl the documentation website starting from the base URL."""
+    def record_response(self, status, size):
+        """Count a fetched response in the crawl metrics."""
+        metrics.inc("crawl_responses_total", status=status)
+        metrics.inc("crawl_bytes_total", size)
+        if status == 304:
+            metrics.inc("crawl_not_modified_total")
+    
+    def record_error(self, url, error):
+        """Log a failed fetch and remember pages that no longer exist."""
+        handle_request_error(url, error)
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None) or getattr(error, 'status', None)
+        if status:
+            metrics.inc("crawl_responses_total", status=status)
+        else:
+            metrics.inc("crawl_errors_total", error=type(error).__name__)
+        if status in (404, 410):
+            self.gone_urls.add(url)
+    
+    def removed_urls(self):
+        """Pages from the previous crawl that should be dropped from the index.
+        
+        A page is removed when it now returns 404/410, or when the crawl ran
+        to completion (frontier drained before max_pages) without reaching it.
+        """
+        removed = set(self.gone_urls)
+        if self.manifest and not self.frontier:
+            removed.update(url for url in self.manifest.urls() if url not in self.visited_urls)
+        return removed
+    
+    def modified_since_crawl(self, url, lastmod):
+        """Check a sitemap ``lastmod`` against the page's last crawl (True if unknown)."""
+        entry = self.manifest.get(url) if self.manifest else None
+        if lastmod is None or not entry or not entry.get('crawled_at'):
+            return True
+        return lastmod > datetime.fromisoformat(entry['crawled_at']).astimezone()
+    
+    def seed_from_sitemaps(self, on_page=None):
+        """Queue the pages listed in the site's sitemaps, most recently modified first.
+        
+        Sitemaps come from robots.txt, falling back to ``/sitemap.xml``. At
+        most ``max_pages`` entries are kept. Pages not modified since their
+        last crawl are stored from the manifest right away instead of being
+        queued. Returns the number of URLs queued.
+        """
+        sitemap_urls = self.robots.sitemaps(self.base_url) if self.robots else []
+        sitemap_urls = sitemap_urls or [urljoin(self.base_url, '/sitemap.xml')]
+        reader = SitemapReader(self.user_agent, resilience=self.resilience)
+        entries = (entry for entry in reader.entries(sitemap_urls) if self.in_scope(entry.url))
+        queued, skipped = 0, []
+        for entry in heapq.nlargest(self.max_pages, entries, key=lambda entry: entry.lastmod or EPOCH):
+            url = canonicalize_url(entry.url, keep_trailing_slash=True)
+            if self.modified_since_crawl(url, entry.lastmod):
+                queued += self.frontier.add(url, 1)
+            elif self.frontier.mark_seen(url):
+                skipped.append(url)
+        
+        for url in skipped:
+            self.visited_urls.add(url)
+            content = self.manifest_page(url)
+            self.store_page(url, content, on_page)
+            # Pages only reachable through this one still get discovered
+            for link in content['links']:
+                self.frontier.add(link, 2)
+        metrics.inc("sitemap_pages_queued_total", queued)
+        metrics.inc("sitemap_pages_skipped_total", len(skipped))
+        if queued or skipped:
+            logging.info(f"Sitemaps: queued {queued} pages, skipped {len(skipped)} unchanged since the last crawl")
+        return queued
+    
+    def store_page(self, url, content, on_page=None):
+        """Keep a crawled page, or hand it to ``on_page`` when streaming.
+        
+        In streaming mode the parsed tree is not retained here; the consumer
+        owns it and can drop it as soon as the page is extracted.
+        """
+        metrics.inc("crawl_pages_total", state="unchanged" if content.get('unchanged') else "fetched")
+        if on_page is None:
+            self.content_by_url[url] = content
+            return
+        self.content_by_url[url] = {key: value for key, value in content.items() if key not in ('html', 'raw')}
+        on_page(content)
+    
+    def crawl(self, on_page=None):
+        """Crawl the documentation website starting from the base URL.
+        
+        If ``on_page`` is given it is called with each crawled page as soon as
+        it is available (and may block to apply backpressure).
+        """
         logging.info(f"Starting crawl from {self.base_url}")
+        if self.robots is not None:
+            self.robots.load(self.base_url)
+        if not self.apply_robots():
+            return self.content_by_url
+        if self.use_sitemaps:
+            self.seed_from_sitemaps(on_page)
         
         with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
-            while self.queue and len(self.visited_urls) < self.max_pages:
+            while self.frontier and len(self.visited_urls) < self.max_pages:
                 # Get next batch of URLs to crawl
                 batch = []
-                while self.queue and len(batch) < self.concurrency:
-                    url = self.queue.pop(0)
-                    if url not in self.visited_urls:
-                        batch.append(url)
-                        self.visited_urls.add(url)
+                while (self.frontier and len(batch) < self.concurrency and
+                       len(self.visited_urls) < self.max_pages):
+                    url, depth = self.frontier.pop()
+                    batch.append((url, depth))
+                    self.visited_urls.add(url)
                 
-                if not batch:
-                    break
-                    
                 # Crawl pages in parallel
-                futures = [executor.submit(self.crawl_page, url) for url in batch]
+                futures = [(executor.submit(self.crawl_page, url), depth) for url, depth in batch]
                 
                 # Process results
-                for future in futures:
+                for future, depth in futures:
                     url, content = future.result()
                     if content:
-                        self.content_by_url[url] = content
-                        # Add new links to the queue
+                        self.store_page(url, content, on_page)
+                        # Add new links to the frontier
                         for link in content['links']:
-                            if link not in self.visited_urls and link not in self.queue:
-                                self.queue.append(link)
+                            self.frontier.add(link, depth + 1)
         
         logging.info(f"Crawl complete. Processed {len(self.content_by_url)} pages.")
-        return self.content_by_url 
\ No newline at end of file
+        return self.content_by_url 
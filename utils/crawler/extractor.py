@@ -1,18 +1,50 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
 import re
-import logging
+
+# Elements that never hold documentation text
+SKIPPED_TAGS = {'script', 'style', 'iframe', 'noscript', 'template', 'svg'}
+
+# Elements whose end closes a run of loose text
+BLOCK_CONTAINERS = {
+    'div', 'section', 'article', 'main', 'aside', 'body', 'blockquote', 'dd', 'dt', 'dl',
+    'li', 'td', 'th', 'figure', 'figcaption', 'details', 'summary', 'form', 'header', 'footer'
+}
+
+HEADING_TAGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+
+# Main content containers, most specific first
+MAIN_CANDIDATES = ['main', 'article', 'role=main', '.content', '.main-content', '#content', '#main']
+
+def _text(element, separator=''):
+    """Element text with whitespace collapsed."""
+    return ' '.join(element.get_text(separator).split())
 
 class ContentExtractor:
     """Extract meaningful content from HTML documents while filtering out navigation, 
-    headers, footers, and other non-content elements."""
+    headers, footers, and other non-content elements.
+    
+    The document is walked once. Along the way it emits ordered content blocks
+    (headings, paragraphs, lists, tables and code) and keeps track of which
+    candidate main-content container each block lives in; noise subtrees and
+    scripts are skipped without being visited."""
     
-    def __init__(self):
+    def __init__(self, parser='html.parser'):
+        # BeautifulSoup tree builder used for raw HTML ('lxml' is much faster)
+        self.parser = parser
+        
         # Common class and ID patterns for non-content elements
         self.noise_patterns = [
             'nav', 'navigation', 'menu', 'footer', 'header', 'sidebar', 
             'comment', 'advertisement', 'ad-', 'cookie', 'popup', 'banner',
             'promo', 'dialog'
         ]
+        self.noise_regex = re.compile('|'.join(re.escape(pattern) for pattern in self.noise_patterns))
+    
+    def _attr_text(self, element, attr):
+        value = element.attrs.get(attr)
+        if not value:
+            return ''
+        return ' '.join(value) if isinstance(value, list) else value
     
     def is_noise_element(self, element):
         """Check if an element is likely to be non-content."""
@@ -20,100 +52,161 @@ class ContentExtractor:
             return False
             
         # Check element's class and id attributes
-        for attr in ['class', 'id']:
-            if element.has_attr(attr):
-                attr_value = ' '.join(element[attr]) if isinstance(element[attr], list) else element[attr]
-                for pattern in self.noise_patterns:
-                    if pattern in attr_value.lower():
-                        return True
-        return False
+        attr_value = f"{self._attr_text(element, 'class')} {self._attr_text(element, 'id')}"
+        return bool(self.noise_regex.search(attr_value.lower()))
     
-    def extract_content(self, html_content):
-        """Extract clean content from HTML."""
-        soup = html_content if isinstance(html_content, BeautifulSoup) else BeautifulSoup(html_content, 'html.parser')
+    def _candidate_rank(self, element):
+        """Rank of the element in MAIN_CANDIDATES, or None if it is not a candidate."""
+        classes = element.attrs.get('class') or []
+        for rank, candidate in enumerate(MAIN_CANDIDATES):
+            if candidate.startswith('.'):
+                matched = candidate[1:] in classes
+            elif candidate.startswith('#'):
+                matched = element.attrs.get('id') == candidate[1:]
+            elif candidate == 'role=main':
+                matched = element.attrs.get('role') == 'main'
+            else:
+                matched = element.name == candidate
+            if matched:
+                return rank
+        return None
+    
+    def _walk(self, root):
+        """Walk the tree once and return (blocks, candidates).
         
-        # Remove script and style elements
-        for element in soup(['script', 'style', 'iframe', 'noscript']):
-            element.decompose()
+        Each block records the candidate containers it is nested in; each
+        candidate records its rank and the amount of text inside it.
+        """
+        blocks = []
+        candidates = []  # [rank, text_length]
+        open_candidates = []
+        loose_text = []
+        
+        def emit(block):
+            block['position'] = len(blocks)
+            block['containers'] = tuple(open_candidates)
+            for index in open_candidates:
+                candidates[index][1] += len(block['text'])
+            blocks.append(block)
+        
+        def flush_loose_text():
+            if loose_text:
+                text = ' '.join(' '.join(loose_text).split())
+                loose_text.clear()
+                if text:
+                    emit({'type': 'paragraph', 'text': text})
+        
+        # Iterative DFS; exit markers are (node, True, is_candidate)
+        stack = [(root, False, False)]
+        while stack:
+            node, exiting, is_candidate = stack.pop()
+            if exiting:
+                if node.name in BLOCK_CONTAINERS or is_candidate:
+                    flush_loose_text()
+                if is_candidate:
+                    open_candidates.pop()
+                continue
             
-        # Try to identify main content area
-        main_content = None
-        for tag in ['main', 'article', 'div[role="main"]', '.content', '.main-content', '#content', '#main']:
-            if tag.startswith('.'):
-                elements = soup.select(tag[1:])
-            elif tag.startswith('#'):
-                elements = soup.select(tag)
-            else:
-                elements = soup.find_all(tag)
-                
-            if elements:
-                # Use the largest element as it's likely the main content
-                main_content = max(elements, key=lambda x: len(str(x)))
-                break
+            if isinstance(node, NavigableString):
+                if not isinstance(node, Comment) and node.strip():
+                    loose_text.append(str(node))
+                continue
+            if not isinstance(node, Tag) or node.name in SKIPPED_TAGS:
+                continue
+            
+            rank = self._candidate_rank(node)
+            if rank is None and self.is_noise_element(node):
+                continue
+            
+            name = node.name
+            if name in HEADING_TAGS or name in ('p', 'ul', 'ol', 'table', 'pre'):
+                flush_loose_text()
+                block = self._make_block(node)
+                if block:
+                    emit(block)
+                continue
+            
+            if name in BLOCK_CONTAINERS or rank is not None:
+                flush_loose_text()
+            if rank is not None:
+                open_candidates.append(len(candidates))
+                candidates.append([rank, 0])
+            
+            stack.append((node, True, rank is not None))
+            stack.extend((child, False, False) for child in reversed(node.contents))
+        
+        flush_loose_text()
+        return blocks, candidates
+    
+    def _make_block(self, node):
+        """Build a content block for a heading, paragraph, list, table or code element."""
+        name = node.name
+        if name in HEADING_TAGS:
+            text = _text(node)
+            return {'type': 'heading', 'level': HEADING_TAGS[name], 'text': text} if text else None
+        if name == 'p':
+            text = _text(node)
+            return {'type': 'paragraph', 'text': text} if text else None
+        if name in ('ul', 'ol'):
+            items = [text for text in (_text(li, ' ') for li in node.find_all('li', recursive=False)) if text]
+            if not items:
+                return None
+            return {'type': 'list', 'ordered': name == 'ol', 'items': items, 'text': '\n'.join(items)}
+        if name == 'table':
+            return self._make_table(node)
+        text = node.get_text().strip('\n')
+        return {'type': 'code', 'text': text} if text.strip() else None
+    
+    def _make_table(self, table):
+        """Build a table block."""
+        headers = [_text(th) for th in table.find_all('th')]
+        rows = []
+        for tr in table.find_all('tr'):
+            cells = [_text(td) for td in tr.find_all('td')]
+            if cells:
+                rows.append(cells)
+        if not headers and not rows:
+            return None
+        lines = [' | '.join(headers)] if headers else []
+        lines.extend(' | '.join(row) for row in rows)
+        return {'type': 'table', 'headers': headers, 'rows': rows, 'text': '\n'.join(lines)}
+    
+    def _select_main(self, candidates):
+        """Pick the main content container: best rank first, then most text."""
+        best = None
+        for index, (rank, length) in enumerate(candidates):
+            if length and (best is None or (rank, -length) < (candidates[best][0], -candidates[best][1])):
+                best = index
+        return best
+    
+    def extract_content(self, html_content):
+        """Extract clean content from HTML."""
+        soup = html_content if isinstance(html_content, BeautifulSoup) else BeautifulSoup(html_content, self.parser)
         
-        # If no main content found, use body
-        if not main_content:
-            main_content = soup.body if soup.body else soup
+        blocks, candidates = self._walk(soup.body if soup.body else soup)
             
-        # Remove noise elements from the main content
-        for element in list(main_content.find_all()):
-            if self.is_noise_element(element):
-                element.decompose()
+        # Keep only the blocks inside the main content area (if one was found)
+        main = self._select_main(candidates)
+        if main is not None:
+            blocks = [block for block in blocks if main in block['containers']]
+        for position, block in enumerate(blocks):
+            block['position'] = position
+            del block['containers']
                 
         # Extract structured content
         extracted = {
             'title': soup.title.text if soup.title else "",
-            'headings': self._extract_headings(main_content),
-            'paragraphs': self._extract_paragraphs(main_content),
-            'lists': self._extract_lists(main_content),
-            'tables': self._extract_tables(main_content),
-            'full_text': main_content.get_text(separator=' ', strip=True)
+            'blocks': blocks,
+            'headings': [{'level': b['level'], 'text': b['text']} for b in blocks if b['type'] == 'heading'],
+            'paragraphs': [b['text'] for b in blocks if b['type'] == 'paragraph'],
+            'lists': [{'type': 'ol' if b['ordered'] else 'ul', 'items': b['items']} for b in blocks if b['type'] == 'list'],
+            'tables': [{'headers': b['headers'], 'rows': b['rows']} for b in blocks if b['type'] == 'table'],
+            'full_text': ' '.join(b['text'] for b in blocks)
         }
         
         return extracted
     
-    def _extract_headings(self, content):
-        """Extract headings with their hierarchy."""
-        headings = []
-        for level in range(1, 7):
-            for h in content.find_all(f'h{level}'):
-                headings.append({
-                    'level': level,
-                    'text': h.get_text(strip=True)
-                })
-        return headings
-    
-    def _extract_paragraphs(self, content):
-        """Extract paragraphs."""
-        return [p.get_text(strip=True) for p in content.find_all('p') if p.get_text(strip=True)]
-    
-    def _extract_lists(self, content):
-        """Extract lists."""
-        lists = []
-        for list_tag in content.find_all(['ul', 'ol']):
-            items = [li.get_text(strip=True) for li in list_tag.find_all('li')]
-            lists.append({
-                'type': list_tag.name,
-                'items': items
-            })
-        return lists
-    
-    def _extract_tables(self, content):
-        """Extract tables."""
-        tables = []
-        for table in content.find_all('table'):
-            headers = []
-            for th in table.find_all('th'):
-                headers.append(th.get_text(strip=True))
-            
-            rows = []
-            for tr in table.find_all('tr'):
-                cells = [td.get_text(strip=True) for td in tr.find_all('td')]
-                if cells:
-                    rows.append(cells)
-                    
-            tables.append({
-                'headers': headers,
-                'rows': rows
-            })
-        return tables 
\ No newline at end of file
+    def extract_raw(self, raw, encoding=None):
+        """Parse raw HTML bytes and extract their content."""
+        return self.extract_content(BeautifulSoup(raw, self.parser, from_encoding=encoding))
+    
\ No newline at end of file
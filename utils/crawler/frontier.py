@@ -0,0 +1,127 @@
+import heapq
+import itertools
+import re
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a visitor came from
+TRACKING_PARAM_PATTERN = re.compile(
+    r'^(utm_[a-z]+|gclid|fbclid|msclkid|dclid|mc_cid|mc_eid|_ga|_gl|ref|ref_src)$',
+    re.IGNORECASE
+)
+INDEX_FILES = ('index.html', 'index.htm', 'index.php', 'index.shtml', 'default.htm', 'default.html')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url, keep_trailing_slash=False):
+    """Normalize a URL so that equivalent spellings of a page compare equal.
+
+    Lowercases the scheme and host, drops default ports, fragments and
+    tracking parameters, sorts the remaining query parameters, collapses
+    duplicate slashes, strips index files and trailing slashes. The path
+    itself keeps its case since most web servers treat it as case-sensitive.
+    With ``keep_trailing_slash`` the result is suitable for fetching: servers
+    usually redirect ``/dir`` to ``/dir/``, so the slash is left in place.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+
+    path = re.sub(r'/{2,}', '/', parts.path or '/')
+    head, _, last = path.rpartition('/')
+    if last.lower() in INDEX_FILES:
+        path = head + '/'
+    if len(path) > 1 and not keep_trailing_slash:
+        path = path.rstrip('/') or '/'
+
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAM_PATTERN.match(key)
+    ))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def depth_priority(url, depth):
+    """Breadth-first ordering: shallow pages first."""
+    return depth
+
+
+def path_prefix_priority(prefixes):
+    """Build a priority function that crawls URLs under the given path prefixes first.
+
+    URLs are ranked by the index of the first prefix their path starts with
+    (non-matching URLs go last) and then by depth.
+    """
+    prefixes = list(prefixes)
+
+    def priority(url, depth):
+        path = urlsplit(url).path
+        for rank, prefix in enumerate(prefixes):
+            if path.startswith(prefix):
+                return (rank, depth)
+        return (len(prefixes), depth)
+
+    return priority
+
+
+class CrawlFrontier:
+    """URL frontier with O(1) duplicate detection and pluggable ordering.
+
+    Every URL ever added is remembered by its canonical form, so re-adding a
+    page that is queued, in flight or already crawled is a set lookup. Queued
+    URLs are normalized the same way (minus trailing-slash folding), so the
+    crawler never fetches tracking-parameter or index-file variants. Without
+    a priority function the frontier is a FIFO deque (breadth-first crawl);
+    with one it is a heap ordered by ``priority(url, depth)``, ties broken by
+    insertion order.
+    """
+
+    def __init__(self, priority=None):
+        self.priority = priority
+        self.seen = set()
+        self._fifo = deque()
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap) if self.priority else len(self._fifo)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def is_seen(self, url):
+        """Check whether an equivalent URL was already added."""
+        return canonicalize_url(url) in self.seen
+
+    def mark_seen(self, url):
+        """Record a URL as handled without queueing it. Returns False if it was already seen."""
+        key = canonicalize_url(url)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        return True
+
+    def add(self, url, depth=0):
+        """Queue a URL unless an equivalent one was already added. Returns True if queued."""
+        key = canonicalize_url(url)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        url = canonicalize_url(url, keep_trailing_slash=True)
+        if self.priority:
+            heapq.heappush(self._heap, (self.priority(url, depth), next(self._counter), url, depth))
+        else:
+            self._fifo.append((url, depth))
+        return True
+
+    def pop(self):
+        """Remove and return the next (url, depth) pair."""
+        if self.priority:
+            _, _, url, depth = heapq.heappop(self._heap)
+            return url, depth
+        return self._fifo.popleft()
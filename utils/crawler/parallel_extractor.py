@@ -0,0 +1,85 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.crawler.extractor import ContentExtractor
+
+# One extractor per worker process, created lazily on first use
+_process_extractor = None
+
+
+def best_parser():
+    """Return the fastest BeautifulSoup tree builder that is installed."""
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+
+def _extract_in_worker(raw, encoding, parser):
+    """Runs in a worker process: parse raw bytes and return the extracted dict."""
+    global _process_extractor
+    if _process_extractor is None or _process_extractor.parser != parser:
+        _process_extractor = ContentExtractor(parser)
+    return _process_extractor.extract_raw(raw, encoding)
+
+
+class ParallelExtractor:
+    """Run HTML parsing and content extraction in a pool of worker processes.
+
+    Only the raw page bytes are sent to a worker and only the compact
+    extracted dict comes back, so BeautifulSoup trees never cross process
+    boundaries and extraction is not limited by the GIL. Drop-in for
+    ``ContentExtractor`` in the ingestion pipeline: ``extract_raw`` runs in
+    the pool, ``extract_content`` (for already parsed trees) runs in-process.
+
+    A worker that dies (crash, out of memory) breaks the whole pool; it is
+    replaced with a fresh one and the pages that were in flight are retried
+    once, so one bad page does not fail every page after it.
+    """
+
+    def __init__(self, max_workers=None, parser=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parser = parser or best_parser()
+        self.local_extractor = ContentExtractor(self.parser)
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self.lock = threading.Lock()
+
+    def submit(self, raw, encoding=None):
+        """Schedule extraction of a raw page and return a future."""
+        return self.executor.submit(_extract_in_worker, raw, encoding, self.parser)
+
+    def _restart(self, broken):
+        """Replace a broken pool (once, however many callers noticed it)."""
+        with self.lock:
+            if self.executor is broken:
+                logging.warning("Extraction worker died, restarting the process pool")
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                broken.shutdown(wait=False)
+
+    def extract_raw(self, raw, encoding=None):
+        """Extract a raw page in a worker process and wait for the result."""
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                return executor.submit(_extract_in_worker, raw, encoding, self.parser).result()
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt:
+                    raise
+
+    def extract_content(self, html_content):
+        """Extract an already parsed page in the current process."""
+        return self.local_extractor.extract_content(html_content)
+
+    def close(self):
+        """Shut down the worker processes."""
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
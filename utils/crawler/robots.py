@@ -1,30 +1,139 @@
 import urllib.robotparser
 import urllib.parse
 import logging
+import threading
+import time
+from utils.error_handler import RETRY_STATUSES, ResiliencePolicy
 
 class RobotsChecker:
-    """Utility for checking robots.txt compliance."""
+    """Utility for checking robots.txt compliance.
     
-    def __init__(self):
+    robots.txt is fetched once per host and the parsed rules are kept in
+    memory. With a ``Cache`` the raw file is also stored on disk for ``ttl``
+    seconds, so later crawls of the same site don't fetch it again. Crawlers
+    call ``load()`` (or ``load_async()``) for a host before crawling it;
+    ``is_allowed()`` and ``crawl_delay()`` then only read the parsed rules.
+    Fetches go through ``resilience`` (the crawler's ``ResiliencePolicy``),
+    so a robots.txt that times out or answers 429/5xx is retried. If it
+    still cannot be read, the host is treated as fully disallowed (RFC 9309)
+    unless an expired copy is cached, which is used instead; a missing
+    robots.txt (4xx) allows everything.
+    """
+    
+    def __init__(self, cache=None, user_agent="*", timeout=10, ttl=86400, resilience=None):
         self.parsers = {}  # Cache for robot parsers
+        self.cache = cache
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.ttl = ttl
+        self.resilience = resilience or ResiliencePolicy(max_retries=2, base_delay=1.0)
+        self.lock = threading.Lock()
         
-    def is_allowed(self, url, user_agent="*"):
+    @staticmethod
+    def origin(url):
+        parts = urllib.parse.urlparse(url)
+        return f"{parts.scheme}://{parts.netloc}"
+    
+    def _cached(self, origin):
+        entry = self.cache.get(f"robots:{origin}") if self.cache else None
+        if entry and time.time() - entry['fetched_at'] < self.ttl:
+            return entry
+        return None
+    
+    def _parse(self, origin, status, body, fetched=True):
+        """Build the parser for a robots.txt response and remember it (on disk too if ``fetched``)."""
+        rp = urllib.robotparser.RobotFileParser(f"{origin}/robots.txt")
+        if status is None or status >= 500 or status in (401, 403):
+            # Unreachable or failing server: assume nothing may be crawled
+            rp.disallow_all = True
+        elif status >= 400:
+            # Missing file: everything is allowed
+            rp.allow_all = True
+        else:
+            rp.parse(body.splitlines())
+        self.parsers[origin] = rp
+        if fetched and self.cache and status is not None and status < 500:
+            self.cache.set(f"robots:{origin}", {'fetched_at': time.time(), 'status': status, 'body': body})
+        return rp
+    
+    def _unavailable(self, origin, error):
+        """Rules for a host whose robots.txt could not be fetched."""
+        entry = self.cache.get(f"robots:{origin}") if self.cache else None
+        if entry:
+            logging.warning(f"Error fetching robots.txt for {origin}, using the cached copy: {error}")
+            return self._parse(origin, entry['status'], entry['body'], fetched=False)
+        logging.warning(f"Error fetching robots.txt for {origin}, not crawling the host: {error}")
+        return self._parse(origin, None, "")
+    
+    def load(self, url):
+        """Fetch and parse robots.txt for the URL's host unless it is already known."""
+        origin = self.origin(url)
+        with self.lock:
+            if origin in self.parsers:
+                return self.parsers[origin]
+            entry = self._cached(origin)
+            if entry:
+                return self._parse(origin, entry['status'], entry['body'], fetched=False)
+            
+            import requests
+            
+            def fetch():
+                response = requests.get(f"{origin}/robots.txt", timeout=self.timeout,
+                                        headers={'User-Agent': self.user_agent})
+                if response.status_code in RETRY_STATUSES or response.status_code >= 500:
+                    response.raise_for_status()
+                return response.status_code, response.text
+            
+            try:
+                status, body = self.resilience.call(urllib.parse.urlparse(origin).netloc, fetch)
+            except Exception as e:
+                return self._unavailable(origin, e)
+            return self._parse(origin, status, body)
+    
+    async def load_async(self, session, url):
+        """Like ``load()``, fetching with an aiohttp session instead of blocking."""
+        origin = self.origin(url)
+        if origin in self.parsers:
+            return self.parsers[origin]
+        entry = self._cached(origin)
+        if entry:
+            return self._parse(origin, entry['status'], entry['body'], fetched=False)
+        
+        async def fetch():
+            async with session.get(f"{origin}/robots.txt") as response:
+                if response.status in RETRY_STATUSES or response.status >= 500:
+                    response.raise_for_status()
+                return response.status, await response.text(errors='replace')
+        
+        try:
+            status, body = await self.resilience.call_async(urllib.parse.urlparse(origin).netloc, fetch)
+        except Exception as e:
+            return self._unavailable(origin, e)
+        return self._parse(origin, status, body)
+    
+    def is_allowed(self, url, user_agent=None):
         """Check if crawling a URL is allowed by robots.txt."""
         try:
-            domain = urllib.parse.urlparse(url).netloc
-            
-            # Create parser for this domain if we don't have one
-            if domain not in self.parsers:
-                rp = urllib.robotparser.RobotFileParser()
-                robots_url = f"{urllib.parse.urlparse(url).scheme}://{domain}/robots.txt"
-                rp.set_url(robots_url)
-                rp.read()
-                self.parsers[domain] = rp
-                
-            # Check if URL is allowed
-            return self.parsers[domain].can_fetch(user_agent, url)
+            rp = self.parsers.get(self.origin(url)) or self.load(url)
+            return rp.can_fetch(user_agent or self.user_agent, url)
             
         except Exception as e:
             logging.warning(f"Error checking robots.txt for {url}: {e}")
-            # If there's an error, err on the side of caution and assume allowed
-            return True 
\ No newline at end of file
+            # If there's an error, err on the side of caution and assume disallowed
+            return False
+    
+    def crawl_delay(self, url, user_agent=None):
+        """Seconds between requests asked for by Crawl-delay or Request-rate, if any."""
+        rp = self.parsers.get(self.origin(url)) or self.load(url)
+        user_agent = user_agent or self.user_agent
+        delay = rp.crawl_delay(user_agent)
+        rate = rp.request_rate(user_agent)
+        delays = [float(delay)] if delay else []
+        if rate and rate.requests:
+            delays.append(rate.seconds / rate.requests)
+        return max(delays) if delays else None
+
+    def sitemaps(self, url):
+        """Sitemap URLs listed in robots.txt."""
+        rp = self.parsers.get(self.origin(url)) or self.load(url)
+        return rp.site_maps() or []
@@ -0,0 +1,145 @@
+import asyncio
+import math
+import threading
+import time
+from urllib.parse import urlparse
+from utils.error_handler import THROTTLE_STATUSES, parse_retry_after
+
+
+class HostBucket:
+    """Token bucket and congestion state for one host."""
+
+    def __init__(self, rate, max_rate, burst):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()  # refill clock; in the future during a Retry-After pause
+        self.latency = None  # EWMA of response latency
+        self.baseline = None  # lowest latency EWMA seen
+        self.decreased_at = 0.0
+        self.slow_start = True  # grow multiplicatively until the first sign of congestion
+
+
+class PolitenessScheduler:
+    """Per-host token buckets that pace request starts without sleeping between pages.
+
+    Every host gets a bucket of ``burst`` tokens refilled at its current
+    rate. A worker asking for a URL takes a token immediately; when the
+    bucket is empty it is given the time its token will be available, so
+    concurrent workers targeting the same host are spaced out while workers
+    for other hosts proceed without waiting.
+
+    A host's rate is capped by ``min_interval`` (a fixed delay chosen by the
+    user) and by a robots.txt ``Crawl-delay``/``Request-rate`` registered with
+    ``set_interval()``. Below that cap it adapts AIMD-style to the responses
+    reported with ``record()``: each success grows the rate by
+    ``slow_start_factor`` until the host first shows congestion and by
+    ``increase`` requests per second after that, while a 429/503, a failed
+    request or latency rising above ``latency_factor`` times the host's
+    baseline multiplies it by ``decrease`` (at most once per round trip). A
+    Retry-After header pauses the host for that long. With a fixed
+    ``min_interval`` latency is not taken as a congestion signal.
+    """
+
+    def __init__(self, min_interval=None, initial_rate=10.0, max_rate=50.0, min_rate=0.1, burst=1,
+                 increase=0.5, decrease=0.5, slow_start_factor=1.25, latency_factor=3.0):
+        if min_interval is not None:
+            # A fixed delay: start at (and never exceed) that rate
+            max_rate = 1.0 / min_interval if min_interval > 0 else math.inf
+        self.start_rate = max_rate if min_interval is not None else initial_rate
+        self.track_latency = min_interval is None
+        self.initial_rate = initial_rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_start_factor = slow_start_factor
+        self.latency_factor = latency_factor
+        self.buckets = {}  # host -> HostBucket
+        self.lock = threading.Lock()
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = HostBucket(self.start_rate, self.max_rate, self.burst)
+        return bucket
+
+    def set_interval(self, url, seconds):
+        """Never start requests to the URL's host more often than every ``seconds``."""
+        with self.lock:
+            bucket = self._bucket(url)
+            bucket.max_rate = min(bucket.max_rate, 1.0 / seconds)
+            bucket.rate = min(bucket.rate, bucket.max_rate)
+            bucket.tokens = min(bucket.tokens, 1)
+
+    def rate(self, url):
+        """Current request rate (per second) for the URL's host."""
+        with self.lock:
+            return self._bucket(url).rate
+
+    def _refill(self, bucket, now):
+        if now > bucket.updated:
+            if not math.isinf(bucket.rate):
+                bucket.tokens = min(bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+            bucket.updated = now
+
+    def reserve(self, url):
+        """Take a token for the URL's host and return the delay until it is usable."""
+        with self.lock:
+            bucket = self._bucket(url)
+            now = time.monotonic()
+            self._refill(bucket, now)
+            wait = bucket.updated - now
+            if math.isinf(bucket.rate):
+                return wait
+            bucket.tokens -= 1
+            return wait + max(0.0, -bucket.tokens) / bucket.rate
+
+    async def wait(self, url):
+        """Wait (without blocking the event loop) until the URL's slot is due."""
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait_blocking(self, url):
+        """Block the calling thread until the URL's slot is due."""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, url, status=None, latency=None, retry_after=None):
+        """Adapt the host's rate to a response (``status`` None means the request failed)."""
+        with self.lock:
+            bucket = self._bucket(url)
+            now = time.monotonic()
+            self._refill(bucket, now)
+            pause = parse_retry_after(retry_after)
+            if pause:
+                # Nothing refills until the pause is over
+                bucket.updated = max(bucket.updated, now + pause)
+
+            congested = status is None or status in THROTTLE_STATUSES
+            if latency is not None and self.track_latency and not congested:
+                bucket.latency = latency if bucket.latency is None else 0.8 * bucket.latency + 0.2 * latency
+                bucket.baseline = min(bucket.baseline or bucket.latency, bucket.latency)
+                congested = bucket.latency > self.latency_factor * max(bucket.baseline, 0.01)
+
+            if congested:
+                # Responses to requests sent before the last decrease say nothing new
+                round_trip = max(bucket.latency or 0.0, 0.0 if math.isinf(bucket.rate) else 1.0 / bucket.rate)
+                if now - bucket.decreased_at >= round_trip:
+                    rate = self.initial_rate if math.isinf(bucket.rate) else bucket.rate
+                    bucket.rate = max(self.min_rate, rate * self.decrease)
+                    bucket.tokens = min(bucket.tokens, 0.0)
+                    bucket.decreased_at = now
+                    bucket.slow_start = False
+                    # Judge later latencies against the new, slower pace
+                    bucket.baseline = bucket.latency
+            elif status is not None and status < 400:
+                if bucket.slow_start:
+                    bucket.rate = min(bucket.max_rate, bucket.rate * self.slow_start_factor)
+                else:
+                    bucket.rate = min(bucket.max_rate, bucket.rate + self.increase)
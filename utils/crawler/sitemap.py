@@ -0,0 +1,128 @@
+import itertools
+import logging
+import zlib
+import xml.etree.ElementTree as ET
+from collections import deque
+from datetime import datetime, time, timezone
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+from utils.error_handler import ResiliencePolicy
+
+GZIP_MAGIC = b'\x1f\x8b'
+# Sorts entries without a lastmod after every dated one
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class SitemapEntry(NamedTuple):
+    url: str
+    lastmod: Optional[datetime]
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """Parse a W3C datetime (``2024-05-01`` or a full timestamp) as an aware datetime.
+
+    A bare date means the page changed at some point that day, so it is read
+    as the end of the day: a crawl earlier the same day is not up to date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if len(value) == 10:
+        parsed = datetime.combine(parsed.date(), time.max)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def iter_sitemap(chunks: Iterable[bytes]) -> Iterator[Tuple[str, SitemapEntry]]:
+    """Stream-parse a sitemap or sitemap index, plain or gzipped, from chunks of bytes.
+
+    Yields ``("url", entry)`` for pages and ``("sitemap", entry)`` for the
+    sitemaps an index points to. Each element is discarded as soon as it has
+    been read, so memory use does not grow with the size of the file.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    decompressor = None
+    depth, loc, lastmod, root = 0, None, None, None
+    for position, chunk in enumerate(itertools.chain(chunks, [None])):
+        if chunk is None:
+            parser.close()
+        else:
+            if position == 0 and chunk[:2] == GZIP_MAGIC:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+
+        for event, element in parser.read_events():
+            if event == "start":
+                depth += 1
+                if root is None:
+                    root = element
+                continue
+            depth -= 1
+            tag = element.tag.rsplit('}', 1)[-1]
+            # Only direct children of <url>/<sitemap>; extensions such as
+            # <image:image> have their own <loc>
+            if depth == 2 and tag == "loc":
+                loc = (element.text or "").strip()
+            elif depth == 2 and tag == "lastmod":
+                lastmod = parse_lastmod(element.text)
+            elif depth == 1 and tag in ("url", "sitemap"):
+                if loc:
+                    yield tag, SitemapEntry(loc, lastmod)
+                loc, lastmod = None, None
+                root.clear()
+
+
+class SitemapReader:
+    """Fetches a site's sitemaps, following sitemap indexes breadth-first.
+
+    Opening a sitemap goes through ``resilience``, so transient failures are
+    retried; a failure while streaming the body is not.
+    """
+
+    def __init__(self, user_agent="DocQABot/1.0", timeout=30, max_sitemaps=100, resilience=None):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.max_sitemaps = max_sitemaps
+        self.resilience = resilience or ResiliencePolicy(max_retries=2, base_delay=1.0)
+
+    def _open(self, url):
+        import requests
+
+        response = requests.get(url, stream=True, timeout=self.timeout, headers={'User-Agent': self.user_agent})
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        return response
+
+    def fetch(self, url: str) -> Iterator[Tuple[str, SitemapEntry]]:
+        """Stream the entries of one sitemap file."""
+        with self.resilience.call(urlparse(url).netloc, self._open, url) as response:
+            # iter_content undoes Content-Encoding; .xml.gz files are detected by iter_sitemap
+            yield from iter_sitemap(response.iter_content(64 * 1024))
+
+    def entries(self, sitemap_urls: Iterable[str]) -> Iterator[SitemapEntry]:
+        """All page entries reachable from the given sitemaps or sitemap indexes."""
+        queue = deque(sitemap_urls)
+        seen = set()
+        while queue and len(seen) < self.max_sitemaps:
+            url = queue.popleft()
+            if url in seen:
+                continue
+            seen.add(url)
+            try:
+                for kind, entry in self.fetch(url):
+                    if kind == "sitemap":
+                        queue.append(urljoin(url, entry.url))
+                    else:
+                        yield entry
+            except Exception as e:
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                if status == 404:
+                    logging.info(f"No sitemap at {url}")
+                else:
+                    logging.warning(f"Error reading sitemap {url}: {e}")
@@ -1,10 +1,23 @@
+import asyncio
 import logging
+import random
+import sys
+import threading
 import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
 from functools import wraps
-import requests
+from utils.metrics import metrics
+
+# Worth retrying: request timeout, too early, throttling and server errors
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+# The service is shedding load: slow down rather than count it as broken
+THROTTLE_STATUSES = (429, 503)
 
 def handle_request_error(url, error):
     """Handle errors during web requests."""
+    import requests
+    
     if isinstance(error, requests.exceptions.ConnectionError):
         logging.error(f"Connection error when accessing {url}: {error}")
     elif isinstance(error, requests.exceptions.Timeout):
@@ -15,24 +28,338 @@ def handle_request_error(url, error):
     else:
         logging.error(f"Error when accessing {url}: {error}")
 
-def retry_on_error(max_retries=3, backoff_factor=2):
-    """Decorator for retrying functions on failure with exponential backoff."""
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError):
+        return None
+
+def _error_chain(error):
+    """The error and the errors it was raised from (SDKs often wrap HTTP errors)."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+def error_status(error):
+    """HTTP status behind an exception from requests, aiohttp or a Google API client, if any."""
+    for e in _error_chain(error):
+        response = getattr(e, 'response', None)
+        for status in (getattr(response, 'status_code', None), getattr(response, 'status', None),
+                       getattr(e, 'status', None), getattr(e, 'code', None)):
+            if isinstance(status, int) and 100 <= status < 600:
+                return status
+    return None
+
+def error_retry_after(error):
+    """Seconds asked for by the Retry-After header of a failed response, if any."""
+    for e in _error_chain(error):
+        headers = getattr(getattr(e, 'response', None), 'headers', None) or getattr(e, 'headers', None)
+        if headers:
+            delay = parse_retry_after(headers.get('Retry-After'))
+            if delay is not None:
+                return delay
+    return None
+
+def is_transient(error):
+    """Check whether a failed call may succeed when repeated."""
+    status = error_status(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    # requests' connection errors and timeouts derive from OSError
+    requests = sys.modules.get('requests')
+    if requests and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    aiohttp = sys.modules.get('aiohttp')
+    return bool(aiohttp) and isinstance(error, aiohttp.ClientConnectionError)
+
+def is_throttled(error):
+    """Check whether the service refused a call to shed load (429/503)."""
+    return error_status(error) in THROTTLE_STATUSES
+
+def is_overloaded(error):
+    """Check whether a failure means fewer calls should be in flight: throttling or a timeout."""
+    if is_throttled(error) or isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    requests = sys.modules.get('requests')
+    return bool(requests) and isinstance(error, requests.exceptions.Timeout)
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=30.0, retry_after=None):
+    """Seconds to wait before retry number ``attempt + 1``.
+    
+    "Full jitter" exponential backoff: a random delay up to
+    ``base_delay * 2**attempt`` (capped at ``max_delay``), so clients that
+    failed together do not retry together. A Retry-After from the server is
+    a lower bound.
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+class CircuitBreaker:
+    """Stops calling an endpoint that keeps failing.
+    
+    After ``failure_threshold`` transient failures in a row the circuit
+    opens and calls fail fast for ``reset_timeout`` seconds. Then one trial
+    call is let through; success closes the circuit, failure opens it again.
+    """
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False  # a half-open trial call is in flight
+        self.lock = threading.Lock()
+    
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+    
+    def allow(self):
+        """Check whether a call may be made now."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial = True
+            return True
+    
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+    
+    def record_failure(self):
+        """Count a transient failure; returns True if it opened the circuit."""
+        with self.lock:
+            self.failures += 1
+            reopened = self.trial
+            self.trial = False
+            if reopened or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+class ConcurrencyLimit:
+    """AIMD limit on the number of calls in flight to one endpoint.
+    
+    The limit grows by one after a limit's worth of successful calls and is
+    multiplied by ``decrease`` when the endpoint is overloaded (429/503 or
+    a timeout), at most once per ``cooldown`` seconds. Callers beyond the limit
+    wait for a slot instead of adding to the overload.
+    """
+    
+    def __init__(self, initial=4, minimum=1, maximum=32, decrease=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.decreased_at = 0.0
+        self.condition = threading.Condition()
+    
+    def try_acquire(self):
+        with self.condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+    
+    def acquire(self):
+        """Block until a slot is free and take it."""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+    
+    async def acquire_async(self):
+        """Wait (without blocking the event loop) until a slot is free and take it."""
+        while not self.try_acquire():
+            await asyncio.sleep(0.05)
+    
+    def adapt(self, overloaded=False):
+        """Adapt the limit to how a call went."""
+        with self.condition:
+            now = time.monotonic()
+            if overloaded:
+                if now - self.decreased_at >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.decreased_at = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+    
+    def release(self, overloaded=False):
+        """Free a slot and adapt the limit to how the call went."""
+        with self.condition:
+            self.in_flight -= 1
+            self.adapt(overloaded)
+            self.condition.notify_all()
+
+class ResiliencePolicy:
+    """Retries, circuit breakers and concurrency limits for calls to external services.
+    
+    Calls are grouped by endpoint (a host, or an API such as
+    ``embeddings:<model>``). Every endpoint gets its own ``CircuitBreaker``
+    and, when ``concurrency`` is set, its own ``ConcurrencyLimit`` starting at
+    that many calls in flight. Transient failures (see ``is_transient``) are
+    retried up to ``max_retries`` times with ``backoff_delay``. Overload
+    (throttling or timeouts) lowers the endpoint's concurrency, and
+    throttling does not count towards opening its circuit, so a quota slows
+    calls down instead of failing them.
+    """
+    
+    def __init__(self, max_retries=4, base_delay=0.5, max_delay=30.0, failure_threshold=5,
+                 reset_timeout=30.0, concurrency=None, max_concurrency=32):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.endpoints = {}  # name -> (CircuitBreaker, ConcurrencyLimit or None)
+        self.lock = threading.Lock()
+    
+    def endpoint(self, name):
+        """Circuit breaker and concurrency limit (or None) of an endpoint."""
+        with self.lock:
+            state = self.endpoints.get(name)
+            if state is None:
+                limit = ConcurrencyLimit(self.concurrency, maximum=self.max_concurrency) if self.concurrency else None
+                state = self.endpoints[name] = (CircuitBreaker(self.failure_threshold, self.reset_timeout), limit)
+            return state
+    
+    def _admit(self, name, breaker):
+        if not breaker.allow():
+            metrics.inc("circuit_rejections_total", endpoint=name)
+            raise CircuitOpenError(f"Circuit open for {name} after repeated failures")
+    
+    @contextmanager
+    def hold(self, name):
+        """Keep one of the endpoint's concurrency slots for a whole block, e.g. while a response streams.
+        
+        Calls made inside the block pass ``held=True`` so they do not take a second slot.
+        """
+        _, limit = self.endpoint(name)
+        if limit is None:
+            yield
+            return
+        limit.acquire()
+        overloaded = False
+        try:
+            yield
+        except Exception as e:
+            overloaded = is_overloaded(e)
+            raise
+        finally:
+            limit.release(overloaded=overloaded)
+    
+    def _failed(self, name, breaker, error, attempt, max_retries, retry_after=True):
+        """Record a failed attempt and return the delay before retrying it (None: give up)."""
+        transient = is_transient(error)
+        if transient and not is_throttled(error):
+            if breaker.record_failure():
+                metrics.inc("circuit_opened_total", endpoint=name)
+                logging.warning(f"Circuit opened for {name} after repeated failures")
+        else:
+            # The endpoint is up: it rejected the request or asked for fewer of them
+            breaker.record_success()
+        if not transient or attempt >= max_retries or breaker.is_open:
+            return None
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay, error_retry_after(error) if retry_after else None)
+        metrics.inc("retries_total", endpoint=name)
+        logging.warning(f"Retrying {name} in {delay:.1f}s after error: {error}")
+        return delay
+    
+    def call(self, name, func, *args, max_retries=None, held=False, retry_after=True, **kwargs):
+        """Call ``func(*args, **kwargs)`` against endpoint ``name``, retrying transient failures.
+        
+        ``held`` means the caller already holds a slot (see ``hold()``). With
+        ``retry_after=False`` the backoff ignores Retry-After, for callers
+        whose own pacing already waits it out.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        breaker, limit = self.endpoint(name)
+        attempt = 0
+        while True:
+            self._admit(name, breaker)
+            if limit and not held:
+                limit.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if limit and not held:
+                    limit.release(overloaded=is_overloaded(e))
+                elif limit and is_overloaded(e):
+                    limit.adapt(overloaded=True)
+                delay = self._failed(name, breaker, e, attempt, max_retries, retry_after)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if limit and not held:
+                limit.release()
+            breaker.record_success()
+            return result
+    
+    async def call_async(self, name, func, *args, max_retries=None, retry_after=True, **kwargs):
+        """Like ``call()`` for a coroutine function, sleeping without blocking the event loop."""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        breaker, limit = self.endpoint(name)
+        attempt = 0
+        while True:
+            self._admit(name, breaker)
+            if limit:
+                await limit.acquire_async()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if limit:
+                    limit.release(overloaded=is_overloaded(e))
+                delay = self._failed(name, breaker, e, attempt, max_retries, retry_after)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if limit:
+                limit.release()
+            breaker.record_success()
+            return result
+
+# Shared by the embedding and LLM API calls of this process
+resilience = ResiliencePolicy(concurrency=4)
+
+def retry_on_error(max_retries=3, backoff_factor=2, endpoint=None):
+    """Decorator retrying transient failures with jittered exponential backoff.
+    
+    The decorated function gets its own ``ResiliencePolicy``, so it also
+    has a circuit breaker (named ``endpoint``, by default the function's
+    qualified name). ``backoff_factor`` is the longest wait before the
+    first retry.
+    """
+    policy = ResiliencePolicy(max_retries=max_retries, base_delay=backoff_factor)
     def decorator(func):
+        name = endpoint or func.__qualname__
         @wraps(func)
         def wrapper(*args, **kwargs):
-            retries = 0
-            while retries <= max_retries:
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    wait_time = backoff_factor ** retries
-                    retries += 1
-                    
-                    if retries <= max_retries:
-                        logging.warning(f"Retrying in {wait_time} seconds after error: {e}")
-                        time.sleep(wait_time)
-                    else:
-                        logging.error(f"Failed after {max_retries} retries: {e}")
-                        raise
+            return policy.call(name, func, *args, **kwargs)
         return wrapper
-    return decorator 
\ No newline at end of file
+    return decorator 
@@ -1,18 +1,58 @@
 import os
 import json
+import glob
 import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 class Cache:
-    """Cache system for storing crawled websites and queries."""
+    """Cache system for storing crawled websites and queries.
     
-    def __init__(self, cache_dir="./cache", expiry_days=7):
+    Entries live in a single SQLite database in WAL mode, so writes are
+    atomic and concurrent readers never see a half-written entry. A small
+    in-process LRU of serialized values sits in front of it, the database is
+    kept under ``max_bytes`` by evicting the least recently used entries, and
+    a background thread sweeps expired entries. Values must be JSON
+    serializable.
+    """
+    
+    DB_FILE = "cache.sqlite3"
+    
+    def __init__(self, cache_dir="./cache", expiry_days=7, max_bytes=512 * 1024 * 1024,
+                 hot_entries=256, sweep_interval=3600):
         self.cache_dir = cache_dir
         self.expiry_days = expiry_days
+        self.max_bytes = max_bytes
+        self.hot_entries = hot_entries
+        self.hot = OrderedDict()  # key -> (expires_at, serialized value)
+        self.lock = threading.RLock()
         
         # Create cache directory if it doesn't exist
         if not os.path.exists(cache_dir):
             os.makedirs(cache_dir)
+        
+        self.conn = sqlite3.connect(os.path.join(cache_dir, self.DB_FILE), check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at)")
+        self._import_json_files()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        
+        self._stop = threading.Event()
+        if sweep_interval:
+            self._sweeper = threading.Thread(target=self._sweep_loop, args=(sweep_interval,), daemon=True)
+            self._sweeper.start()
             
     def _get_key(self, data):
         """Generate a unique key for data."""
@@ -20,44 +60,218 @@ class Cache:
             return hashlib.md5(data.encode()).hexdigest()
         return hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
     
+    def _import_json_files(self):
+        """Move entries written by the old one-JSON-file-per-key cache into the database."""
+        for cache_file in glob.glob(os.path.join(self.cache_dir, "*.json")):
+            try:
+                with open(cache_file, 'r') as f:
+                    cached_data = json.load(f)
+                stored_time = datetime.fromisoformat(cached_data['timestamp'])
+                expires_at = (stored_time + timedelta(days=self.expiry_days)).timestamp()
+                value = json.dumps(cached_data['data'])
+                key = os.path.splitext(os.path.basename(cache_file))[0]
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), expires_at, time.time())
+                )
+                os.remove(cache_file)
+            except Exception as e:
+                logging.warning(f"Cache import error for {cache_file}: {e}")
+                
+    def _remember(self, key, expires_at, value):
+        """Put a serialized value in the in-process hot tier."""
+        self.hot[key] = (expires_at, value)
+        self.hot.move_to_end(key)
+        while len(self.hot) > self.hot_entries:
+            self.hot.popitem(last=False)
+                
     def get(self, key_data):
         """Get data from cache if it exists and hasn't expired."""
-        key = self._get_key(key_data)
-        cache_file = os.path.join(self.cache_dir, f"{key}.json")
+        return self.get_many([key_data])[0]
+    
+    def get_many(self, key_data_list):
+        """Get several entries at once; missing or expired entries are None."""
+        keys = [self._get_key(key_data) for key_data in key_data_list]
+        now = time.time()
+        found = {}
         
-        if not os.path.exists(cache_file):
-            return None
-            
         try:
-            with open(cache_file, 'r') as f:
-                cached_data = json.load(f)
-                
-            # Check if cache has expired
-            stored_time = datetime.fromisoformat(cached_data['timestamp'])
-            if datetime.now() - stored_time > timedelta(days=self.expiry_days):
-                os.remove(cache_file)  # Delete expired cache
-                return None
+            with self.lock:
+                missing = []
+                for key in keys:
+                    entry = self.hot.get(key)
+                    if entry and entry[0] > now:
+                        self.hot.move_to_end(key)
+                        found[key] = entry[1]
+                    else:
+                        self.hot.pop(key, None)
+                        missing.append(key)
                 
-            return cached_data['data']
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = self.conn.execute(
+                        f"SELECT key, value, expires_at FROM entries WHERE key IN ({','.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+                    for key, value, expires_at in rows:
+                        if expires_at > now:
+                            found[key] = value
+                            self._remember(key, expires_at, value)
+                    if rows:
+                        # Bump recency for LRU eviction
+                        self.conn.execute(
+                            f"UPDATE entries SET accessed_at = ? WHERE key IN ({','.join('?' * len(rows))})",
+                            [now] + [row[0] for row in rows]
+                        )
+            return [json.loads(found[key]) if key in found else None for key in keys]
             
         except Exception as e:
             print(f"Cache error: {e}")
-            return None
+            return [None] * len(keys)
     
     def set(self, key_data, value):
         """Store data in cache."""
-        key = self._get_key(key_data)
-        cache_file = os.path.join(self.cache_dir, f"{key}.json")
+        return self.set_many([(key_data, value)])
         
-        cache_entry = {
-            'timestamp': datetime.now().isoformat(),
-            'data': value
-        }
+    def set_many(self, items):
+        """Store several (key_data, value) pairs in one transaction."""
+        now = time.time()
+        expires_at = now + self.expiry_days * 86400
         
         try:
-            with open(cache_file, 'w') as f:
-                json.dump(cache_entry, f)
+            rows = []
+            for key_data, value in items:
+                serialized = json.dumps(value)
+                rows.append((self._get_key(key_data), serialized, len(serialized), expires_at, now))
+            
+            with self.lock:
+                previous = dict(self.conn.execute(
+                    f"SELECT key, size FROM entries WHERE key IN ({','.join('?' * len(rows))})",
+                    [row[0] for row in rows]
+                ).fetchall()) if rows else {}
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+                for key, serialized, size, expires, _ in rows:
+                    self.total_bytes += size - previous.pop(key, 0)
+                    self._remember(key, expires, serialized)
+                if self.total_bytes > self.max_bytes:
+                    self._evict()
             return True
         except Exception as e:
             print(f"Cache write error: {e}")
-            return False 
\ No newline at end of file
+            return False 
+    
+    def delete(self, key_data):
+        """Remove an entry."""
+        key = self._get_key(key_data)
+        with self.lock:
+            self.hot.pop(key, None)
+            row = self.conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total_bytes -= row[0]
+    
+    def _evict(self):
+        """Drop least recently used entries until the cache is under 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        freed_keys = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if self.total_bytes <= target:
+                break
+            freed_keys.append(key)
+            self.total_bytes -= size
+        for start in range(0, len(freed_keys), 500):
+            batch = freed_keys[start:start + 500]
+            self.conn.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch)
+        for key in freed_keys:
+            self.hot.pop(key, None)
+    
+    def sweep(self):
+        """Delete all expired entries. Returns the number removed."""
+        now = time.time()
+        with self.lock:
+            freed = self.conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries WHERE expires_at <= ?", (now,)).fetchone()
+            self.conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            self.total_bytes -= freed[0]
+            for key in [key for key, (expires_at, _) in self.hot.items() if expires_at <= now]:
+                del self.hot[key]
+        return freed[1]
+    
+    def _sweep_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.warning(f"Cache sweep error: {e}")
+    
+    def close(self):
+        """Stop the sweeper and close the database."""
+        self._stop.set()
+        with self.lock:
+            self.conn.close()
+
+class CrawlManifest:
+    """Per-URL crawl state used for incremental recrawls.
+
+    For every crawled URL the manifest remembers the ETag and Last-Modified
+    validators, a hash of the response body, the page title and its links.
+    The crawler sends the validators back as a conditional GET and treats a
+    304 response (or an identical body hash) as an unchanged page, which can
+    then skip extraction and re-embedding. The manifest is stored as a single
+    entry in a ``Cache``.
+    """
+    
+    def __init__(self, cache: Cache, base_url: str):
+        self.cache = cache
+        self.key = f"crawl_manifest:{base_url}"
+        self.entries = cache.get(self.key) or {}
+        
+    @staticmethod
+    def hash_body(body):
+        """Hash a response body (bytes or text)."""
+        if isinstance(body, str):
+            body = body.encode()
+        return hashlib.sha256(body).hexdigest()
+    
+    def get(self, url):
+        """Get the manifest entry for a URL, if it was crawled before."""
+        return self.entries.get(url)
+    
+    def conditional_headers(self, url):
+        """Build If-None-Match / If-Modified-Since headers for a URL."""
+        entry = self.entries.get(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+    
+    def update(self, url, etag, last_modified, body_hash, title, links):
+        """Record the current state of a crawled URL."""
+        self.entries[url] = {
+            'etag': etag,
+            'last_modified': last_modified,
+            'hash': body_hash,
+            'title': title,
+            'links': links,
+            'crawled_at': datetime.now().isoformat()
+        }
+        
+    def remove(self, url):
+        """Forget a URL (e.g. when the page disappeared)."""
+        self.entries.pop(url, None)
+        
+    def urls(self):
+        """All URLs recorded in the manifest."""
+        return list(self.entries)
+    
+    def save(self):
+        """Persist the manifest."""
+        return self.cache.set(self.key, self.entries)
@@ -0,0 +1,299 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from utils.error_handler import ResiliencePolicy, resilience
+from utils.metrics import metrics
+
+DEFAULT_EMBEDDING_MODEL = "models/embedding-001"
+
+
+class EmbeddingStore:
+    """Append-only on-disk vector cache keyed by text hash.
+
+    Vectors are appended as raw float32 rows to ``vectors.f32`` and read back
+    through a memory map; ``keys.txt`` holds one key per row. Rows are written
+    before their key, and opening the store cuts both files back to the rows
+    that have a key, so a crash mid-write only loses the unfinished rows. One
+    writing process at a time is assumed; the lock only covers threads.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.keys_path = os.path.join(directory, "keys.txt")
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.lock = threading.Lock()
+        self.dim = None
+        self.rows: Dict[str, int] = {}
+        self.count = 0  # rows in vectors.f32
+        self._matrix = None
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        if not self.dim or not os.path.exists(self.keys_path) or not os.path.exists(self.vectors_path):
+            return
+        with open(self.keys_path) as f:
+            lines = f.read().split("\n")
+        # The last line has no newline unless its write completed
+        keys = lines[:-1]
+        self.count = min(len(keys), os.path.getsize(self.vectors_path) // (4 * self.dim))
+        self.rows = {key: row for row, key in enumerate(keys[:self.count])}
+        # Drop rows or keys left over from an interrupted write so new rows line up with their keys
+        if os.path.getsize(self.vectors_path) != self.count * 4 * self.dim:
+            os.truncate(self.vectors_path, self.count * 4 * self.dim)
+        if len(lines) != self.count + 1 or lines[-1]:
+            with open(self.keys_path, "w") as f:
+                f.write("".join(f"{key}\n" for key in keys[:self.count]))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _vectors(self):
+        if self._matrix is None or len(self._matrix) < self.count:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                     shape=(self.count, self.dim))
+        return self._matrix
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Look up cached vectors; missing keys are absent from the result."""
+        with self.lock:
+            found = [(key, self.rows[key]) for key in keys if key in self.rows]
+            if not found:
+                return {}
+            matrix = self._vectors()
+            return {key: np.array(matrix[row]) for key, row in found}
+
+    def put_many(self, keys: List[str], vectors) -> None:
+        """Append new vectors to the store."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            new = list({key: vector for key, vector in zip(keys, vectors) if key not in self.rows}.items())
+            if not new:
+                return
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack([vector for _, vector in new]).tobytes())
+            with open(self.keys_path, "a") as f:
+                f.write("".join(f"{key}\n" for key, _ in new))
+            for key, _ in new:
+                self.rows[key] = self.count
+                self.count += 1
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic local embeddings based on feature hashing.
+
+    Word unigrams and bigrams are hashed into a fixed number of signed
+    buckets and the result is L2-normalized. Texts sharing vocabulary end up
+    close together, which is enough to exercise indexing and retrieval
+    offline and in tests without calling the embedding API.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = re.findall(r"\w+", text.lower())
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """Embed several queries, in one model call where the model supports it.
+
+    Uses the model's own ``embed_queries`` if it has one, or a batched
+    ``embed_documents`` call with the query task type (Google embeddings).
+    Otherwise it falls back to one ``embed_query`` call per text.
+    """
+    if not texts:
+        return []
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if "task_type" in inspect.signature(embeddings.embed_documents).parameters:
+        return embeddings.embed_documents(texts, task_type="retrieval_query")
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class ResilientEmbeddings(Embeddings):
+    """Embeddings wrapper sending every call to a remote model through a ``ResiliencePolicy``.
+
+    Calls share the ``endpoint``'s circuit breaker and concurrency limit
+    (by default those of the process-wide ``resilience`` policy), and
+    throttled or failed calls are retried with backoff.
+    """
+
+    def __init__(self, embeddings: Embeddings, endpoint: str, policy: Optional[ResiliencePolicy] = None):
+        self.embeddings = embeddings
+        self.endpoint = endpoint
+        self.policy = policy or resilience
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.policy.call(self.endpoint, self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.policy.call(self.endpoint, self.embeddings.embed_query, text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.policy.call(self.endpoint, embed_queries, self.embeddings, texts)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that never embeds the same text twice.
+
+    Document vectors are cached on disk in an ``EmbeddingStore`` keyed by
+    model name and text hash; cache misses are deduplicated and sent to the
+    underlying model in large batches. Query vectors additionally go through
+    an in-memory LRU, since the same questions tend to be asked repeatedly.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: str,
+                 batch_size: int = 100, query_cache_size: int = 1024):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.query_cache_size = query_cache_size
+        slug = re.sub(r"[^\w.-]+", "_", model_name)
+        self.store = EmbeddingStore(os.path.join(cache_dir, slug))
+        self.query_cache = OrderedDict()
+        self.query_lock = threading.Lock()
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{kind}\x00{text}".encode()).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("doc", text) for text in texts]
+        vectors = self.store.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self._count_lookups("document", len(texts) - len(missing), len(missing))
+        if missing:
+            logging.debug(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+            missing_keys = list(missing)
+            for start in range(0, len(missing_keys), self.batch_size):
+                batch_keys = missing_keys[start:start + self.batch_size]
+                with self._model_call("document", len(batch_keys)):
+                    batch = self.embeddings.embed_documents([missing[key] for key in batch_keys])
+                self.store.put_many(batch_keys, batch)
+                vectors.update(zip(batch_keys, np.asarray(batch, dtype=np.float32)))
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        with self.query_lock:
+            if key in self.query_cache:
+                self.query_cache.move_to_end(key)
+                self._count_lookups("query", 1, 0)
+                return self.query_cache[key]
+
+        cached = self.store.get_many([key])
+        if key in cached:
+            vector = cached[key].tolist()
+            self._count_lookups("query", 1, 0)
+        else:
+            self._count_lookups("query", 0, 1)
+            with self._model_call("query", 1):
+                vector = self.embeddings.embed_query(text)
+            self.store.put_many([key], [vector])
+
+        self._remember_query(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed a group of queries; cache misses go to the model in one batch."""
+        keys = [self._key("query", text) for text in texts]
+        vectors = {}
+        with self.query_lock:
+            for key in keys:
+                if key in self.query_cache:
+                    self.query_cache.move_to_end(key)
+                    vectors[key] = self.query_cache[key]
+        vectors.update((key, vector.tolist()) for key, vector in
+                       self.store.get_many([key for key in keys if key not in vectors]).items())
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self._count_lookups("query", len(texts) - len(missing), len(missing))
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            with self._model_call("query", len(batch_keys)):
+                batch = embed_queries(self.embeddings, [missing[key] for key in batch_keys])
+            self.store.put_many(batch_keys, batch)
+            vectors.update(zip(batch_keys, [list(vector) for vector in batch]))
+
+        for key in set(keys):
+            self._remember_query(key, vectors[key])
+        return [vectors[key] for key in keys]
+
+    def _count_lookups(self, kind: str, hits: int, misses: int):
+        if hits:
+            metrics.inc("embedding_cache_lookups_total", hits, kind=kind, result="hit")
+        if misses:
+            metrics.inc("embedding_cache_lookups_total", misses, kind=kind, result="miss")
+
+    def _model_call(self, kind: str, batch_size: int):
+        """Span around a call to the underlying model, counting calls and batch sizes."""
+        metrics.inc("embedding_calls_total", kind=kind)
+        metrics.observe("embedding_batch_size", batch_size, kind=kind)
+        return metrics.span("embed", kind=kind)
+
+    def _remember_query(self, key: str, vector: List[float]):
+        with self.query_lock:
+            self.query_cache[key] = vector
+            self.query_cache.move_to_end(key)
+            if len(self.query_cache) > self.query_cache_size:
+                self.query_cache.popitem(last=False)
+
+
+def create_embeddings(api_key: str, cache_dir: Optional[str] = None, model: str = DEFAULT_EMBEDDING_MODEL,
+                      local: bool = False) -> Embeddings:
+    """Build the embeddings shared by indexing and querying.
+
+    ``local`` swaps the Google API for deterministic ``HashEmbeddings``;
+    ``cache_dir`` enables the persistent embedding cache. API calls are
+    retried and rate-adapted by ``ResilientEmbeddings``.
+    """
+    if local:
+        embeddings, model = HashEmbeddings(), "local-hash-256"
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        embeddings = ResilientEmbeddings(GoogleGenerativeAIEmbeddings(model=model, google_api_key=api_key),
+                                         f"embeddings:{model}")
+
+    if cache_dir:
+        return CachedEmbeddings(embeddings, model, cache_dir)
+    return embeddings
@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+INDEX_MANIFEST_FILE = "index_manifest.json"
+
+
+def embedding_model_name(embeddings) -> str:
+    """Name of the model behind an embeddings object."""
+    return getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+class IndexManifest:
+    """Description of the index stored in a persist directory.
+
+    Written after every successful ingestion. On the next launch it tells
+    whether the stored index was built for the same site with the same
+    chunking and embedding model, in which case it can be opened as-is
+    instead of being crawled again.
+    """
+
+    def __init__(self, url: str, chunk_size: int, chunk_overlap: int, embedding_model: str,
+                 crawled_at: Optional[str] = None, pages: int = 0, chunks: int = 0, vector_store: str = "chroma"):
+        self.url = url
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedding_model = embedding_model
+        self.vector_store = vector_store
+        self.crawled_at = crawled_at
+        self.pages = pages
+        self.chunks = chunks
+
+    @classmethod
+    def for_processor(cls, url: str, processor) -> "IndexManifest":
+        """Manifest describing the index a ``DocumentProcessor`` would build for a site."""
+        return cls(url, processor.chunk_size, processor.chunk_overlap, embedding_model_name(processor.embeddings),
+                   vector_store=processor.vector_backend)
+
+    def build_settings(self) -> Dict[str, Any]:
+        """Settings that change how chunks are cut, embedded and stored."""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "embedding_model": self.embedding_model,
+            "vector_store": self.vector_store
+        }
+
+    def compatible_with(self, other: "IndexManifest") -> bool:
+        """Check whether chunks of both indexes were cut, embedded and stored the same way."""
+        return self.build_settings() == other.build_settings()
+
+    def same_site(self, other: "IndexManifest") -> bool:
+        """Check whether both indexes were built from the same start URL."""
+        return self.url.rstrip("/") == other.url.rstrip("/")
+
+    def matches(self, other: "IndexManifest") -> bool:
+        """Check whether both manifests describe the same site and build settings."""
+        return self.same_site(other) and self.compatible_with(other)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"url": self.url, "crawled_at": self.crawled_at, "pages": self.pages,
+                "chunks": self.chunks, **self.build_settings()}
+
+    def save(self, persist_directory: str, pages: int, chunks: int):
+        """Record a completed ingestion (written atomically)."""
+        self.crawled_at = datetime.now().isoformat(timespec="seconds")
+        self.pages, self.chunks = pages, chunks
+        os.makedirs(persist_directory, exist_ok=True)
+        path = os.path.join(persist_directory, INDEX_MANIFEST_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, persist_directory: str) -> Optional["IndexManifest"]:
+        """Read the manifest of a persist directory, or None if there is no usable one."""
+        path = os.path.join(persist_directory, INDEX_MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return cls(**json.load(f))
+        except (OSError, ValueError, TypeError) as e:
+            logging.warning(f"Ignoring unreadable index manifest {path}: {e}")
+            return None
+
+    @staticmethod
+    def clear(persist_directory: str):
+        """Remove the manifest, e.g. before an index is rebuilt."""
+        path = os.path.join(persist_directory, INDEX_MANIFEST_FILE)
+        if os.path.exists(path):
+            os.remove(path)
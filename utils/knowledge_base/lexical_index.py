@@ -0,0 +1,153 @@
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Compound identifiers (os.path.join, max-pages, ERR_CONN_42) are kept whole
+# and additionally split into their parts
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+(?:[.\-:/][A-Za-z0-9_]+)*")
+PART_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# Things users paste verbatim: dotted names, snake_case, camelCase, CLI flags,
+# error codes and calls
+IDENTIFIER_PATTERN = re.compile(r"""
+    \w+(?:\.\w+)+                 # dotted.names
+  | \w*[A-Za-z0-9]_\w+            # snake_case / CONFIG_KEYS
+  | [a-z]+[A-Z]\w*                # camelCase
+  | [A-Z][a-z0-9]+[A-Z]\w*        # PascalCase
+  | (?<!\w)--?[a-z][\w-]+         # --cli-flags
+  | \b[A-Z]{1,5}-?\d{2,}\b        # error codes (E1101, HTTP-404)
+  | \w+\(\)                       # calls()
+""", re.VERBOSE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text, including the parts of compound identifiers."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text):
+        lowered = token.lower()
+        terms.append(lowered)
+        parts = [part.lower() for part in PART_PATTERN.findall(token)]
+        if len(parts) > 1 or (parts and parts[0] != lowered):
+            terms.extend(part for part in parts if part != lowered)
+    return terms
+
+
+def is_identifier_query(query: str, max_words: int = 4) -> bool:
+    """Check whether a query is a short lookup of an exact identifier."""
+    return len(query.split()) <= max_words and bool(IDENTIFIER_PATTERN.search(query))
+
+
+class BM25Index:
+    """In-memory inverted index with BM25 scoring, persisted as JSON.
+
+    Holds the same chunks as the vector store (keyed by chunk ID) so that
+    lexical hits can be returned without touching the vector store.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.docs: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.total_length = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.docs
+
+    def add(self, chunk_id: str, text: str, metadata: Dict[str, Any]):
+        """Index a chunk (replacing any previous version with the same ID)."""
+        if chunk_id in self.docs:
+            self.remove(chunk_id)
+        terms = tokenize(text)
+        for term, count in Counter(terms).items():
+            self.postings[term][chunk_id] = count
+        self.doc_lengths[chunk_id] = len(terms)
+        self.total_length += len(terms)
+        self.docs[chunk_id] = (text, metadata)
+        self.dirty = True
+
+    def remove(self, chunk_id: str):
+        """Remove a chunk from the index."""
+        if chunk_id not in self.docs:
+            return
+        text, _ = self.docs.pop(chunk_id)
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(chunk_id)
+        self.dirty = True
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Return the top ``k`` (chunk_id, score) pairs for a query."""
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        avg_length = self.total_length / n or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def update_metadata(self, chunk_id: str, metadata: Dict[str, Any]):
+        """Replace the metadata of an indexed chunk."""
+        if chunk_id in self.docs:
+            self.docs[chunk_id] = (self.docs[chunk_id][0], metadata)
+            self.dirty = True
+
+    def get(self, chunk_id: str) -> Tuple[str, Dict[str, Any]]:
+        """Text and metadata of an indexed chunk."""
+        return self.docs[chunk_id]
+
+    def save(self):
+        """Write the index to disk atomically (only if it changed)."""
+        if not self.path or not self.dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "docs": self.docs,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths
+            }, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index from disk, or return an empty one bound to ``path``."""
+        index = cls(path)
+        if not os.path.exists(path):
+            return index
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not load lexical index {path}: {e}")
+            return index
+        index.k1, index.b = data["k1"], data["b"]
+        index.docs = {chunk_id: (text, metadata) for chunk_id, (text, metadata) in data["docs"].items()}
+        index.postings = defaultdict(dict, data["postings"])
+        index.doc_lengths = data["doc_lengths"]
+        index.total_length = sum(index.doc_lengths.values())
+        return index
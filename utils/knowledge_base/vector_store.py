@@ -0,0 +1,686 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+VECTOR_INDEX_DIR = "vector_index"
+QUANTIZATIONS = ("int8", "binary")
+SCAN_BLOCK = 8192  # rows per block when scanning or rewriting the matrix
+# Set bits per byte value, for NumPy versions without bitwise_count
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class VectorStore(ABC):
+    """Storage and similarity search for embedded chunks.
+
+    The part of LangChain's vector store API that the indexer and the query
+    processor use. ``get()`` returns Chroma-style dicts with ``ids``,
+    ``documents`` and ``metadatas`` (fields not in ``include`` are None), and
+    search scores are distances: lower is better.
+    """
+
+    embeddings = None
+
+    @abstractmethod
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """Embed and store documents under the given IDs."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Remove stored chunks."""
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            include: Iterable[str] = ("documents", "metadatas")) -> Dict[str, Optional[list]]:
+        """Stored chunks, optionally restricted to ``ids`` and to metadata equal to ``where``."""
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of stored chunks without embedding them again."""
+
+    @abstractmethod
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k: int = 4) -> List[Tuple[Document, float]]:
+        """The ``k`` chunks closest to a query vector, with their distances."""
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """The ``k`` chunks closest to a query text, with their distances."""
+        return self.similarity_search_by_vector_with_relevance_scores(self.embeddings.embed_query(query), k=k)
+
+    @abstractmethod
+    def delete_collection(self):
+        """Delete every stored chunk."""
+
+    def save(self):
+        """Make all changes durable (a no-op for stores that persist every call)."""
+
+
+class ChromaVectorStore(VectorStore):
+    """``VectorStore`` backed by LangChain's Chroma integration."""
+
+    def __init__(self, persist_directory: str, embeddings):
+        from langchain_community.vectorstores import Chroma
+        self.embeddings = embeddings
+        self.store = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+
+    def add_documents(self, documents, ids=None):
+        return self.store.add_documents(documents, ids=ids)
+
+    def delete(self, ids):
+        self.store.delete(ids=ids)
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        return self.store.get(ids=ids, where=where, include=list(include))
+
+    def update_metadata(self, ids, metadatas):
+        self.store._collection.update(ids=ids, metadatas=metadatas)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4):
+        return self.store.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+
+    def similarity_search_with_score(self, query, k=4):
+        return self.store.similarity_search_with_score(query, k=k)
+
+    def delete_collection(self):
+        self.store.delete_collection()
+
+
+class Column:
+    """Dictionary-encoded metadata column.
+
+    Every distinct value is stored once; ``codes`` holds one index into
+    ``values`` per row (-1 where the row has no value for this key).
+    """
+
+    def __init__(self, values=(), codes=None):
+        self.values = list(values)
+        self.lookup = {self._key(value): code for code, value in enumerate(self.values)}
+        self.codes = codes
+
+    @staticmethod
+    def _key(value):
+        # 1, 1.0 and True are equal as dict keys but distinct metadata values
+        return type(value).__name__, value
+
+    def code(self, value, create=False) -> int:
+        key = self._key(value)
+        code = self.lookup.get(key)
+        if code is None and create:
+            code = self.lookup[key] = len(self.values)
+            self.values.append(value)
+        return -1 if code is None else code
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    return np.bitwise_count(bits) if hasattr(np, "bitwise_count") else POPCOUNT[bits]
+
+
+def quantize(vectors: np.ndarray, kind: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Quantized codes of unit vectors, plus the per-row scales of int8 codes.
+
+    ``int8`` maps each row symmetrically onto -127..127 (1 byte per
+    dimension); ``binary`` keeps only the signs, packed 8 dimensions per byte.
+    """
+    if kind == "binary":
+        return np.packbits(vectors > 0, axis=-1), None
+    scales = np.abs(vectors).max(axis=-1) / 127
+    scales[scales == 0] = 1
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class NumpyVectorStore(VectorStore):
+    """Vector store kept in flat files and searched with NumPy.
+
+    Unit-normalized embeddings are appended as raw float32 rows to one
+    matrix (``vectors-<generation>.f32``) and chunk texts to
+    ``texts-<generation>.bin``; both are read through memory maps, so
+    opening the store does not load them, and processes opening the same
+    directory share their pages through the OS page cache. Everything else
+    (IDs, text offsets, dictionary-encoded metadata columns, tombstones and
+    the IVF index) lives in ``index.npz``, which ``save()`` replaces
+    atomically; rows appended after the last ``save()`` are ignored when the
+    store is opened again. The data files are mapped when the store is opened,
+    and a store without unsaved changes reloads when another process has
+    saved a newer ``index.npz``; compaction keeps the previous generation's
+    files until the next one, so readers never lose the files they map.
+
+    Search is an exact dot product over the whole matrix. With ``ivf_lists``
+    set, once there are enough rows ``save()`` clusters the vectors with
+    k-means, and searches only score the rows of the ``nprobe`` clusters
+    closest to the query. With ``quantization`` (``int8`` or ``binary``) a
+    compact copy of every vector is kept in ``codes-<generation>.q``: the
+    first pass scans only those codes (4x or 32x fewer bytes than the
+    float32 matrix), and the best ``k * rescore_factor`` rows are rescored
+    with their full-precision vectors. Deleted rows are skipped until more than
+    ``compact_ratio`` of the rows are deleted; ``save()`` then rewrites the
+    files under a new generation. Scores are cosine distances.
+    """
+
+    def __init__(self, directory: str, embeddings, ivf_lists: int = 0, nprobe: int = 8,
+                 min_rows_per_list: int = 39, compact_ratio: float = 0.25,
+                 quantization: Optional[str] = None, rescore_factor: int = 10):
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.directory = directory
+        self.embeddings = embeddings
+        self.ivf_lists = ivf_lists
+        self.nprobe = nprobe
+        self.min_rows_per_list = min_rows_per_list
+        self.compact_ratio = compact_ratio
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.index_path = os.path.join(directory, "index.npz")
+        self.lock = threading.RLock()
+        self._reset()
+        self._load()
+        if quantization and self.codes_kind != quantization:
+            self.codes_kind, self.quantized_rows = quantization, 0
+        if quantization and self.quantized_rows < self.count:
+            # Stored without (or with other) codes: quantize it once, now
+            self._sync_codes()
+            self.save()
+
+    def _reset(self):
+        self.dim = None
+        self.generation = 0
+        self.count = 0  # rows written, including deleted ones
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.live = np.zeros(0, dtype=bool)
+        self.text_ends = np.zeros(0, dtype=np.int64)
+        self.columns: Dict[str, Column] = {}
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_rows = 0
+        self.codes_kind = None  # quantization of the stored codes
+        self.quantized_rows = 0
+        self.scales = np.zeros(0, dtype=np.float32)
+        self._lists = None  # (row order, bounds) of the IVF lists
+        self._matrix = None
+        self._texts = None
+        self._codes = None
+        self.writable = False  # data files trimmed to the committed rows
+        self.dirty = False
+        self.index_stamp = None  # identifies the index.npz this state was loaded from or saved to
+
+    def _path(self, kind: str, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        suffix = {"vectors": "f32", "codes": "q"}.get(kind, "bin")
+        return os.path.join(self.directory, f"{kind}-{generation}.{suffix}")
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            self.index_stamp = self._index_stamp()
+            with np.load(self.index_path) as data:
+                meta = json.loads(data["meta"].tobytes().decode())
+                arrays = {name: data[name] for name in data.files if name != "meta"}
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not load vector index {self.index_path}: {e}")
+            return
+        self.dim = meta["dim"]
+        self.generation = meta["generation"]
+        self.count = meta["count"]
+        self.ids = meta["ids"]
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(self.ids) if chunk_id is not None}
+        self.live = arrays["live"].copy()
+        self.text_ends = arrays["text_ends"].copy()
+        self.columns = {key: Column(values, arrays[f"column:{key}"].copy()) for key, values in meta["columns"].items()}
+        self.assignments = np.full(len(self.live), -1, dtype=np.int32)
+        if "centroids" in arrays:
+            self.centroids = arrays["centroids"]
+            self.assignments = arrays["assignments"].copy()
+            self.trained_rows = meta["trained_rows"]
+        self.codes_kind = meta.get("quantization")
+        self.quantized_rows = meta.get("quantized_rows", 0)
+        self.scales = arrays["scales"].copy() if "scales" in arrays else np.zeros(len(self.live), dtype=np.float32)
+        self._map_files()
+
+    def _map_files(self):
+        """Map the committed data files now, while this generation is known to exist."""
+        try:
+            self._vectors()
+            self._quantized()
+            if self.count and self.text_ends[self.count - 1]:
+                self._text(self.count - 1)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not map the vector index files in {self.directory}: {e}")
+            self._reset()
+
+    def _index_stamp(self):
+        # save() replaces the file, so its inode changes even when the mtime resolution is coarse
+        stat = os.stat(self.index_path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _reload_if_changed(self):
+        """Pick up an index another process saved since this one was loaded (unless there are unsaved changes)."""
+        if self.dirty:
+            return
+        try:
+            stamp = self._index_stamp()
+        except OSError:
+            return
+        if stamp != self.index_stamp:
+            self._reset()
+            self._load()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _vectors(self) -> Optional[np.ndarray]:
+        if not self.count:
+            return None
+        if self._matrix is None or len(self._matrix) < self.count:
+            self._matrix = np.memmap(self._path("vectors"), dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        return self._matrix[:self.count]
+
+    def _code_width(self) -> int:
+        return self.dim if self.codes_kind == "int8" else (self.dim + 7) // 8
+
+    def _quantized(self) -> Optional[np.ndarray]:
+        """Memory map of the quantized vectors, if every row has been quantized."""
+        if not self.count or not self.quantization or self.quantized_rows < self.count:
+            return None
+        if self._codes is None or len(self._codes) < self.count:
+            dtype = np.int8 if self.codes_kind == "int8" else np.uint8
+            self._codes = np.memmap(self._path("codes"), dtype=dtype, mode="r", shape=(self.count, self._code_width()))
+        return self._codes[:self.count]
+
+    def scan_bytes(self) -> int:
+        """Bytes a full first-pass scan reads: the quantized codes if there are any, else the float32 matrix."""
+        if self._quantized() is not None:
+            return self.count * self._code_width()
+        return self.count * (self.dim or 0) * 4
+
+    def _text(self, row: int) -> str:
+        end = int(self.text_ends[row])
+        if self._texts is None or len(self._texts) < end:
+            self._texts = np.memmap(self._path("texts"), dtype=np.uint8, mode="r")
+        start = int(self.text_ends[row - 1]) if row else 0
+        return self._texts[start:end].tobytes().decode()
+
+    def _metadata(self, row: int) -> Dict[str, Any]:
+        metadata = {}
+        for key, column in self.columns.items():
+            code = column.codes[row]
+            if code >= 0:
+                metadata[key] = column.values[code]
+        return metadata
+
+    def _set_metadata(self, row: int, metadata: Dict[str, Any]):
+        for key, column in self.columns.items():
+            if key not in metadata:
+                column.codes[row] = -1
+        for key, value in metadata.items():
+            if value is None:
+                continue
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = Column(codes=np.full(len(self.live), -1, dtype=np.int32))
+            column.codes[row] = column.code(value, create=True)
+
+    def _grow(self, rows: int):
+        """Make room for ``rows`` more rows in the per-row arrays."""
+        needed = self.count + rows
+        if needed <= len(self.live):
+            return
+        capacity = max(needed, 2 * len(self.live), 1024)
+
+        def resized(array, fill):
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self.live = resized(self.live, False)
+        self.text_ends = resized(self.text_ends, 0)
+        self.assignments = resized(self.assignments, -1)
+        self.scales = resized(self.scales, 0)
+        for column in self.columns.values():
+            column.codes = resized(column.codes, -1)
+
+    def _prepare_write(self, dim: int):
+        """Drop data appended after the last save (e.g. by a crashed run) before appending."""
+        if self.dim is None:
+            self.dim = dim
+        elif dim != self.dim:
+            raise ValueError(f"Embedding dimension {dim} does not match the stored {self.dim}")
+        if self.writable:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        committed = {"vectors": self.count * self.dim * 4, "texts": int(self.text_ends[self.count - 1]) if self.count else 0}
+        if self.codes_kind:
+            committed["codes"] = self.quantized_rows * self._code_width()
+        for kind, size in committed.items():
+            path = self._path(kind)
+            if not os.path.exists(path):
+                open(path, "wb").close()
+            elif os.path.getsize(path) > size:
+                os.truncate(path, size)
+        self.writable = True
+
+    def _append_codes(self, vectors: np.ndarray, start: int):
+        codes, scales = quantize(vectors, self.codes_kind)
+        with open(self._path("codes"), "ab") as f:
+            f.write(codes.tobytes())
+        if scales is not None:
+            self.scales[start:start + len(vectors)] = scales
+        self.quantized_rows = start + len(vectors)
+
+    def _sync_codes(self):
+        """Quantize the rows stored before quantization was enabled."""
+        matrix = self._vectors()
+        self._prepare_write(self.dim)
+        for start in range(self.quantized_rows, self.count, SCAN_BLOCK):
+            self._append_codes(np.asarray(matrix[start:start + SCAN_BLOCK]), start)
+        self.dirty = True
+
+    def add_documents(self, documents, ids=None):
+        documents = list(documents)
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in documents]
+        if not documents:
+            return ids
+        vectors = _normalize(np.asarray(
+            self.embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32
+        ))
+        texts = [doc.page_content.encode() for doc in documents]
+        with self.lock:
+            self._prepare_write(vectors.shape[1])
+            if self.quantization and self.quantized_rows < self.count:
+                self._sync_codes()
+            self._grow(len(documents))
+            with open(self._path("vectors"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._path("texts"), "ab") as f:
+                f.write(b"".join(texts))
+            if self.quantization:
+                self._append_codes(vectors, self.count)
+
+            offset = int(self.text_ends[self.count - 1]) if self.count else 0
+            for i, (chunk_id, doc, text) in enumerate(zip(ids, documents, texts)):
+                row = self.count + i
+                if chunk_id in self.rows:
+                    # Re-adding an ID replaces the stored chunk
+                    self._delete_row(self.rows[chunk_id])
+                offset += len(text)
+                self.text_ends[row] = offset
+                self.live[row] = True
+                self.ids.append(chunk_id)
+                self.rows[chunk_id] = row
+                self._set_metadata(row, doc.metadata or {})
+            if self.centroids is not None:
+                self.assignments[self.count:self.count + len(documents)] = np.argmax(vectors @ self.centroids.T, axis=1)
+                self._lists = None
+            self.count += len(documents)
+            self.dirty = True
+        return ids
+
+    def _delete_row(self, row: int):
+        self.live[row] = False
+        self.rows.pop(self.ids[row], None)
+        self.ids[row] = None
+
+    def delete(self, ids):
+        with self.lock:
+            for chunk_id in ids:
+                row = self.rows.get(chunk_id)
+                if row is not None:
+                    self._delete_row(row)
+                    self.dirty = True
+
+    def _select(self, ids=None, where=None) -> List[int]:
+        if ids is not None:
+            rows = [self.rows[chunk_id] for chunk_id in ids if chunk_id in self.rows]
+            if not where:
+                return rows
+            mask = np.zeros(self.count, dtype=bool)
+            mask[rows] = True
+        else:
+            mask = self.live[:self.count].copy()
+        for key, value in (where or {}).items():
+            column = self.columns.get(key)
+            code = column.code(value) if column is not None else -1
+            if code < 0:
+                return []
+            mask &= column.codes[:self.count] == code
+        return np.flatnonzero(mask).tolist()
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        include = set(include)
+        with self.lock:
+            rows = self._select(ids, where)
+            return {
+                "ids": [self.ids[row] for row in rows],
+                "documents": [self._text(row) for row in rows] if "documents" in include else None,
+                "metadatas": [self._metadata(row) for row in rows] if "metadatas" in include else None,
+            }
+
+    def update_metadata(self, ids, metadatas):
+        with self.lock:
+            for chunk_id, metadata in zip(ids, metadatas):
+                row = self.rows.get(chunk_id)
+                if row is not None:
+                    self._set_metadata(row, metadata or {})
+                    self.dirty = True
+
+    def _ivf_lists(self):
+        """Rows of every IVF list as one array sorted by list, plus each list's bounds."""
+        if self._lists is None:
+            assignments = self.assignments[:self.count]
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows in the IVF lists nearest to the query, or None for an exact search."""
+        if self.centroids is None or self.nprobe >= len(self.centroids):
+            return None
+        order, bounds = self._ivf_lists()
+        probes = np.argpartition(-(self.centroids @ query), self.nprobe - 1)[:self.nprobe]
+        return np.concatenate([order[bounds[probe]:bounds[probe + 1]] for probe in probes])
+
+    def _shortlist(self, codes, scales, query, rows, live, size) -> np.ndarray:
+        """The ``size`` best live rows by their quantized vectors (all live rows, or those in ``rows``)."""
+        # Without IVF or deletions the codes are scanned in slices instead of gathered
+        contiguous = rows is None and live.all()
+        rows = np.flatnonzero(live) if rows is None else rows[live[rows]]
+        if len(rows) <= size:
+            return rows
+        bits = np.packbits(query > 0) if self.codes_kind == "binary" else None
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), SCAN_BLOCK):
+            index = slice(start, start + SCAN_BLOCK) if contiguous else rows[start:start + SCAN_BLOCK]
+            block = codes[index]
+            if bits is None:
+                scores[start:start + len(block)] = (block.astype(np.float32) @ query) * scales[index]
+            else:
+                # Fewer differing signs means a smaller angle
+                scores[start:start + len(block)] = -_popcount(block ^ bits).sum(axis=1, dtype=np.int32)
+        return rows[np.argpartition(-scores, size - 1)[:size]]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4):
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        with self.lock:
+            self._reload_if_changed()
+            matrix = self._vectors()
+            if matrix is None or not self.rows:
+                return []
+            live = self.live[:self.count]
+            ids = self.ids
+            candidates = self._candidates(query)
+            codes = self._quantized()
+            scales = self.scales[:self.count]
+
+        if codes is not None:
+            candidates = self._shortlist(codes, scales, query, candidates, live, k * self.rescore_factor)
+        # Scored outside the lock against a snapshot; rows are mapped back
+        # through their IDs, which stay valid across deletes and compaction
+        if candidates is None:
+            scores = matrix @ query
+            scores[~live] = -np.inf
+            candidates = np.arange(len(scores))
+        else:
+            candidates = np.sort(candidates[live[candidates]])
+            scores = matrix[candidates] @ query
+        k = min(k, len(candidates), int(np.count_nonzero(np.isfinite(scores))))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        with self.lock:
+            for i in top:
+                row = self.rows.get(ids[candidates[i]])
+                if row is not None:
+                    document = Document(page_content=self._text(row), metadata=self._metadata(row))
+                    results.append((document, max(0.0, float(1.0 - scores[i]))))
+        return results
+
+    def train_ivf(self, iterations: int = 10, sample_size: int = 256, seed: int = 0):
+        """Cluster the stored vectors into ``ivf_lists`` lists with spherical k-means."""
+        with self.lock:
+            matrix = self._vectors()
+            live_rows = np.flatnonzero(self.live[:self.count])
+            lists = min(self.ivf_lists, len(live_rows))
+            if not lists:
+                return
+            rng = np.random.default_rng(seed)
+            sample = matrix[np.sort(rng.choice(live_rows, min(len(live_rows), lists * sample_size), replace=False))]
+            centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+            for _ in range(iterations):
+                assigned = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assigned, sample)
+                empty = ~sums.any(axis=1)
+                # Re-seed empty lists with random sample points
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+                centroids = _normalize(sums)
+
+            for start in range(0, self.count, SCAN_BLOCK):
+                block = np.asarray(matrix[start:start + SCAN_BLOCK])
+                self.assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+            self.centroids = centroids
+            self.trained_rows = len(live_rows)
+            self._lists = None
+            self.dirty = True
+            logging.info(f"Trained an IVF index with {lists} lists on {len(live_rows)} vectors")
+
+    def _compact(self):
+        """Rewrite the data files without deleted rows, as a new generation."""
+        live_rows = np.flatnonzero(self.live[:self.count])
+        generation = self.generation + 1
+        matrix = self._vectors()
+        text_ends = np.zeros(len(live_rows), dtype=np.int64)
+        with open(self._path("vectors", generation), "wb") as vectors, open(self._path("texts", generation), "wb") as texts:
+            offset = 0
+            for i, row in enumerate(live_rows):
+                text = self._text(row).encode()
+                texts.write(text)
+                offset += len(text)
+                text_ends[i] = offset
+            for start in range(0, len(live_rows), SCAN_BLOCK):
+                vectors.write(np.asarray(matrix[live_rows[start:start + SCAN_BLOCK]]).tobytes())
+
+        self.ids = [self.ids[row] for row in live_rows]
+        self.rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        for key, column in list(self.columns.items()):
+            # Re-encode so values no live row uses are dropped
+            codes = column.codes[live_rows]
+            used = np.unique(codes[codes >= 0])
+            if not len(used):
+                del self.columns[key]
+                continue
+            remap = np.full(len(column.values), -1, dtype=np.int32)
+            remap[used] = np.arange(len(used), dtype=np.int32)
+            self.columns[key] = Column([column.values[code] for code in used], np.where(codes >= 0, remap[codes], -1))
+        self.assignments = self.assignments[live_rows]
+        self.text_ends = text_ends
+        self.live = np.ones(len(live_rows), dtype=bool)
+        self.count = len(live_rows)
+        self.generation = generation
+        self._matrix = self._texts = self._lists = self._codes = None
+        # Codes are cheap to recompute from the compacted vectors
+        self.scales = np.zeros(self.count, dtype=np.float32)
+        self.codes_kind, self.quantized_rows = self.quantization, 0
+        if self.quantization:
+            self._sync_codes()
+        logging.info(f"Compacted the vector index to {self.count} rows")
+
+    def save(self):
+        """Commit all changes, training the IVF index or compacting the files first when due."""
+        with self.lock:
+            if not self.dirty:
+                return
+            previous = self.generation
+            if self.count and np.count_nonzero(~self.live[:self.count]) > self.compact_ratio * self.count:
+                self._compact()
+            live = len(self.rows)
+            if self.ivf_lists and live >= self.ivf_lists * self.min_rows_per_list and live >= 2 * self.trained_rows:
+                self.train_ivf()
+
+            meta = {
+                "dim": self.dim,
+                "generation": self.generation,
+                "count": self.count,
+                "ids": self.ids,
+                "columns": {key: column.values for key, column in self.columns.items()},
+                "trained_rows": self.trained_rows,
+                "quantization": self.codes_kind,
+                "quantized_rows": self.quantized_rows,
+            }
+            arrays = {
+                "live": self.live[:self.count],
+                "text_ends": self.text_ends[:self.count],
+                **{f"column:{key}": column.codes[:self.count] for key, column in self.columns.items()},
+            }
+            if self.codes_kind == "int8":
+                arrays["scales"] = self.scales[:self.count]
+            if self.centroids is not None:
+                arrays.update(centroids=self.centroids, assignments=self.assignments[:self.count])
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+            os.replace(tmp_path, self.index_path)
+            self.index_stamp = self._index_stamp()
+            self.dirty = False
+
+            if self.generation != previous:
+                # Readers may still be opening the previous generation (they
+                # map it on open, after which removal is harmless); only the
+                # ones before it are gone for good
+                for name in os.listdir(self.directory):
+                    kind, _, rest = name.partition("-")
+                    generation = rest.split(".", 1)[0]
+                    if kind in ("vectors", "texts", "codes") and generation.isdigit() and int(generation) < previous:
+                        os.remove(os.path.join(self.directory, name))
+
+    def delete_collection(self):
+        with self.lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._reset()
+
+
+def open_vector_store(persist_directory: str, embeddings, backend: str = "chroma", **options) -> VectorStore:
+    """Open (or create) the vector store of a persist directory.
+
+    ``options`` are passed to ``NumpyVectorStore`` (e.g. ``ivf_lists``, ``quantization``).
+    """
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(persist_directory, VECTOR_INDEX_DIR), embeddings, **options)
+    if backend == "chroma":
+        return ChromaVectorStore(persist_directory, embeddings)
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -0,0 +1,56 @@
+import re
+import time
+from typing import Iterator, Optional
+
+
+class FakeChunk:
+    """One piece of a fake response; mirrors the ``text`` attribute of Gemini responses."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStreamingModel:
+    """Offline stand-in for ``genai.GenerativeModel``.
+
+    Answers every prompt with a canned text (by default an echo of the
+    question and the first source), split into small chunks. Optional
+    delays simulate time to first token and per-chunk generation time, so
+    streaming can be exercised and benchmarked without an API key.
+    """
+
+    def __init__(self, answer: Optional[str] = None, chunk_size: int = 16,
+                 first_chunk_delay: float = 0.0, chunk_delay: float = 0.0):
+        self.answer = answer
+        self.chunk_size = chunk_size
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.prompts = []
+
+    def _answer_for(self, prompt: str) -> str:
+        if self.answer is not None:
+            return self.answer
+        question = re.search(r"\[User Question\]\s*(.+)", prompt)
+        source = re.search(r"Source 1 \(from (\S+)\):\s*(.+)", prompt)
+        lines = [f"**Question:** {question.group(1).strip() if question else ''}", ""]
+        if source:
+            lines.append(f"According to {source.group(1)}: {source.group(2).strip()}")
+        else:
+            lines.append("I don't have that information in the documentation sources.")
+        return "\n".join(lines)
+
+    def _stream(self, text: str) -> Iterator[FakeChunk]:
+        time.sleep(self.first_chunk_delay)
+        for start in range(0, len(text), self.chunk_size):
+            if start:
+                time.sleep(self.chunk_delay)
+            yield FakeChunk(text[start:start + self.chunk_size])
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        """Same call shape as Gemini: a response with ``text``, or an iterator of chunks."""
+        self.prompts.append(prompt)
+        text = self._answer_for(prompt)
+        if stream:
+            return self._stream(text)
+        time.sleep(self.first_chunk_delay + self.chunk_delay * max(0, (len(text) - 1) // self.chunk_size))
+        return FakeChunk(text)
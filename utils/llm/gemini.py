@@ -1,31 +1,100 @@
-import google.generativeai as genai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 import logging
-from dotenv import load_dotenv
 import os
+import time
+from itertools import chain
+from utils.error_handler import resilience
+from utils.metrics import metrics
 
-load_dotenv()
+ERROR_ANSWER = "I encountered an error while generating your answer. Please try again."
+
+class AnswerStream:
+    """Iterator over the text chunks of an answer as the model generates them.
+    
+    Once the iteration ends, ``result`` holds the same dict that
+    ``GeminiLLM.generate_answer`` returns (answer, sources and confidence).
+    A failure is only retried until the first chunk arrives; after that the
+    partial answer is kept and the error message appended. The stream holds
+    a slot of the model's concurrency limit until it is exhausted or closed.
+    """
+    
+    def __init__(self, llm, prompt: str, contexts: List[Dict[str, Any]]):
+        self.llm = llm
+        self.prompt = prompt
+        self.contexts = contexts
+        self.result: Optional[Dict[str, Any]] = None
+    
+    def _open(self):
+        """Start generating and wait for the first chunk (None if the answer is empty)."""
+        chunks = iter(self.llm.model.generate_content(self.prompt, stream=True))
+        return chunks, next(chunks, None)
+    
+    def __iter__(self) -> Iterator[str]:
+        with resilience.hold(self.llm.endpoint):
+            yield from self._generate()
+    
+    def _generate(self) -> Iterator[str]:
+        parts = []
+        start = time.time()
+        try:
+            chunks, first = self.llm.call(self._open, held=True)
+            for chunk in chain([first] if first is not None else [], chunks):
+                text = chunk.text
+                if text:
+                    if not parts:
+                        metrics.observe("llm_first_chunk_seconds", time.time() - start)
+                    parts.append(text)
+                    yield text
+            metrics.observe("llm_generate_seconds", time.time() - start, mode="stream")
+        except Exception as e:
+            logging.error(f"Error generating answer: {e}")
+            metrics.inc("llm_errors_total")
+            message = ERROR_ANSWER if not parts else f"\n\n{ERROR_ANSWER}"
+            yield message
+            self.result = {"answer": "".join(parts) + message, "source_urls": [], "confidence": 0}
+            return
+        
+        # Sources and confidence need the complete answer
+        self.result = self.llm._post_process_response("".join(parts), self.contexts)
 
 class GeminiLLM:
     """Interface for interacting with Gemini LLM."""
     
-    def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash"):
+    def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash", model=None):
         self.api_key = os.getenv("GOOGLE_API_KEY")
         self.model_name = model_name
+        # Any object with Gemini's generate_content() can stand in (e.g. FakeStreamingModel)
+        self._model = model
+    
+    @property
+    def model(self):
+        """Gemini model, created on first use so the SDK is only imported when an answer is generated."""
+        if self._model is None:
+            import google.generativeai as genai
         
-        # Configure the API
-        genai.configure(api_key=self.api_key)
+            # Configure the API
+            genai.configure(api_key=self.api_key)
         
-        # Initialize model
-        self.model = genai.GenerativeModel(self.model_name)
+            # Initialize model
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
         
+    @property
+    def endpoint(self) -> str:
+        return f"llm:{self.model_name}"
+    
+    def call(self, func, *args, held=False):
+        """Call the model through the shared retry, circuit breaker and concurrency policy."""
+        return resilience.call(self.endpoint, func, *args, held=held)
+    
     def generate_answer(self, query: str, contexts: List[Dict[str, Any]], history=None):
         """Generate an answer based on query and retrieved contexts."""
         prompt = self._build_prompt(query, contexts)
         
         try:
             # Generate response
-            response = self.model.generate_content(prompt)
+            with metrics.span("llm_generate", mode="blocking"):
+                response = self.call(self.model.generate_content, prompt)
             
             # Post-process the response
             answer = self._post_process_response(response.text, contexts)
@@ -33,14 +102,20 @@ class GeminiLLM:
             
         except Exception as e:
             logging.error(f"Error generating answer: {e}")
+            metrics.inc("llm_errors_total")
             return {
-                "answer": "I encountered an error while generating your answer. Please try again.",
+                "answer": ERROR_ANSWER,
                 "source_urls": [],
                 "confidence": 0
             }
     
+    def stream_answer(self, query: str, contexts: List[Dict[str, Any]], history=None) -> AnswerStream:
+        """Generate an answer as a stream of text chunks (see ``AnswerStream``)."""
+        return AnswerStream(self, self._build_prompt(query, contexts), contexts)
+    
     def _build_prompt(self, query: str, contexts: List[Dict[str, Any]]):
         """Build a prompt for Gemini with context information."""
+        start = time.time()
         context_text = "\n\n".join([
             f"Source {i+1} (from {ctx['metadata']['url']}):\n{ctx['page_content']}"
             for i, ctx in enumerate(contexts)
@@ -60,6 +135,9 @@ class GeminiLLM:
         Include citations to source URLs when providing information.
         Format your response in a clear, well-structured manner.
         """
+        metrics.observe("prompt_build_seconds", time.time() - start)
+        # Rough token count: about four characters per token
+        metrics.observe("prompt_tokens", len(prompt) // 4)
         return prompt
     
     def _post_process_response(self, response_text: str, contexts: List[Dict[str, Any]]):
@@ -0,0 +1,203 @@
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds for histograms of seconds; other histograms use COUNT_BUCKETS
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+class Histogram:
+    """Bucketed distribution with count, sum, min and max."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile from the buckets (the upper bound of the bucket it falls in)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """Process-wide counters, histograms and timing spans.
+
+    Everything is keyed by a metric name plus optional labels, e.g.
+    ``metrics.inc("crawl_responses_total", status=200)``. ``span()`` times a
+    block into the ``<name>_seconds`` histogram and keeps the most recent
+    spans as a trace. Export is JSON or Prometheus text format.
+    """
+
+    def __init__(self, max_spans: int = 10000):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.spans = deque(maxlen=max_spans)
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add to a counter."""
+        key = _label_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets=None, **labels):
+        """Record a value in a histogram."""
+        key = _label_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                default = SECONDS_BUCKETS if name.endswith("_seconds") else COUNT_BUCKETS
+                histogram = series[key] = Histogram(buckets or default)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[None]:
+        """Time a block of work as a span and a ``<name>_seconds`` histogram."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            self.observe(f"{name}_seconds", duration, **labels)
+            self.spans.append({
+                "name": name,
+                "start": round(start - self.started, 6),
+                "seconds": round(duration, 6),
+                "thread": threading.current_thread().name,
+                **labels
+            })
+
+    def counter(self, name: str, **labels) -> float:
+        """Current value of a counter (summed over all labels if none are given)."""
+        with self.lock:
+            series = self.counters.get(name, {})
+            if labels:
+                return series.get(_label_key(labels), 0)
+            return sum(series.values())
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        with self.lock:
+            return self.histograms.get(name, {}).get(_label_key(labels))
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+            self.started = time.time()
+
+    def to_dict(self, include_spans: bool = False) -> Dict:
+        with self.lock:
+            data = {
+                "uptime_seconds": round(time.time() - self.started, 3),
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+                "histograms": {
+                    name: [{"labels": dict(key), **histogram.to_dict()} for key, histogram in series.items()]
+                    for name, series in self.histograms.items()
+                },
+            }
+            if include_spans:
+                data["spans"] = list(self.spans)
+        return data
+
+    def to_prometheus(self, prefix: str = "docqa_") -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{prefix}{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        labels = _format_labels(key + (("le", str(bound)),))
+                        lines.append(f"{prefix}{name}_bucket{labels} {cumulative}")
+                    lines.append(f"{prefix}{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{prefix}{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Write metrics to ``path``: JSON (with the span trace) for ``.json``, Prometheus text otherwise."""
+        with open(path, "w") as f:
+            if path.endswith(".json"):
+                json.dump(self.to_dict(include_spans=True), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+    def summary(self) -> List[Tuple[str, str]]:
+        """Human-readable (metric, value) rows for an end-of-run report."""
+        rows = []
+        data = self.to_dict()
+        for name, series in sorted(data["counters"].items()):
+            for entry in series:
+                labels = ",".join(f"{k}={v}" for k, v in entry["labels"].items())
+                value = entry["value"]
+                rows.append((f"{name}{{{labels}}}" if labels else name, f"{value:g}"))
+        for name, series in sorted(data["histograms"].items()):
+            for entry in series:
+                labels = ",".join(f"{k}={v}" for k, v in entry["labels"].items())
+                unit = "s" if name.endswith("_seconds") else ""
+                rows.append((
+                    f"{name}{{{labels}}}" if labels else name,
+                    f"n={entry['count']} sum={entry['sum']:.3g}{unit} p50={entry['p50']:.3g}{unit} "
+                    f"p99={entry['p99']:.3g}{unit} max={entry['max']:.3g}{unit}"
+                ))
+        return rows
+
+
+# Shared registry used by all instrumented modules
+metrics = Metrics()
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+from langchain_core.documents import Document
+
+DEDUP_INDEX_FILE = "dedup_index.json"
+WORD_PATTERN = re.compile(r"\w+")
+
+BITS = 64
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+
+
+def simhash(tokens: List[str], shingle_size: int = 3) -> int:
+    """64-bit SimHash of a token sequence over overlapping word shingles."""
+    if not tokens:
+        return 0
+    hashes = np.fromiter((_token_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens))
+    # A shingle's hash combines its tokens' hashes, each rotated by its position
+    size = min(shingle_size, len(tokens))
+    count = len(tokens) - size + 1
+    shingles = hashes[:count].copy()
+    for offset in range(1, size):
+        part = hashes[offset:offset + count]
+        shingles ^= (part << np.uint64(offset)) | (part >> np.uint64(BITS - offset))
+    # One row of 64 bits per shingle; each bit of the result is a majority vote
+    bits = np.unpackbits(shingles.astype(">u8").view(np.uint8)).reshape(-1, BITS)
+    majority = bits.sum(axis=0) * 2 > count
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """Finds stored fingerprints within ``max_distance`` bits of a query.
+
+    Fingerprints are split into ``max_distance + 1`` bands, each with an
+    exact-match table. Two fingerprints that differ in at most
+    ``max_distance`` bits agree on at least one band, so only the keys
+    sharing a band with the query are compared.
+    """
+
+    def __init__(self, max_distance: int = 6):
+        self.max_distance = max_distance
+        self.fingerprints: Dict[str, int] = {}
+        bands = max_distance + 1
+        edges = [BITS * band // bands for band in range(bands + 1)]
+        self.band_masks = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self.bands = [defaultdict(set) for _ in range(bands)]
+
+    def __contains__(self, key):
+        return key in self.fingerprints
+
+    def _bands(self, fingerprint: int):
+        return [(fingerprint >> shift) & mask for shift, mask in self.band_masks]
+
+    def add(self, key: str, fingerprint: int):
+        self.remove(key)
+        self.fingerprints[key] = fingerprint
+        for table, value in zip(self.bands, self._bands(fingerprint)):
+            table[value].add(key)
+
+    def remove(self, key: str):
+        fingerprint = self.fingerprints.pop(key, None)
+        if fingerprint is None:
+            return
+        for table, value in zip(self.bands, self._bands(fingerprint)):
+            table[value].discard(key)
+            if not table[value]:
+                del table[value]
+
+    def find(self, fingerprint: int, exclude=None) -> Optional[str]:
+        """Closest stored key within ``max_distance`` (``exclude(key)`` skips candidates)."""
+        candidates = set()
+        for table, value in zip(self.bands, self._bands(fingerprint)):
+            candidates.update(table.get(value, ()))
+        best, best_distance = None, self.max_distance + 1
+        for key in sorted(candidates):
+            if exclude and exclude(key):
+                continue
+            distance = hamming(fingerprint, self.fingerprints[key])
+            if distance < best_distance:
+                best, best_distance = key, distance
+        return best
+
+
+class NearDuplicateDetector:
+    """Drops near-duplicate pages and chunks between extraction and embedding.
+
+    Page-level: a page whose SimHash is within ``max_distance`` bits of an
+    already indexed page (versioned trees, print views, mirrors) is not
+    indexed at all; it is recorded as an alternate URL of that canonical
+    page. Chunk-level: a chunk that (nearly) repeats a chunk already kept for
+    another page, e.g. shared boilerplate sections, is dropped and that page
+    becomes an alternate URL of the kept chunk. Texts shorter than
+    ``min_tokens`` tokens only match exactly.
+
+    The alternate URLs are written to the canonical chunks' metadata by
+    ``DeltaIndexer.annotate``. When a canonical page or chunk goes away, the
+    pages that depended on it are reported by ``pop_orphans()`` so they can
+    be fetched and indexed again. State is persisted as JSON next to the
+    vector store.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_distance: int = 6, min_tokens: int = 20):
+        self.path = path
+        self.min_tokens = min_tokens
+        self.lock = threading.Lock()
+        # Canonical pages and chunks
+        self.pages = SimHashIndex(max_distance)
+        self.chunks = SimHashIndex(max_distance)
+        self.chunk_owner: Dict[str, str] = {}  # chunk ID -> URL
+        self.chunks_by_url: Dict[str, List[str]] = {}
+        # Duplicates
+        self.duplicate_pages: Dict[str, List] = {}  # URL -> [canonical URL, fingerprint]
+        self.chunk_alternates: Dict[str, Set[str]] = defaultdict(set)  # chunk ID -> URLs
+        self.depends: Dict[str, Set[str]] = defaultdict(set)  # URL -> chunk IDs it has duplicates of
+        self.dirty_pages: Set[str] = set()
+        self.dirty_chunks: Set[str] = set()
+        self.orphans: Set[str] = set()
+        self.dirty = False
+
+    def fingerprint(self, text: str):
+        """(SimHash, whether the text is long enough for near matches)."""
+        tokens = WORD_PATTERN.findall(text.lower())
+        return simhash(tokens), len(tokens) >= self.min_tokens
+
+    def _match(self, index: SimHashIndex, fingerprint: int, near: bool, exclude=None) -> Optional[str]:
+        key = index.find(fingerprint, exclude)
+        if key is not None and not near and index.fingerprints[key] != fingerprint:
+            return None
+        return key
+
+    def page_alternates(self, url: str) -> List[str]:
+        return sorted(dup for dup, (canonical, _) in self.duplicate_pages.items() if canonical == url)
+
+    def _release_page(self, url: str):
+        """Forget a page's page-level state; its own duplicates are re-homed or orphaned."""
+        duplicate = self.duplicate_pages.pop(url, None)
+        if duplicate:
+            self.dirty_pages.add(duplicate[0])
+        if url not in self.pages:
+            return
+        self.pages.remove(url)
+        for dup in self.page_alternates(url):
+            fingerprint = self.duplicate_pages[dup][1]
+            canonical = self.pages.find(fingerprint)
+            if canonical:
+                self.duplicate_pages[dup][0] = canonical
+                self.dirty_pages.add(canonical)
+            else:
+                del self.duplicate_pages[dup]
+                self.orphans.add(dup)
+
+    def check_page(self, url: str, documents: Iterable[Document]) -> Optional[str]:
+        """Register a page's extracted documents; returns the canonical URL if it is a duplicate."""
+        fingerprint, near = self.fingerprint("\n".join(document.page_content for document in documents))
+        with self.lock:
+            self.dirty = True
+            previous = self.pages.fingerprints.get(url)
+            if previous is not None and hamming(previous, fingerprint) <= self.pages.max_distance:
+                # Still close to its old text: its duplicates stay valid
+                self.pages.add(url, fingerprint)
+                self.dirty_pages.add(url)
+                return None
+            self._release_page(url)
+            canonical = self._match(self.pages, fingerprint, near)
+            if canonical:
+                self.duplicate_pages[url] = [canonical, fingerprint]
+                self.dirty_pages.add(canonical)
+                self._replace_chunks(url, [])
+                return canonical
+            self.pages.add(url, fingerprint)
+            self.dirty_pages.add(url)
+            return None
+
+    def _replace_chunks(self, url: str, chunks: List[Document]) -> List[Document]:
+        old_ids = set(self.chunks_by_url.pop(url, ()))
+        for chunk_id in self.depends.pop(url, ()):
+            self.chunk_alternates[chunk_id].discard(url)
+            self.dirty_chunks.add(chunk_id)
+
+        kept = []
+        for chunk in chunks:
+            chunk_id = chunk.metadata["chunk_id"]
+            if chunk_id not in old_ids:
+                fingerprint, near = self.fingerprint(chunk.page_content)
+                canonical = self._match(self.chunks, fingerprint, near,
+                                        exclude=lambda key: self.chunk_owner[key] == url)
+                if canonical:
+                    self.chunk_alternates[canonical].add(url)
+                    self.depends[url].add(canonical)
+                    self.dirty_chunks.add(canonical)
+                    continue
+                self.chunks.add(chunk_id, fingerprint)
+                self.chunk_owner[chunk_id] = url
+            kept.append(chunk)
+
+        kept_ids = [chunk.metadata["chunk_id"] for chunk in kept]
+        for chunk_id in old_ids.difference(kept_ids):
+            self.chunks.remove(chunk_id)
+            self.chunk_owner.pop(chunk_id, None)
+            for dependent in self.chunk_alternates.pop(chunk_id, ()):
+                self.depends[dependent].discard(chunk_id)
+                self.orphans.add(dependent)
+        if kept_ids:
+            self.chunks_by_url[url] = kept_ids
+        return kept
+
+    def filter_chunks(self, url: str, chunks: List[Document]) -> List[Document]:
+        """Register a page's chunks and return the ones that are not duplicates of other pages' chunks."""
+        with self.lock:
+            self.dirty = True
+            return self._replace_chunks(url, chunks)
+
+    def remove_page(self, url: str):
+        """Forget a page that disappeared from the site."""
+        with self.lock:
+            self.dirty = True
+            self._release_page(url)
+            self._replace_chunks(url, [])
+            self.orphans.discard(url)
+
+    def pending_alternates(self) -> Dict[str, str]:
+        """Alternate URLs (space separated) for every chunk whose alternates changed."""
+        with self.lock:
+            chunk_ids = set(self.dirty_chunks)
+            for url in self.dirty_pages:
+                chunk_ids.update(self.chunks_by_url.get(url, ()))
+            self.dirty_pages.clear()
+            self.dirty_chunks.clear()
+            by_canonical = defaultdict(set)
+            for dup, (canonical, _) in self.duplicate_pages.items():
+                by_canonical[canonical].add(dup)
+            alternates = {}
+            for chunk_id in chunk_ids:
+                url = self.chunk_owner.get(chunk_id)
+                if url is None:
+                    continue
+                urls = by_canonical.get(url, set()) | self.chunk_alternates.get(chunk_id, set())
+                alternates[chunk_id] = " ".join(sorted(urls))
+            return alternates
+
+    def pop_orphans(self) -> Set[str]:
+        """Pages that lost the canonical copy of (part of) their content."""
+        with self.lock:
+            orphans, self.orphans = self.orphans, set()
+            return orphans
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "duplicate_pages": len(self.duplicate_pages),
+            "duplicate_chunks": sum(len(urls) for urls in self.chunk_alternates.values()),
+        }
+
+    def save(self):
+        """Write the detector state to disk atomically (only if it changed)."""
+        if not self.path or not self.dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "pages": {url: f"{fp:016x}" for url, fp in self.pages.fingerprints.items()},
+                "chunks": {
+                    chunk_id: [self.chunk_owner[chunk_id], f"{fp:016x}"]
+                    for chunk_id, fp in self.chunks.fingerprints.items()
+                },
+                "chunks_by_url": self.chunks_by_url,
+                "duplicate_pages": {url: [canonical, f"{fp:016x}"]
+                                    for url, (canonical, fp) in self.duplicate_pages.items()},
+                "chunk_alternates": {chunk_id: sorted(urls) for chunk_id, urls in self.chunk_alternates.items() if urls},
+            }, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "NearDuplicateDetector":
+        """Load the detector state from disk, or return an empty detector bound to ``path``."""
+        detector = cls(path, **kwargs)
+        if not os.path.exists(path):
+            return detector
+        with open(path) as f:
+            data = json.load(f)
+        for url, fp in data["pages"].items():
+            detector.pages.add(url, int(fp, 16))
+        for chunk_id, (url, fp) in data["chunks"].items():
+            detector.chunks.add(chunk_id, int(fp, 16))
+            detector.chunk_owner[chunk_id] = url
+        detector.chunks_by_url = data["chunks_by_url"]
+        detector.duplicate_pages = {url: [canonical, int(fp, 16)]
+                                    for url, (canonical, fp) in data["duplicate_pages"].items()}
+        for chunk_id, urls in data["chunk_alternates"].items():
+            detector.chunk_alternates[chunk_id] = set(urls)
+            for url in urls:
+                detector.depends[url].add(chunk_id)
+        return detector
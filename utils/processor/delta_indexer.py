@@ -0,0 +1,114 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List
+from langchain_core.documents import Document
+
+
+class DeltaIndexer:
+    """Apply page-level changes to a persisted vector store.
+
+    Chunks carry deterministic IDs (see ``DocumentProcessor.split_documents``),
+    so for every re-indexed page the indexer compares the chunk IDs already
+    stored for that URL with the new ones: unchanged chunks are left alone,
+    new or edited chunks are embedded and added, and chunks that no longer
+    exist are deleted. Pages that disappeared from the site are removed
+    entirely. An optional ``BM25Index`` is kept in step with the vector store.
+    """
+
+    def __init__(self, vector_store, batch_size=100, lexical_index=None):
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self.lexical_index = lexical_index
+
+    def _delete(self, ids: List[str]):
+        self.vector_store.delete(ids=ids)
+        if self.lexical_index is not None:
+            for chunk_id in ids:
+                self.lexical_index.remove(chunk_id)
+
+    def existing_ids(self, url: str) -> set:
+        """IDs of all chunks currently stored for a URL."""
+        return set(self.vector_store.get(where={"url": url}, include=[])["ids"])
+
+    def index_page(self, url: str, chunks: List[Document]) -> Dict[str, int]:
+        """Bring the stored chunks of one page in line with ``chunks``."""
+        return self.index_pages({url: chunks})
+
+    def index_pages(self, chunks_by_url: Dict[str, List[Document]]) -> Dict[str, int]:
+        """Bring the stored chunks of several pages in line with the new ones.
+
+        New chunks of all pages are embedded together, so many small pages
+        still produce full-size embedding batches.
+        """
+        stale, to_add, kept = [], [], 0
+        for url, chunks in chunks_by_url.items():
+            existing = self.existing_ids(url)
+            new_chunks = {chunk.metadata["chunk_id"]: chunk for chunk in chunks}
+            stale.extend(chunk_id for chunk_id in existing if chunk_id not in new_chunks)
+            to_add.extend(chunk for chunk_id, chunk in new_chunks.items() if chunk_id not in existing)
+            kept += len(existing & new_chunks.keys())
+
+        if stale:
+            self._delete(stale)
+        for start in range(0, len(to_add), self.batch_size):
+            batch = to_add[start:start + self.batch_size]
+            self.vector_store.add_documents(batch, ids=[chunk.metadata["chunk_id"] for chunk in batch])
+            if self.lexical_index is not None:
+                for chunk in batch:
+                    self.lexical_index.add(chunk.metadata["chunk_id"], chunk.page_content, chunk.metadata)
+
+        return {"pages": len(chunks_by_url), "added": len(to_add), "deleted": len(stale), "kept": kept}
+
+    def annotate(self, alternates: Dict[str, str]) -> int:
+        """Set the ``alternate_urls`` metadata of stored chunks.
+
+        ``alternates`` maps chunk IDs to space-separated URLs (see
+        ``NearDuplicateDetector``); only changed chunks are written.
+        """
+        if not alternates:
+            return 0
+        stored = self.vector_store.get(ids=list(alternates), include=["metadatas"])
+        ids, metadatas = [], []
+        for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            metadata = metadata or {}
+            if metadata.get("alternate_urls", "") == alternates[chunk_id]:
+                continue
+            ids.append(chunk_id)
+            metadatas.append({**metadata, "alternate_urls": alternates[chunk_id]})
+        if ids:
+            # Metadata-only update: nothing is embedded again
+            self.vector_store.update_metadata(ids, metadatas)
+            if self.lexical_index is not None:
+                for chunk_id, metadata in zip(ids, metadatas):
+                    self.lexical_index.update_metadata(chunk_id, metadata)
+        return len(ids)
+
+    def remove_pages(self, urls: Iterable[str]) -> int:
+        """Delete every chunk of the given pages."""
+        deleted = 0
+        for url in urls:
+            ids = list(self.existing_ids(url))
+            if ids:
+                self._delete(ids)
+                deleted += len(ids)
+        return deleted
+
+    def sync(self, chunks: List[Document], removed_urls: Iterable[str] = (),
+             page_urls: Iterable[str] = ()) -> Dict[str, int]:
+        """Index the chunks of every changed page and drop removed pages.
+
+        ``page_urls`` lists pages that were re-processed in this run; a page in
+        it without any chunks (e.g. it became empty) has its old chunks removed.
+        """
+        chunks_by_url = defaultdict(list, {url: [] for url in page_urls})
+        for chunk in chunks:
+            chunks_by_url[chunk.metadata["url"]].append(chunk)
+
+        stats = self.index_pages(chunks_by_url)
+        stats["deleted"] += self.remove_pages(removed_urls)
+
+        logging.info(
+            f"Delta index: {stats['pages']} pages updated, {stats['added']} chunks embedded, "
+            f"{stats['deleted']} deleted, {stats['kept']} unchanged"
+        )
+        return stats
@@ -1,26 +1,47 @@
-import uuid
+import hashlib
+import os
+from collections import Counter
 from typing import List, Dict, Any
 import logging
 from langchain_core.documents import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from utils.knowledge_base.document import DocSection
+from utils.knowledge_base.embeddings import create_embeddings
+from utils.knowledge_base.lexical_index import BM25Index
+from utils.knowledge_base.vector_store import VectorStore, open_vector_store
+from utils.processor.dedup import DEDUP_INDEX_FILE
+from utils.processor.delta_indexer import DeltaIndexer
+
+LEXICAL_INDEX_FILE = "bm25_index.json"
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of a piece of text."""
+    return hashlib.sha1(text.encode()).hexdigest()
 
 class DocumentProcessor:
-    def __init__(self, api_key: str, chunk_size=1000, chunk_overlap=200):
+    def __init__(self, api_key: str, chunk_size=1000, chunk_overlap=200, embeddings=None,
+                 vector_backend="chroma", vector_options=None):
         self.api_key = api_key
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=self.api_key
-        )
+        self.vector_backend = vector_backend
+        self.vector_options = vector_options or {}
+        self._text_splitter = None
+        self.embeddings = embeddings or create_embeddings(self.api_key)
+    
+    @property
+    def text_splitter(self):
+        """Text splitter, created on first use (importing it is slow and a warm start never splits)."""
+        if self._text_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size,
+                chunk_overlap=self.chunk_overlap,
+                separators=["\n\n", "\n", ". ", " ", ""],
+                # Offsets let overlapping neighbours be stitched back together at query time
+                add_start_index=True
+            )
+        return self._text_splitter
         
     def create_documents(self, extracted_contents: Dict[str, Dict[str, Any]]) -> List[Document]:
         """Convert extracted content into LangChain documents."""
@@ -28,7 +49,7 @@ class DocumentProcessor:
         
         for url, content in extracted_contents.items():
             # Skip if content extraction failed
-            if not content or not content.get('html'):
+            if not content or not (content.get('extracted') or content.get('html')):
                 continue
                 
             extracted = content.get('extracted', {})
@@ -43,7 +64,8 @@ class DocumentProcessor:
             
             # Add title and headings
             title = extracted.get('title', '')
-            doc_id = str(uuid.uuid4())
+            # Deterministic so re-indexing the same page yields the same IDs
+            doc_id = content_hash(url)[:16]
             
             # Create a document structure maintaining the hierarchy
             doc_structure = self._create_document_structure(extracted, url, title, doc_id)
@@ -57,7 +79,8 @@ class DocumentProcessor:
                         "title": title,
                         "section": section.heading,
                         "doc_id": doc_id,
-                        "section_id": section.section_id
+                        "section_id": section.section_id,
+                        "section_path": section.get_full_path()
                     }
                 )
                 documents.append(doc)
@@ -65,68 +88,121 @@ class DocumentProcessor:
         return documents
     
     def _create_document_structure(self, extracted, url, title, doc_id):
-        """Create a hierarchical document structure."""
-        root = DocSection(doc_id=doc_id, section_id="root", heading=title, content=title, url=url)
+        """Create a hierarchical document structure.
         
-        # Sort headings by level and position
-        headings = sorted(extracted.get('headings', []), key=lambda h: (h['level'], extracted['headings'].index(h)))
+        Walks the extractor's ordered blocks once: every heading opens a new
+        section and the blocks up to the next heading become its content.
+        Blocks before the first heading belong to the root section.
+        """
+        root = DocSection(doc_id=doc_id, section_id="root", heading=title, content=title, url=url)
         
         # Current section stack to track hierarchy
         section_stack = [root]
+        current, parts = root, [title]
+        heading_index = 0
         
-        # Process each heading as a section
-        for i, heading in enumerate(headings):
-            level = heading['level']
-            text = heading['text']
+        for block in extracted.get('blocks', []):
+            if block['type'] != 'heading':
+                parts.append(self._render_block(block))
+                continue
+            
+            current.content = "\n\n".join(part for part in parts if part)
+            level = block['level']
+            text = block['text']
             
             # Pop stack until we're at the right level
             while len(section_stack) > 1 and section_stack[-1].level >= level:
                 section_stack.pop()
                 
             # Create new section
-            parent = section_stack[-1]
-            section_id = f"{doc_id}_{i}"
-            
-            # Get content between this heading and the next
-            content = self._get_section_content(extracted, headings, i)
-            
-            # Create new section
-            new_section = DocSection(
+            current = DocSection(
                 doc_id=doc_id,
-                section_id=section_id,
+                section_id=f"{doc_id}_{heading_index}",
                 heading=text,
-                content=f"{text}\n\n{content}",
+                content=text,
                 url=url,
                 level=level
             )
+            heading_index += 1
+            parts = [text]
             
             # Add to parent and push to stack
-            parent.add_child(new_section)
-            section_stack.append(new_section)
+            section_stack[-1].add_child(current)
+            section_stack.append(current)
             
+        current.content = "\n\n".join(part for part in parts if part)
         return root
     
-    def _get_section_content(self, extracted, headings, heading_index):
-        """Extract content that belongs to a specific heading."""
-        # This is simplified - a real implementation would need to map
-        # content to the correct heading based on position in the document
-        paragraphs = extracted.get('paragraphs', [])
-        
-        # For illustration, we'll just return some paragraphs
-        # A real implementation would be more sophisticated
-        return "\n\n".join(paragraphs[heading_index:heading_index+3 if heading_index+3 < len(paragraphs) else len(paragraphs)])
+    def _render_block(self, block):
+        """Render a non-heading content block as plain text."""
+        if block['type'] == 'list':
+            if block.get('ordered'):
+                return "\n".join(f"{i}. {item}" for i, item in enumerate(block['items'], 1))
+            return "\n".join(f"- {item}" for item in block['items'])
+        return block['text']
     
     def split_documents(self, documents: List[Document]) -> List[Document]:
-        """Split documents into smaller chunks."""
-        return self.text_splitter.split_documents(documents)
+        """Split documents into smaller chunks with stable chunk IDs.
+    
+        A chunk ID is derived from the page URL, the section path and the
+        chunk's content hash, so unchanged chunks keep their ID across runs
+        and only new or edited text needs to be embedded again.
+        """
+        chunks = self.text_splitter.split_documents(documents)
+        
+        occurrences = Counter()
+        for chunk in chunks:
+            metadata = chunk.metadata
+            metadata["content_hash"] = content_hash(chunk.page_content)
+            key = f"{metadata['url']}\x00{metadata.get('section_path', '')}\x00{metadata['content_hash']}"
+            # Identical text can repeat within a section; keep IDs unique
+            occurrence = occurrences[key]
+            occurrences[key] += 1
+            metadata["chunk_id"] = content_hash(f"{key}\x00{occurrence}")
+        return chunks
     
-    def create_vector_store(self, documents: List[Document], persist_directory="./chroma_db"):
-        """Create and persist vector store from documents."""
-        vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory=persist_directory
-        )
-        vector_store.persist()
-        logging.info(f"Vector store created with {len(documents)} chunks")
+    def open_vector_store(self, persist_directory="./chroma_db") -> VectorStore:
+        """Open (or create) the persisted vector store of the configured backend."""
+        return open_vector_store(persist_directory, self.embeddings, self.vector_backend, **self.vector_options)
+        
+    def open_lexical_index(self, vector_store, persist_directory="./chroma_db"):
+        """Load the BM25 index stored next to the vector store.
+        
+        If it is missing or out of step with the vector store (e.g. an index
+        built before lexical search existed), it is rebuilt from the stored chunks.
+        """
+        lexical_index = BM25Index.load(os.path.join(persist_directory, LEXICAL_INDEX_FILE))
+        # Compare IDs only; chunk texts are fetched just when a rebuild is needed
+        stored_ids = vector_store.get(include=[])["ids"]
+        if len(stored_ids) != len(lexical_index) or any(i not in lexical_index for i in stored_ids):
+            stored = vector_store.get(include=["documents", "metadatas"])
+            logging.info(f"Rebuilding lexical index from {len(stored['ids'])} stored chunks")
+            lexical_index = BM25Index(lexical_index.path)
+            for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                lexical_index.add(chunk_id, text, metadata or {})
+            lexical_index.save()
+        return lexical_index
+    
+    def reset_index(self, vector_store, persist_directory="./chroma_db"):
+        """Delete every stored chunk, the lexical index and the dedup state, then reopen an empty vector store."""
+        vector_store.delete_collection()
+        for name in (LEXICAL_INDEX_FILE, DEDUP_INDEX_FILE):
+            path = os.path.join(persist_directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        return self.open_vector_store(persist_directory)
+    
+    def create_vector_store(self, documents: List[Document], persist_directory="./chroma_db",
+                            removed_urls=(), page_urls=()):
+        """Update the persisted vector store with changed documents.
+        
+        Only chunks that are not already stored are embedded; stale chunks of
+        re-indexed pages and all chunks of removed pages are deleted.
+        """
+        vector_store = self.open_vector_store(persist_directory)
+        lexical_index = self.open_lexical_index(vector_store, persist_directory)
+        stats = DeltaIndexer(vector_store, lexical_index=lexical_index).sync(documents, removed_urls, page_urls)
+        vector_store.save()
+        lexical_index.save()
+        logging.info(f"Vector store updated with {stats['added']} new chunks")
         return vector_store 
\ No newline at end of file
@@ -0,0 +1,196 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+from utils.processor.delta_indexer import DeltaIndexer
+from utils.metrics import metrics
+
+_DONE = object()
+
+
+class IngestionPipeline:
+    """Streaming crawl -> extract -> chunk -> embed pipeline.
+
+    Each stage runs in its own worker group and hands work to the next one
+    through a bounded queue, so a slow stage applies backpressure instead of
+    letting pages pile up in memory. Embedding starts as soon as the first
+    pages are extracted, and a page's parsed tree is dropped right after
+    extraction.
+
+    Stages:
+      crawl    -> the crawler's ``on_page`` callback feeds ``pages``
+      extract  -> ``extract_workers`` threads extract, build and split documents
+                  (with a ``ParallelExtractor`` they only dispatch to processes);
+                  with a ``NearDuplicateDetector`` duplicate pages and chunks
+                  are dropped here, before anything is embedded
+      index    -> one thread batches chunks across pages into the vector store
+
+    Pages that disappeared from the site are removed from the index at the end,
+    and the alternate URLs of deduplicated content are written to the kept chunks.
+    Pages that fail extraction are dropped from the crawl manifest, so the next
+    crawl fetches them again instead of treating them as unchanged.
+    """
+
+    def __init__(self, crawler, extractor, processor, vector_store, extract_workers=4,
+                 queue_size=64, index_batch_size=100, lexical_index=None, on_progress=None, dedup=None):
+        self.crawler = crawler
+        self.extractor = extractor
+        self.processor = processor
+        self.lexical_index = lexical_index
+        self.dedup = dedup
+        self.indexer = DeltaIndexer(vector_store, batch_size=index_batch_size, lexical_index=lexical_index)
+        self.extract_workers = extract_workers
+        self.index_batch_size = index_batch_size
+        self.pages = queue.Queue(maxsize=queue_size)
+        self.chunks = queue.Queue(maxsize=queue_size)
+        self.errors: List[BaseException] = []
+        self.removed_urls = set()
+        self.failed_urls = set()
+        self.stats = {"pages": 0, "unchanged": 0, "duplicates": 0, "chunks": 0, "added": 0, "deleted": 0,
+                      "kept": 0}
+        self.stats_lock = threading.Lock()
+        # Called with a snapshot of the stats whenever a page or batch completes
+        self.on_progress = on_progress
+
+    def _count(self, **values):
+        with self.stats_lock:
+            for key, value in values.items():
+                self.stats[key] += value
+            snapshot = dict(self.stats)
+        if self.on_progress:
+            self.on_progress(snapshot)
+
+    def _crawl_stage(self):
+        try:
+            self.crawler.crawl(on_page=self.pages.put)
+        except Exception as e:
+            logging.error(f"Crawl stage failed: {e}", exc_info=True)
+            self.errors.append(e)
+        finally:
+            for _ in range(self.extract_workers):
+                self.pages.put(_DONE)
+
+    def _extract_stage(self):
+        while True:
+            content = self.pages.get()
+            if content is _DONE:
+                self.chunks.put(_DONE)
+                return
+            url = content['url']
+            self._count(pages=1)
+            if content.get('unchanged'):
+                self._count(unchanged=1)
+                continue
+            try:
+                with metrics.span("extract"):
+                    if content.get('raw') is not None:
+                        # Raw bytes from a keep_raw crawler; a ParallelExtractor
+                        # parses them in a worker process
+                        content['extracted'] = self.extractor.extract_raw(content['raw'], content.get('encoding'))
+                    else:
+                        content['extracted'] = self.extractor.extract_content(content['html'])
+                content['html'] = content['raw'] = None  # release the page body
+                with metrics.span("chunk"):
+                    documents = self.processor.create_documents({url: content})
+                    duplicate_of = self.dedup.check_page(url, documents) if self.dedup else None
+                    # A duplicate page is indexed as empty, which deletes any chunks it had
+                    chunks = [] if duplicate_of else self.processor.split_documents(documents)
+                if duplicate_of:
+                    metrics.inc("duplicate_pages_total")
+                    self._count(duplicates=1)
+                elif self.dedup:
+                    kept = self.dedup.filter_chunks(url, chunks)
+                    metrics.inc("duplicate_chunks_total", len(chunks) - len(kept))
+                    chunks = kept
+                metrics.observe("chunks_per_page", len(chunks))
+            except Exception as e:
+                logging.error(f"Failed to extract {url}: {e}", exc_info=True)
+                metrics.inc("extract_errors_total")
+                self.failed_urls.add(url)
+                continue
+            self.chunks.put((url, chunks))
+
+    def _flush(self, batch: Dict[str, List[Any]]):
+        if not batch:
+            return
+        try:
+            with metrics.span("index_batch"):
+                stats = self.indexer.index_pages(batch)
+            metrics.inc("chunks_embedded_total", stats["added"])
+            metrics.inc("chunks_deleted_total", stats["deleted"])
+            self._count(added=stats["added"], deleted=stats["deleted"], kept=stats["kept"])
+        except Exception as e:
+            # Keep draining the queue so upstream stages never block forever
+            logging.error(f"Failed to index {len(batch)} pages: {e}", exc_info=True)
+            self.errors.append(e)
+        batch.clear()
+
+    def _index_stage(self):
+        batch, batch_chunks, finished = {}, 0, 0
+        while finished < self.extract_workers:
+            item = self.chunks.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            url, chunks = item
+            batch[url] = chunks
+            batch_chunks += len(chunks)
+            self._count(chunks=len(chunks))
+            if batch_chunks >= self.index_batch_size:
+                self._flush(batch)
+                batch_chunks = 0
+        self._flush(batch)
+
+    def finish_dedup(self):
+        """Record alternate URLs on the kept chunks and schedule orphaned pages for a refetch."""
+        for url in self.removed_urls:
+            self.dedup.remove_page(url)
+        if not self.errors:
+            self.indexer.annotate(self.dedup.pending_alternates())
+        orphans = self.dedup.pop_orphans()
+        manifest = getattr(self.crawler, "manifest", None)
+        if orphans and manifest:
+            # Their copy of the content is gone; fetching them again re-indexes it
+            logging.info(f"{len(orphans)} duplicate pages lost their canonical copy and will be re-fetched")
+            for url in orphans:
+                manifest.remove(url)
+        self.dedup.save()
+
+    def run(self) -> Dict[str, Any]:
+        """Run all stages to completion and return ingestion statistics."""
+        start = time.time()
+        threads = [threading.Thread(target=self._crawl_stage, name="crawl")]
+        threads += [threading.Thread(target=self._extract_stage, name=f"extract-{i}")
+                    for i in range(self.extract_workers)]
+        threads.append(threading.Thread(target=self._index_stage, name="index"))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        manifest = getattr(self.crawler, "manifest", None)
+        if self.failed_urls and manifest:
+            logging.warning(f"{len(self.failed_urls)} pages failed extraction and will be re-fetched next time")
+            for url in self.failed_urls:
+                manifest.remove(url)
+
+        # Pages gone from the site can only be determined once the crawl ends
+        if not self.errors:
+            self.removed_urls = self.crawler.removed_urls()
+            self._count(deleted=self.indexer.remove_pages(self.removed_urls))
+        if self.dedup:
+            self.finish_dedup()
+        self.indexer.vector_store.save()
+        if self.lexical_index is not None:
+            self.lexical_index.save()
+
+        self.stats["seconds"] = round(time.time() - start, 2)
+        logging.info(
+            f"Ingestion finished in {self.stats['seconds']}s: {self.stats['pages']} pages "
+            f"({self.stats['unchanged']} unchanged, {self.stats['duplicates']} duplicates), {self.stats['chunks']} chunks, "
+            f"{self.stats['added']} embedded, {self.stats['deleted']} deleted"
+        )
+        if self.errors:
+            raise self.errors[0]
+        return self.stats
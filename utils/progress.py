@@ -22,11 +22,11 @@ class ProgressTracker:
         self.progress.stop()
         
     def update(self, completed, total=None):
-        """Update progress."""
+        """Update progress: ``completed`` of ``total`` items, or a percentage without a total."""
         if total:
-            self.progress.update(self.task_id, total=total)
-        percentage = int(completed / total * 100) if total else completed
-        self.progress.update(self.task_id, completed=percentage)
+            self.progress.update(self.task_id, total=total, completed=min(completed, total))
+        else:
+            self.progress.update(self.task_id, completed=completed)
         
     def set_description(self, description):
         """Set a new description for the progress bar."""
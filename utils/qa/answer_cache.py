@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import numpy as np
+from utils.knowledge_base.cache import Cache
+from utils.metrics import metrics
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a question: lowercase, single spaces, no trailing punctuation."""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?!. ")
+
+
+def query_numbers(normalized: str) -> List[str]:
+    """Numbers and versions in a question ("3.11", "v2"): similar questions that differ in them want different answers."""
+    return re.findall(r"\d+(?:\.\d+)*", normalized)
+
+
+def index_version(lexical_index) -> str:
+    """Fingerprint of the indexed content.
+
+    Chunk IDs already hash each chunk's URL, section and text, so hashing the
+    sorted IDs changes whenever any chunk is added, edited or removed.
+    """
+    digest = hashlib.sha1()
+    for chunk_id in sorted(lexical_index.docs):
+        digest.update(chunk_id.encode())
+    return digest.hexdigest()[:16]
+
+
+class AnswerCache:
+    """Multi-tier cache of generated answers.
+
+    1. In-memory LRU with TTL, keyed by normalized query and index version.
+    2. Persistent ``Cache`` entries under the same key, surviving restarts.
+    3. Semantic tier (off unless ``semantic_distance`` is set): a new query
+       whose embedding is within ``semantic_distance`` (cosine distance) of a
+       cached query mentioning the same numbers reuses that query's answer.
+       Queries are embedded in their normalized form; a ``query_vector``
+       passed to ``get()`` must be one of ``normalize_query(query)``.
+
+    Every key includes the index version, so entries written against an older
+    index are never returned once the index changes.
+    """
+
+    def __init__(self, store: Cache, version: str, embeddings=None, ttl_seconds: int = 86400,
+                 max_entries: int = 1024, semantic_distance: Optional[float] = None):
+        self.store = store
+        self.version = version
+        self.embeddings = embeddings
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.semantic_distance = semantic_distance if embeddings is not None else None
+        self.memory = OrderedDict()  # normalized query -> (expires_at, result)
+        self.lock = threading.Lock()
+        self.semantic_queries = []
+        self.semantic_vectors = np.zeros((0, 0), dtype=np.float32)
+        self.stats = {"memory_hits": 0, "store_hits": 0, "semantic_hits": 0, "misses": 0}
+        if self.semantic_distance is not None:
+            self._load_semantic_index()
+
+    def set_version(self, version: str):
+        """Switch to a new index version in place, so everyone holding this cache stops getting old answers."""
+        with self.lock:
+            if version == self.version:
+                return
+            self.version = version
+            self.memory.clear()
+            self.semantic_queries = []
+            self.semantic_vectors = np.zeros((0, 0), dtype=np.float32)
+        if self.semantic_distance is not None:
+            self._load_semantic_index()
+
+    def close(self):
+        """Close the persistent store (its database connection and sweeper thread)."""
+        self.store.close()
+
+    def _store_key(self, normalized: str):
+        return ["answer", self.version, normalized]
+
+    def _queries_key(self):
+        return ["answer_queries", self.version]
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _load_semantic_index(self):
+        """Rebuild the semantic tier from the queries answered under this index version."""
+        queries = self.store.get(self._queries_key()) or []
+        if not queries:
+            return
+        try:
+            self.semantic_queries = list(queries)
+            self.semantic_vectors = np.stack([self._embed(query) for query in queries])
+        except Exception as e:
+            logging.warning(f"Could not rebuild semantic answer cache: {e}")
+            self.semantic_queries, self.semantic_vectors = [], np.zeros((0, 0), dtype=np.float32)
+
+    def _lookup_exact(self, normalized: str, count=True) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(normalized)
+            if entry:
+                expires_at, result = entry
+                if expires_at > now:
+                    self.memory.move_to_end(normalized)
+                    if count:
+                        self.stats["memory_hits"] += 1
+                        metrics.inc("answer_cache_lookups_total", result="memory")
+                    return result
+                del self.memory[normalized]
+
+        stored = self.store.get(self._store_key(normalized))
+        if stored and stored["expires_at"] > now:
+            self._remember(normalized, stored["expires_at"], stored["result"])
+            if count:
+                self.stats["store_hits"] += 1
+                metrics.inc("answer_cache_lookups_total", result="store")
+            return stored["result"]
+        return None
+
+    def _remember(self, normalized: str, expires_at: float, result: Dict[str, Any]):
+        with self.lock:
+            self.memory[normalized] = (expires_at, result)
+            self.memory.move_to_end(normalized)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, query: str, query_vector=None) -> Optional[Dict[str, Any]]:
+        """Return a cached answer for the query, if there is a fresh one."""
+        normalized = normalize_query(query)
+        result = self._lookup_exact(normalized)
+        if result is not None:
+            return result
+
+        if self.semantic_distance is not None and self.semantic_queries:
+            vector = self._embed(normalized) if query_vector is None else np.asarray(query_vector, dtype=np.float32)
+            distances = 1.0 - self.semantic_vectors @ (vector / (np.linalg.norm(vector) or 1.0))
+            best = int(np.argmin(distances))
+            if distances[best] <= self.semantic_distance and \
+                    query_numbers(self.semantic_queries[best]) == query_numbers(normalized):
+                result = self._lookup_exact(self.semantic_queries[best], count=False)
+                if result is not None:
+                    self.stats["semantic_hits"] += 1
+                    metrics.inc("answer_cache_lookups_total", result="semantic")
+                    return result
+
+        self.stats["misses"] += 1
+        metrics.inc("answer_cache_lookups_total", result="miss")
+        return None
+
+    def put(self, query: str, result: Dict[str, Any]):
+        """Cache the answer generated for a query."""
+        normalized = normalize_query(query)
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(normalized, expires_at, result)
+        self.store.set(self._store_key(normalized), {"expires_at": expires_at, "result": result})
+
+        if self.semantic_distance is not None and normalized not in self.semantic_queries:
+            vector = self._embed(normalized)[None, :]
+            with self.lock:
+                self.semantic_queries.append(normalized)
+                self.semantic_vectors = vector if not len(self.semantic_vectors) else np.vstack([self.semantic_vectors, vector])
+                if len(self.semantic_queries) > self.max_entries:
+                    self.semantic_queries = self.semantic_queries[-self.max_entries:]
+                    self.semantic_vectors = self.semantic_vectors[-self.max_entries:]
+                queries = list(self.semantic_queries)
+            self.store.set(self._queries_key(), queries)
@@ -0,0 +1,150 @@
+from typing import Any, Dict, List, Optional
+from utils.knowledge_base.lexical_index import tokenize
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def _overlap(a: str, b: str, min_length: int = 16) -> int:
+    """Length of the longest suffix of ``a`` that is also a prefix of ``b``."""
+    for length in range(min(len(a), len(b)), min_length - 1, -1):
+        if a.endswith(b[:length]):
+            return length
+    return 0
+
+
+class ContextAssembler:
+    """Turn over-fetched retrieval results into a compact, diverse prompt context.
+
+    1. Chunks of the same section that overlap or touch are stitched into one
+       passage (by their ``start_index`` offsets, or by matching the
+       overlapping text for chunks indexed without offsets).
+    2. Passages contained in another passage are dropped.
+    3. Passages are picked by maximal marginal relevance: retrieval rank
+       traded off against word overlap with the passages already picked.
+    4. Picking stops at the token budget; a first passage that alone exceeds
+       the budget is truncated.
+
+    The output has the same shape as ``QueryProcessor`` results.
+    """
+
+    def __init__(self, max_tokens: int = 1500, overfetch: int = 3, mmr_lambda: float = 0.7,
+                 max_passages: Optional[int] = None):
+        self.max_tokens = max_tokens
+        self.overfetch = overfetch
+        self.mmr_lambda = mmr_lambda
+        self.max_passages = max_passages
+
+    def _section_key(self, metadata: Dict[str, Any]):
+        # Section IDs are only unique within a page (every intro section is "root")
+        return metadata.get("url"), metadata.get("section_id") or metadata.get("section_path")
+
+    def _merge_section(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Stitch overlapping or adjacent chunks of one section into passages."""
+        if all("start_index" in chunk["metadata"] for chunk in chunks):
+            chunks = sorted(chunks, key=lambda chunk: chunk["metadata"]["start_index"])
+        passages = []
+        for chunk in chunks:
+            text = chunk["page_content"]
+            start = chunk["metadata"].get("start_index")
+            if start is not None and passages and passages[-1]["end"] is not None and start <= passages[-1]["end"]:
+                last = passages[-1]
+                if start + len(text) > last["end"]:
+                    last["text"] += text[last["end"] - start:]
+                    last["end"] = start + len(text)
+                last["chunks"].append(chunk)
+                continue
+            if start is None:
+                self._stitch(passages, chunk)
+                continue
+            passages.append({
+                "text": text,
+                "end": start + len(text) if start is not None else None,
+                "chunks": [chunk]
+            })
+        return passages
+
+    def _stitch(self, passages: List[Dict[str, Any]], chunk: Dict[str, Any]):
+        """Add a chunk without offsets, joining it with every passage it overlaps on either side."""
+        joined = {"text": chunk["page_content"], "end": None, "chunks": [chunk]}
+        merged = True
+        while merged:
+            merged = False
+            for passage in passages:
+                overlap = _overlap(passage["text"], joined["text"])
+                if overlap:
+                    text = passage["text"] + joined["text"][overlap:]
+                else:
+                    overlap = _overlap(joined["text"], passage["text"])
+                    if not overlap:
+                        continue
+                    text = joined["text"] + passage["text"][overlap:]
+                passages.remove(passage)
+                joined = {"text": text, "end": None, "chunks": passage["chunks"] + joined["chunks"]}
+                merged = True
+                break
+        passages.append(joined)
+
+    def _passages(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group results by section, merge them and drop passages contained in others."""
+        sections = {}
+        for rank, result in enumerate(results):
+            result = dict(result, relevance=1.0 - rank / len(results))
+            sections.setdefault(self._section_key(result["metadata"]), []).append(result)
+
+        passages = []
+        for chunks in sections.values():
+            for passage in self._merge_section(chunks):
+                best = max(passage["chunks"], key=lambda chunk: chunk["relevance"])
+                passage["relevance"] = best["relevance"]
+                passage["metadata"] = dict(
+                    best["metadata"],
+                    chunk_ids=[chunk["metadata"].get("chunk_id") for chunk in passage["chunks"]]
+                )
+                passage["score"] = best["score"]
+                passage["terms"] = set(tokenize(passage["text"]))
+                passages.append(passage)
+
+        passages.sort(key=lambda passage: passage["relevance"], reverse=True)
+        unique = []
+        for passage in passages:
+            if not any(passage["text"] in kept["text"] for kept in unique):
+                unique.append(passage)
+        return unique
+
+    def _similarity(self, a: set, b: set) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    def assemble(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Select and merge retrieval results into at most ``max_tokens`` of context."""
+        if not results:
+            return []
+        remaining = self._passages(results)
+        selected, used_tokens = [], 0
+        max_passages = self.max_passages or len(remaining)
+
+        while remaining and len(selected) < max_passages:
+            def mmr(passage):
+                redundancy = max((self._similarity(passage["terms"], kept["terms"]) for kept in selected), default=0.0)
+                return self.mmr_lambda * passage["relevance"] - (1 - self.mmr_lambda) * redundancy
+
+            best = max(remaining, key=mmr)
+            remaining.remove(best)
+            tokens = estimate_tokens(best["text"])
+            if used_tokens + tokens > self.max_tokens:
+                if selected:
+                    continue  # a smaller passage may still fit
+                # Never return nothing: keep the beginning of the best passage
+                best["text"] = best["text"][:self.max_tokens * 4]
+                tokens = estimate_tokens(best["text"])
+            selected.append(best)
+            used_tokens += tokens
+
+        return [
+            {"page_content": passage["text"], "metadata": passage["metadata"], "score": passage["score"]}
+            for passage in selected
+        ]
@@ -1,23 +1,78 @@
-from typing import List, Dict, Any
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+import hashlib
+from utils.knowledge_base.embeddings import create_embeddings
+from utils.knowledge_base.lexical_index import BM25Index, is_identifier_query
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from utils.knowledge_base.vector_store import VectorStore
+    from utils.qa.context import ContextAssembler
 
 class QueryProcessor:
-    """Process user queries to retrieve relevant documents."""
+    """Process user queries to retrieve relevant documents.
+    
+    With a ``BM25Index`` retrieval is hybrid: vector and lexical results are
+    fused by reciprocal-rank fusion, and short identifier-like queries
+    (API names, config keys, error codes) are answered from the lexical index
+    alone, skipping the embedding call.
+    """
     
-    def __init__(self, vector_store: Chroma, api_key: str, top_k=5):
+    def __init__(self, vector_store: "VectorStore", api_key: str, top_k=5, embeddings=None,
+                 lexical_index: BM25Index = None, rrf_k=60, candidate_multiplier=3,
+                 context_assembler: "ContextAssembler" = None):
         self.vector_store = vector_store
         self.api_key = api_key
         self.top_k = top_k
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=self.api_key
-        )
+        self.embeddings = embeddings or create_embeddings(self.api_key)
+        self.lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        self.candidate_multiplier = candidate_multiplier
+        self.context_assembler = context_assembler
+        
+    def process_query(self, query: str, query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Process a user query and retrieve relevant documents.
+        
+        With a ``ContextAssembler`` more candidates are retrieved and then
+        merged, deduplicated and trimmed to its token budget. A precomputed
+        ``query_vector`` (e.g. from a batched embedding call) skips embedding
+        the query again.
+        """
+        with metrics.span("retrieval"):
+            if self.context_assembler is None:
+                return self.retrieve(query, self.top_k, query_vector)
+            k = self.top_k * self.context_assembler.overfetch
+            results = self.retrieve(query, k, query_vector)
+        with metrics.span("context_assembly"):
+            return self.context_assembler.assemble(results)
+    
+    def retrieve(self, query: str, k: int, query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Retrieve the ``k`` most relevant chunks, best first.
+        
+        Without a lexical index ``score`` is the vector distance (lower is
+        better); with one it is a fusion/BM25 score (higher is better).
+        """
+        if self.lexical_index is None or not len(self.lexical_index):
+            metrics.inc("queries_total", route="vector")
+            return self._vector_search(query, k, query_vector)
         
-    def process_query(self, query: str) -> List[Dict[str, Any]]:
-        """Process a user query and retrieve relevant documents."""
-        # Perform similarity search
-        docs = self.vector_store.similarity_search_with_score(query, k=self.top_k)
+        # Fast path: exact identifiers are found reliably by BM25 alone
+        if is_identifier_query(query):
+            lexical = self._lexical_search(query, k)
+            if lexical:
+                metrics.inc("queries_total", route="lexical")
+                return lexical
+        
+        metrics.inc("queries_total", route="hybrid")
+        fetch_k = k * self.candidate_multiplier
+        return self._fuse([self._vector_search(query, fetch_k, query_vector), self._lexical_search(query, fetch_k)], k)
+    
+    def _vector_search(self, query: str, k: int, query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Similarity search in the vector store."""
+        with metrics.span("vector_search"):
+            if query_vector is None:
+                docs = self.vector_store.similarity_search_with_score(query, k=k)
+            else:
+                docs = self.vector_store.similarity_search_by_vector_with_relevance_scores(query_vector, k=k)
         
         # Format results
         results = []
@@ -28,4 +83,24 @@ class QueryProcessor:
                 "score": score
             })
             
-        return results 
\ No newline at end of file
+        return results 
+    
+    def _lexical_search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """BM25 search in the lexical index."""
+        results = []
+        with metrics.span("lexical_search"):
+            hits = self.lexical_index.search(query, k)
+        for chunk_id, score in hits:
+            text, metadata = self.lexical_index.get(chunk_id)
+            results.append({"page_content": text, "metadata": metadata, "score": score})
+        return results
+    
+    def _fuse(self, result_lists: List[List[Dict[str, Any]]], k: int) -> List[Dict[str, Any]]:
+        """Merge ranked result lists with reciprocal-rank fusion."""
+        fused = {}
+        for results in result_lists:
+            for rank, result in enumerate(results):
+                key = result["metadata"].get("chunk_id") or hashlib.sha1(result["page_content"].encode()).hexdigest()
+                entry = fused.setdefault(key, dict(result, score=0.0))
+                entry["score"] += 1.0 / (self.rrf_k + rank + 1)
+        return sorted(fused.values(), key=lambda result: result["score"], reverse=True)[:k]
\ No newline at end of file